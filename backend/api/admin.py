@@ -0,0 +1,159 @@
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import JSONResponse, PlainTextResponse
+from loguru import logger
+from typing import Optional
+from pydantic import BaseModel
+
+from ..models.model_manager import model_manager
+from ..middleware.profiling import profile_store
+from ..middleware.admission import admission_controller
+from ..services.job_queue import job_scheduler
+from ..services.chat_router import chat_router
+from ..replay.sessions import upstream_status
+from ..config import settings
+
+
+async def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Reject requests without the configured admin token (admin API is off without one)."""
+    if not settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin API disabled: set ADMIN_TOKEN to enable it")
+    if x_admin_token != settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+
+def single_worker_only(hint: str):
+    """
+    Reject an endpoint whose state lives in one worker process when serve.py runs several.
+
+    A request reaches a single worker, so it could only change (or read) that
+    worker's copy.
+    """
+    async def check():
+        if settings.SERVER_WORKERS > 1:
+            raise HTTPException(
+                status_code=409,
+                detail=f"Not available with {settings.SERVER_WORKERS} server workers, "
+                       f"the request would only reach one of them: {hint}"
+            )
+    return check
+
+
+# Model changes must reach every worker: replace the file and let each one reload it
+require_single_worker_model = Depends(single_worker_only(
+    "replace the model file with MODEL_WATCH_INTERVAL_S set so every worker reloads it"
+))
+# Captures are kept in the memory of the worker that served the slow request
+require_single_worker_profiles = Depends(single_worker_only("profile with a single worker"))
+
+
+# Pydantic models for model management
+class ReloadRequest(BaseModel):
+    path: Optional[str] = None
+
+class CandidateRequest(BaseModel):
+    path: str
+    sample_rate: Optional[float] = None
+
+
+router = APIRouter(dependencies=[Depends(require_admin)])
+
+
+@router.get("/models")
+async def get_model_status():
+    """Get the live, retiring and candidate model versions plus shadow statistics."""
+    return JSONResponse(content=model_manager.status())
+
+
+@router.post("/models/reload", dependencies=[require_single_worker_model])
+async def reload_model(request: ReloadRequest):
+    """Load a new model version in the background and swap it in."""
+    try:
+        info = await model_manager.reload(request.path)
+        return JSONResponse(content={"status": "success", "current": info})
+
+    except Exception as e:
+        logger.error(f"Error reloading model: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error reloading model: {str(e)}"
+        )
+
+
+@router.post("/models/candidate", dependencies=[require_single_worker_model])
+async def set_candidate_model(request: CandidateRequest):
+    """Load a candidate model and mirror a sample of /classify traffic to it."""
+    if request.sample_rate is not None and not 0 <= request.sample_rate <= 1:
+        raise HTTPException(status_code=400, detail="sample_rate must be between 0 and 1")
+    try:
+        info = await model_manager.set_candidate(request.path, request.sample_rate)
+        return JSONResponse(content={"status": "success", "candidate": info})
+
+    except Exception as e:
+        logger.error(f"Error loading candidate model: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error loading candidate model: {str(e)}"
+        )
+
+
+@router.post("/models/candidate/promote", dependencies=[require_single_worker_model])
+async def promote_candidate_model():
+    """Make the candidate model live."""
+    try:
+        info = await model_manager.promote_candidate()
+        return JSONResponse(content={"status": "success", "current": info})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.delete("/models/candidate", dependencies=[require_single_worker_model])
+async def clear_candidate_model():
+    """Stop shadow traffic and drop the candidate model."""
+    model_manager.clear_candidate()
+    return JSONResponse(content={"status": "success"})
+
+
+@router.get("/profiles", dependencies=[require_single_worker_profiles])
+async def list_profiles():
+    """List captured slow-request profiles, newest first."""
+    return JSONResponse(content={
+        "enabled": settings.PROFILING_ENABLED,
+        "threshold_ms": settings.PROFILING_SLOW_REQUEST_MS,
+        "profiles": profile_store.list()
+    })
+
+
+@router.get("/profiles/{profile_id}", dependencies=[require_single_worker_profiles])
+async def download_profile(profile_id: int):
+    """Download a capture (folded stacks for flame graph tools, or cProfile text)."""
+    capture = profile_store.get(profile_id)
+    if capture is None:
+        raise HTTPException(status_code=404, detail=f"No profile with id {profile_id}")
+    return PlainTextResponse(
+        capture.data,
+        headers={"Content-Disposition": f'attachment; filename="{capture.filename}"'}
+    )
+
+
+@router.get("/jobs")
+async def get_job_status():
+    """Get background job queue statistics."""
+    return JSONResponse(content=job_scheduler.status())
+
+
+@router.get("/chat")
+async def get_chat_routing_status():
+    """Get how many chat messages were answered locally versus forwarded to Gemini."""
+    return JSONResponse(content=chat_router.status())
+
+
+@router.get("/admission")
+async def get_admission_status():
+    """Get per-route-group concurrency, queueing, rate limiting and shedding counters."""
+    return JSONResponse(content=admission_controller.status())
+
+
+@router.get("/upstream")
+async def get_upstream_status():
+    """Get the upstream mode and USDA/Gemini calls made through recording or replaying sessions."""
+    return JSONResponse(content=upstream_status())
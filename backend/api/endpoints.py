@@ -1,15 +1,25 @@
-from fastapi import APIRouter, File, UploadFile, HTTPException, Query
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, File, UploadFile, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, StreamingResponse
 from PIL import Image
 import io
+import json
+import asyncio
 from loguru import logger
-from typing import List, Optional
+from typing import List, Optional, Dict, AsyncIterator
+from datetime import date, timedelta
 from pydantic import BaseModel
 
-from ..models.cnn_model import CNNModel
-from ..services.usda_service import usda_service
-from ..services.gemini_service import gemini_service
+from ..models.model_manager import model_manager
+from ..services.usda_service import usda_service, NUTRIENT_FIELDS
+from ..services.enrichment_jobs import schedule_enrichment, schedule_resolution
+from ..services.chat_router import chat_router
+from ..services.similarity_service import similarity_service
+from ..services.food_log_service import food_log_service, parse_date, parse_iso_date
+from ..services.analytics_service import analytics_service
+from ..services.food_log_io import FoodLogImporter, export_entries, FORMATS, MEDIA_TYPES
 from ..config import settings
+from ..log_utils import hot_log
 
 
 # Pydantic models for chat
@@ -21,14 +31,31 @@ class ChatRequest(BaseModel):
     message: str
     history: List[ChatMessage] = []
 
+# Pydantic models for the food log
+class FoodLogEntry(BaseModel):
+    name: str
+    quantity: Optional[float] = None
+    calories: Optional[float] = None
+    protein: Optional[float] = None
+    carbs: Optional[float] = None
+    fat: Optional[float] = None
+    fiber: Optional[float] = None
+    sugars: Optional[float] = None
+    sodium: Optional[float] = None
+    nutrients_per_100g: Optional[Dict[str, float]] = None
+    date: Optional[str] = None
+
+class FoodLogRequest(BaseModel):
+    user_id: str = "default"
+    entries: List[FoodLogEntry]
+
 router = APIRouter()
-model = CNNModel()
 
 @router.post("/classify")
 async def classify_image(file: UploadFile = File(...)):
     """Classify a food image and return nutritional information."""
     try:
-        logger.info(f"Received file: {file.filename}, content_type: {file.content_type}")
+        hot_log("INFO", "Received file: {}, content_type: {}", lambda: file.filename, lambda: file.content_type)
         
         # Verify file type
         if not file.content_type.startswith("image/"):
@@ -40,11 +67,11 @@ async def classify_image(file: UploadFile = File(...)):
         
         # Read and process image
         contents = await file.read()
-        logger.info(f"Read {len(contents)} bytes from file")
+        hot_log("INFO", "Read {} bytes from file", lambda: len(contents))
         
         try:
             image = Image.open(io.BytesIO(contents)).convert("RGB")
-            logger.info(f"Successfully opened image: {image.size}")
+            hot_log("INFO", "Successfully opened image: {}", lambda: image.size)
         except Exception as e:
             logger.error(f"Failed to open image: {str(e)}")
             raise HTTPException(
@@ -54,8 +81,9 @@ async def classify_image(file: UploadFile = File(...)):
         
         # Get prediction
         try:
-            predicted_class, confidence = model.predict(image)
-            logger.info(f"Prediction successful: {predicted_class} ({confidence})")
+            predicted_class, confidence, model_version = await model_manager.predict(image)
+            hot_log("INFO", "Prediction successful: {} ({}) by {}",
+                    lambda: predicted_class, lambda: confidence, lambda: model_version)
         except Exception as e:
             logger.error(f"Prediction failed: {str(e)}")
             raise HTTPException(
@@ -70,26 +98,31 @@ async def classify_image(file: UploadFile = File(...)):
             # If USDA data not available, fall back to model's basic info
             if nutrition_info is None:
                 logger.warning(f"USDA data not available for '{predicted_class}', using fallback")
-                nutrition_info = model.get_nutritional_info(predicted_class)
+                nutrition_info = model_manager.model.get_nutritional_info(predicted_class)
                 nutrition_info["source"] = "fallback"
+                if usda_service.api_key:
+                    schedule_resolution(predicted_class, delay_s=settings.JOB_RETRY_DELAY_S)
             
-            logger.info(f"Nutrition info retrieved: {nutrition_info}")
+            hot_log("INFO", "Nutrition info retrieved: {}", lambda: nutrition_info)
             
         except Exception as e:
             logger.error(f"Error fetching nutrition data: {str(e)}")
             # Fall back to basic model data
-            nutrition_info = model.get_nutritional_info(predicted_class)
+            nutrition_info = model_manager.model.get_nutritional_info(predicted_class)
             nutrition_info["source"] = "fallback"
+            if usda_service.api_key:
+                schedule_resolution(predicted_class, delay_s=settings.JOB_RETRY_DELAY_S)
         
         # Prepare response
         response = {
             "filename": file.filename,
             "predicted_class": predicted_class,
             "confidence": confidence,
+            "model_version": model_version,
             "nutrition_info": nutrition_info
         }
         
-        logger.info(f"Successfully classified image: {file.filename}")
+        hot_log("INFO", "Successfully classified image: {}", lambda: file.filename)
         return JSONResponse(content=response)
         
     except Exception as e:
@@ -103,7 +136,7 @@ async def classify_image(file: UploadFile = File(...)):
 async def search_nutrition(food_name: str):
     """Search for nutritional information of a specific food item."""
     try:
-        logger.info(f"Searching nutrition data for: {food_name}")
+        hot_log("INFO", "Searching nutrition data for: {}", lambda: food_name)
         
         # Get nutritional information from USDA API
         nutrition_info = await usda_service.get_nutrition_by_name(food_name)
@@ -115,7 +148,7 @@ async def search_nutrition(food_name: str):
                 detail=f"No nutritional data found for '{food_name}'"
             )
         
-        logger.info(f"Successfully retrieved nutrition data for: {food_name}")
+        hot_log("INFO", "Successfully retrieved nutrition data for: {}", lambda: food_name)
         return JSONResponse(content=nutrition_info)
         
     except HTTPException:
@@ -127,14 +160,27 @@ async def search_nutrition(food_name: str):
             detail=f"Error searching nutrition data: {str(e)}"
         )
 
+def _format_food_result(fdc_id: int, food_item: Dict, nutrition_info: Optional[Dict]) -> Dict:
+    """Format a USDA search hit (and its per-100g nutrients, if known) for the frontend."""
+    nutrition_info = nutrition_info or {}
+    return {
+        "id": fdc_id,
+        "name": food_item["description"],
+        "data_type": food_item.get("dataType", "Unknown"),
+        "nutrients": {field: nutrition_info.get(field, 0) for field in NUTRIENT_FIELDS},
+        "serving_size": nutrition_info.get("serving_size", "100g"),
+        "source": "USDA FoodData Central"
+    }
+
 @router.get("/search-foods")
 async def search_foods(
     query: str = Query(..., description="Food name to search for"),
-    limit: int = Query(10, description="Maximum number of results to return", ge=1, le=50)
+    limit: int = Query(10, description="Maximum number of results to return", ge=1, le=50),
+    partial: bool = Query(False, description="Return uncached hits immediately and enrich them in the background")
 ):
     """Search for multiple food items in USDA database."""
     try:
-        logger.info(f"Searching USDA database for foods: {query} (limit: {limit})")
+        hot_log("INFO", "Searching USDA database for foods: {} (limit: {})", lambda: query, lambda: limit)
         
         # Search USDA database for multiple foods
         search_results = await usda_service.search_foods(query, limit)
@@ -149,6 +195,7 @@ async def search_foods(
         
         # Format results for frontend
         formatted_results = []
+        pending = 0
         for food_item in search_results:
             try:
                 # Get FDC ID from the correct field (fdcId in USDA response)
@@ -157,54 +204,36 @@ async def search_foods(
                     logger.warning(f"No FDC ID found for food item: {food_item}")
                     continue
                 
-                # Get detailed nutrition info for each food
-                food_details = await usda_service.get_food_details(str(fdc_id))
-                if food_details:
-                    # Extract nutrition data from the raw food details
-                    nutrition_info = usda_service._extract_nutrition_data(food_details, food_item["description"])
-                    formatted_results.append({
-                        "id": fdc_id,
-                        "name": food_item["description"],
-                        "data_type": food_item.get("dataType", "Unknown"),
-                        "nutrients": {
-                            "calories": nutrition_info.get("calories", 0),
-                            "protein": nutrition_info.get("protein", 0),
-                            "carbs": nutrition_info.get("carbs", 0),
-                            "fat": nutrition_info.get("fat", 0),
-                            "fiber": nutrition_info.get("fiber", 0),
-                            "sugars": nutrition_info.get("sugars", 0),
-                            "sodium": nutrition_info.get("sodium", 0)
-                        },
-                        "serving_size": nutrition_info.get("serving_size", "100g"),
-                        "source": "USDA FoodData Central"
-                    })
+                if partial:
+                    nutrition_info = usda_service.cache.get_by_fdc_id(fdc_id)
+                    if nutrition_info is None:
+                        # Return the hit now, nutrients are fetched and cached in the background
+                        schedule_enrichment(str(fdc_id), food_item["description"])
+                        formatted_results.append(dict(
+                            _format_food_result(fdc_id, food_item, None), nutrients=None, pending=True
+                        ))
+                        pending += 1
+                        continue
+                else:
+                    # Get detailed nutrition info for each food (cached by FDC ID)
+                    nutrition_info = await usda_service.get_nutrition_by_fdc_id(str(fdc_id), food_item["description"])
+                
+                if nutrition_info:
+                    formatted_results.append(_format_food_result(fdc_id, food_item, nutrition_info))
             except Exception as e:
                 logger.warning(f"Failed to get details for {food_item['description']}: {str(e)}")
                 # Still add basic info even if detailed nutrition fails
-                formatted_results.append({
-                    "id": fdc_id,
-                    "name": food_item["description"],
-                    "data_type": food_item.get("dataType", "Unknown"),
-                    "nutrients": {
-                        "calories": 0,
-                        "protein": 0,
-                        "carbs": 0,
-                        "fat": 0,
-                        "fiber": 0,
-                        "sugars": 0,
-                        "sodium": 0
-                    },
-                    "serving_size": "100g",
-                    "source": "USDA FoodData Central"
-                })
+                formatted_results.append(_format_food_result(fdc_id, food_item, None))
         
         response = {
             "query": query,
             "results": formatted_results,
             "total_found": len(formatted_results)
         }
+        if partial:
+            response["pending"] = pending
         
-        logger.info(f"Successfully found {len(formatted_results)} foods for query: {query}")
+        hot_log("INFO", "Successfully found {} foods for query: {}", lambda: len(formatted_results), lambda: query)
         return JSONResponse(content=response)
         
     except Exception as e:
@@ -215,6 +244,135 @@ async def search_foods(
         )
 
 
+async def _stream_search_events(query: str, limit: int) -> AsyncIterator[Dict]:
+    """Yield search hits at once, then one event per item as its nutrients arrive."""
+    search_results = await usda_service.search_foods(query, limit) or []
+    hits = [
+        (food_item.get("fdcId") or food_item.get("fdc_id"), food_item)
+        for food_item in search_results
+    ]
+    hits = [(fdc_id, food_item) for fdc_id, food_item in hits if fdc_id]
+    
+    yield {
+        "event": "hits",
+        "query": query,
+        "results": [
+            {
+                "id": fdc_id,
+                "name": food_item["description"],
+                "data_type": food_item.get("dataType", "Unknown"),
+                "source": "USDA FoodData Central"
+            }
+            for fdc_id, food_item in hits
+        ],
+        "total_found": len(hits)
+    }
+    
+    semaphore = asyncio.Semaphore(settings.USDA_MAX_CONCURRENCY)
+    
+    async def enrich(fdc_id, food_item):
+        async with semaphore:
+            try:
+                return fdc_id, food_item, await usda_service.get_nutrition_by_fdc_id(
+                    str(fdc_id), food_item["description"]
+                ), None
+            except Exception as e:
+                return fdc_id, food_item, None, str(e)
+    
+    tasks = [asyncio.create_task(enrich(fdc_id, food_item)) for fdc_id, food_item in hits]
+    completed = failed = 0
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            fdc_id, food_item, nutrition_info, error = await next_done
+            if nutrition_info:
+                completed += 1
+                yield {"event": "item", "id": fdc_id, "result": _format_food_result(fdc_id, food_item, nutrition_info)}
+            else:
+                failed += 1
+                yield {"event": "error", "id": fdc_id, "detail": error or "Nutrition details not available"}
+        yield {"event": "done", "completed": completed, "failed": failed}
+    finally:
+        # Client went away or the stream ended: stop outstanding lookups
+        for task in tasks:
+            task.cancel()
+
+@router.get("/search-foods/stream")
+async def search_foods_stream(
+    query: str = Query(..., description="Food name to search for"),
+    limit: int = Query(10, description="Maximum number of results to return", ge=1, le=50),
+    format: str = Query("ndjson", description="Stream format: ndjson or sse")
+):
+    """Search USDA foods, streaming hits first and each item's nutrients as they arrive."""
+    if format not in ("ndjson", "sse"):
+        raise HTTPException(status_code=400, detail=f"Unsupported format '{format}'")
+    hot_log("INFO", "Streaming USDA search for foods: {} (limit: {})", lambda: query, lambda: limit)
+    
+    async def encode() -> AsyncIterator[str]:
+        try:
+            async for event in _stream_search_events(query, limit):
+                if format == "sse":
+                    yield f"event: {event['event']}\ndata: {json.dumps(event)}\n\n"
+                else:
+                    yield json.dumps(event) + "\n"
+        except Exception as e:
+            logger.error(f"Error streaming search results: {str(e)}")
+            error = {"event": "error", "id": None, "detail": f"Error searching foods: {str(e)}"}
+            yield f"event: error\ndata: {json.dumps(error)}\n\n" if format == "sse" else json.dumps(error) + "\n"
+    
+    media_type = "text/event-stream" if format == "sse" else "application/x-ndjson"
+    return StreamingResponse(encode(), media_type=media_type, headers={"Cache-Control": "no-cache"})
+
+
+@router.get("/similar/{fdc_id}")
+async def find_similar_foods(
+    fdc_id: str,
+    request: Request,
+    limit: int = Query(10, description="Maximum number of results to return", ge=1, le=100)
+):
+    """
+    Find foods with a similar nutrient profile.
+
+    Filter the results with min_<nutrient> / max_<nutrient> query parameters on
+    per-100g values, e.g. /similar/173944?max_sugars=5&min_protein=2.
+    """
+    constraints: Dict[str, list] = {}
+    for name, value in request.query_params.items():
+        bound, _, field = name.partition("_")
+        if bound not in ("min", "max") or not field:
+            continue
+        if field not in NUTRIENT_FIELDS:
+            raise HTTPException(status_code=400, detail=f"Unknown nutrient '{field}', expected one of {', '.join(NUTRIENT_FIELDS)}")
+        try:
+            constraints.setdefault(field, [None, None])[0 if bound == "min" else 1] = float(value)
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"Invalid value for {name}: '{value}'")
+    
+    bounds = {field: tuple(values) for field, values in constraints.items()}
+    
+    try:
+        hot_log("INFO", "Finding foods similar to FDC ID {}", lambda: fdc_id)
+        result = await run_in_threadpool(similarity_service.similar, fdc_id, limit, bounds)
+        if result is None:
+            nutrition = await usda_service.get_nutrition_by_fdc_id(fdc_id, "")
+            if nutrition is not None and nutrition.get("source") != "fallback":
+                # Not indexed yet: append it to the index instead of rebuilding from the whole store
+                await run_in_threadpool(similarity_service.add, [nutrition])
+                result = await run_in_threadpool(similarity_service.similar, fdc_id, limit, bounds)
+        if result is None:
+            raise HTTPException(status_code=404, detail=f"No nutrition data for FDC ID {fdc_id}")
+        
+        return JSONResponse(content=dict(result, constraints=constraints))
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error finding similar foods: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error finding similar foods: {str(e)}"
+        )
+
+
 @router.post("/chat")
 async def chat_with_assistant(request: ChatRequest):
     """Chat with the nutrition expert AI assistant."""
@@ -224,11 +382,12 @@ async def chat_with_assistant(request: ChatRequest):
         # Convert history to list of dicts
         history = [{"role": msg.role, "content": msg.content} for msg in request.history]
         
-        response = await gemini_service.chat(request.message, history)
+        reply = await chat_router.chat(request.message, history)
         
         logger.info("Chat response generated successfully")
         return JSONResponse(content={
-            "response": response,
+            "response": reply.response,
+            "nutrition_data": reply.nutrition_data.model_dump() if reply.nutrition_data else None,
             "status": "success"
         })
         
@@ -237,4 +396,179 @@ async def chat_with_assistant(request: ChatRequest):
         raise HTTPException(
             status_code=500,
             detail=f"Error processing chat: {str(e)}"
-        )
\ No newline at end of file
+        )
+
+
+@router.post("/food-log")
+async def add_food_log_entries(request: FoodLogRequest):
+    """Append one or more entries to a user's food log."""
+    try:
+        logger.info(f"Adding {len(request.entries)} food log entries for user '{request.user_id}'")
+        
+        entries = [entry.model_dump(exclude_none=True) for entry in request.entries]
+        ids = await run_in_threadpool(food_log_service.add_entries, request.user_id, entries)
+        
+        return JSONResponse(content={
+            "user_id": request.user_id,
+            "added": len(ids),
+            "ids": ids
+        })
+        
+    except ValueError as e:
+        logger.warning(f"Rejected food log entries: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error adding food log entries: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error adding food log entries: {str(e)}"
+        )
+
+
+@router.get("/food-log")
+async def get_food_log(
+    user_id: str = Query("default", description="User whose log to return"),
+    start_date: Optional[str] = Query(None, description="First day (YYYY-MM-DD, inclusive)"),
+    end_date: Optional[str] = Query(None, description="Last day (YYYY-MM-DD, inclusive)"),
+    limit: int = Query(100, description="Maximum number of entries to return", ge=1, le=1000),
+    offset: int = Query(0, description="Number of entries to skip", ge=0)
+):
+    """Get logged food entries for a user."""
+    try:
+        entries = await run_in_threadpool(
+            food_log_service.get_entries, user_id, start_date, end_date, limit, offset
+        )
+        return JSONResponse(content={
+            "user_id": user_id,
+            "entries": entries,
+            "count": len(entries)
+        })
+        
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error reading food log: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error reading food log: {str(e)}"
+        )
+
+
+@router.get("/food-log/totals")
+async def get_food_log_totals(
+    user_id: str = Query("default", description="User to aggregate"),
+    start_date: Optional[str] = Query(None, description="First day (YYYY-MM-DD, inclusive)"),
+    end_date: Optional[str] = Query(None, description="Last day (YYYY-MM-DD, inclusive)")
+):
+    """Get nutrient totals for a user over a date range (all time if no dates given)."""
+    try:
+        totals = await run_in_threadpool(food_log_service.get_totals, user_id, start_date, end_date)
+        return JSONResponse(content=totals)
+        
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error computing food log totals: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error computing food log totals: {str(e)}"
+        )
+
+
+@router.get("/food-log/daily")
+async def get_food_log_daily_totals(
+    start_date: str = Query(..., description="First day (YYYY-MM-DD, inclusive)"),
+    end_date: str = Query(..., description="Last day (YYYY-MM-DD, inclusive)"),
+    user_id: str = Query("default", description="User to aggregate")
+):
+    """Get per-day nutrient totals for a user."""
+    try:
+        days = await run_in_threadpool(food_log_service.get_daily_totals, user_id, start_date, end_date)
+        return JSONResponse(content={
+            "user_id": user_id,
+            "days": days
+        })
+        
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error reading daily totals: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error reading daily totals: {str(e)}"
+        )
+
+
+@router.post("/food-log/import")
+async def import_food_log(
+    request: Request,
+    user_id: str = Query("default", description="User to import entries for"),
+    format: str = Query("ndjson", description="Body format: ndjson or csv")
+):
+    """Import a food log from a streamed NDJSON or CSV request body."""
+    if format not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format '{format}'")
+    try:
+        logger.info(f"Importing {format} food log for user '{user_id}'")
+        importer = FoodLogImporter(user_id, format)
+        summary = await importer.run(request.stream())
+        return JSONResponse(content=summary)
+        
+    except Exception as e:
+        logger.error(f"Error importing food log: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error importing food log: {str(e)}"
+        )
+
+
+@router.get("/food-log/export")
+async def export_food_log(
+    user_id: str = Query("default", description="User whose log to export"),
+    format: str = Query("ndjson", description="Output format: ndjson or csv"),
+    start_date: Optional[str] = Query(None, description="First day (YYYY-MM-DD, inclusive)"),
+    end_date: Optional[str] = Query(None, description="Last day (YYYY-MM-DD, inclusive)")
+):
+    """Export a user's food log as a streamed NDJSON or CSV response."""
+    if format not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format '{format}'")
+    try:
+        start_date = parse_date(start_date, "start_date")
+        end_date = parse_date(end_date, "end_date")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    logger.info(f"Exporting {format} food log for user '{user_id}'")
+    return StreamingResponse(
+        export_entries(user_id, format, start_date, end_date),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="food-log-{user_id}.{format}"'}
+    )
+
+@router.get("/stats")
+async def get_nutrition_stats(
+    user_id: str = Query("default", description="User to summarize"),
+    start_date: Optional[str] = Query(None, description="First day (YYYY-MM-DD), defaults to 30 days before end_date"),
+    end_date: Optional[str] = Query(None, description="Last day (YYYY-MM-DD), defaults to today"),
+    period: str = Query("day", description="Rollup period: day or week"),
+    percentiles: List[float] = Query([50, 90], description="Percentiles of the per-period totals")
+):
+    """Get per-day or per-week nutrient rollups, summary statistics and trends."""
+    try:
+        end_date = parse_date(end_date, "end_date") or date.today().isoformat()
+        start_date = (parse_date(start_date, "start_date")
+                      or (parse_iso_date(end_date) - timedelta(days=29)).isoformat())
+        
+        stats = await run_in_threadpool(
+            analytics_service.rollup, user_id, start_date, end_date, period, percentiles
+        )
+        return JSONResponse(content=stats)
+        
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error computing stats: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error computing stats: {str(e)}"
+        )
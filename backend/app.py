@@ -1,3 +1,4 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from loguru import logger
@@ -5,8 +6,16 @@ import sys
 
 from .config import settings
 from .api.endpoints import router
+from .api.admin import router as admin_router
+from .models.model_manager import model_manager
+from .middleware.profiling import ProfilingMiddleware, profile_store
+from .middleware.admission import AdmissionMiddleware, admission_controller
 from .services.usda_service import usda_service
+from .services.nutrition_cache import nutrition_cache
 from .services.gemini_service import gemini_service
+from .services.food_log_service import food_log_service
+from .services.job_queue import job_scheduler
+from .services.enrichment_jobs import schedule_cache_warmup
 
 # Configure logging
 logger.remove()
@@ -16,12 +25,54 @@ logger.add(
     format="<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level: <8}</level> | <cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - <level>{message}</level>"
 )
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Initialize services on startup and clean them up on shutdown."""
+    logger.info("Starting up Nutrition Tracker API...")
+    if settings.USDA_API_KEY:
+        logger.info("USDA API key configured - real nutrition data available")
+    else:
+        logger.warning("USDA API key not configured - using fallback nutrition data")
+    if settings.GEMINI_API_KEY:
+        logger.info("Gemini API key configured - AI chat assistant available")
+    else:
+        logger.warning("Gemini API key not configured - chat assistant disabled")
+    if settings.UPSTREAM_MODE != "live":
+        logger.warning(f"Upstream mode '{settings.UPSTREAM_MODE}' - USDA/Gemini calls use {settings.UPSTREAM_FIXTURES_PATH}")
+    model_manager.start()
+    await job_scheduler.start()
+    if settings.JOB_WARM_CACHE_ON_STARTUP and settings.USDA_API_KEY:
+        schedule_cache_warmup(model_manager.model.class_labels.values())
+    
+    yield
+    
+    logger.info("Shutting down Nutrition Tracker API...")
+    # Run every step even if an earlier one fails, so the HTTP sessions are always closed
+    for name, shutdown in [
+        ("job scheduler", job_scheduler.stop),
+        ("model manager", model_manager.stop),
+        ("USDA session", usda_service.close_session),
+        ("Gemini session", gemini_service.close_session),
+    ]:
+        try:
+            await shutdown()
+        except Exception as e:
+            logger.error(f"Error stopping {name}: {str(e)}")
+    food_log_service.close()
+    nutrition_cache.close()
+    logger.info("All service sessions closed")
+
 # Create FastAPI app
 app = FastAPI(
     title=settings.PROJECT_NAME,
-    openapi_url=f"{settings.API_V1_STR}/openapi.json"
+    openapi_url=f"{settings.API_V1_STR}/openapi.json",
+    lifespan=lifespan
 )
 
+# Rate limit and shed load on the expensive routes (added first so CORS headers wrap its 429/503s)
+if settings.ADMISSION_ENABLED:
+    app.add_middleware(AdmissionMiddleware, controller=admission_controller)
+
 # Configure CORS
 app.add_middleware(
     CORSMiddleware,
@@ -31,29 +82,13 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-@app.on_event("startup")
-async def startup_event():
-    """Initialize services on startup."""
-    logger.info("Starting up Nutrition Tracker API...")
-    if settings.USDA_API_KEY:
-        logger.info("USDA API key configured - real nutrition data available")
-    else:
-        logger.warning("USDA API key not configured - using fallback nutrition data")
-    if settings.GEMINI_API_KEY:
-        logger.info("Gemini API key configured - AI chat assistant available")
-    else:
-        logger.warning("Gemini API key not configured - chat assistant disabled")
-
-@app.on_event("shutdown")
-async def shutdown_event():
-    """Clean up resources on shutdown."""
-    logger.info("Shutting down Nutrition Tracker API...")
-    await usda_service.close_session()
-    await gemini_service.close_session()
-    logger.info("All service sessions closed")
+# Capture profiles of slow requests (opt-in)
+if settings.PROFILING_ENABLED:
+    app.add_middleware(ProfilingMiddleware, store=profile_store)
 
 # Include API router
 app.include_router(router, prefix=settings.API_V1_STR)
+app.include_router(admin_router, prefix=f"{settings.API_V1_STR}/admin")
 
 @app.get("/")
 async def root():
@@ -66,10 +101,11 @@ async def root():
     }
 
 if __name__ == "__main__":
+    # Development server: python -m backend.app (use python -m backend.serve in production)
     import uvicorn
     logger.info(f"Starting {settings.PROJECT_NAME} on {settings.HOST}:{settings.PORT}")
     uvicorn.run(
-        "app:app",
+        "backend.app:app",
         host=settings.HOST,
         port=settings.PORT,
         reload=settings.DEBUG
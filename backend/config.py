@@ -15,21 +15,91 @@ class Settings(BaseSettings):
     MODEL_PATH: str = "trained_models/fruit_vegetable_classifier.h5"
     IMG_WIDTH: int = 150
     IMG_HEIGHT: int = 150
+    MODEL_REGISTRY_PATH: str = "trained_models/registry.json"
+    MODEL_LATENCY_BUDGET_MS: float = 0.0  # > 0 picks the best registered model within this budget
+    MODEL_WATCH_INTERVAL_S: float = 0.0  # > 0 reloads when the model file or registry changes
+    MODEL_DRAIN_TIMEOUT_S: float = 30.0
+    SHADOW_SAMPLE_RATE: float = 0.1  # share of /classify traffic mirrored to a candidate model
     
     # USDA API Settings
     USDA_API_KEY: str = ""
     USDA_BASE_URL: str = "https://api.nal.usda.gov/fdc/v1"
+    USDA_MAX_CONCURRENCY: int = 8  # concurrent USDA requests for batch lookups
+    NUTRITION_CACHE_MAX_ENTRIES: int = 10000
+    NUTRITION_CACHE_DB_PATH: str = ""  # SQLite file shared by all worker processes (empty = per-process memory only)
+    NUTRITION_CACHE_SHARED_DEFAULT: bool = True  # serve.py with several workers: use data/nutrition_cache.db if no path is set
+    SIMILARITY_REBUILD_INTERVAL_S: float = 30.0  # minimum time between background nutrient index rebuilds
     
     # Gemini API Settings
     GEMINI_API_KEY: str = ""  # Set via GEMINI_API_KEY environment variable or .env file
+    GEMINI_STRUCTURED_OUTPUT: bool = True  # Ask for JSON replies (falls back to the NUTRITION_DATA tag)
+    CHAT_LOCAL_ANSWERS: bool = True  # answer simple single-food nutrition questions without Gemini
+    CHAT_LOCAL_USDA_LOOKUP: bool = True  # allow a USDA lookup for foods not yet in the nutrition cache
+    
+    # Upstream Record/Replay Settings
+    UPSTREAM_MODE: str = "live"  # "live", "record" (store USDA/Gemini responses) or "replay" (serve them offline)
+    UPSTREAM_FIXTURES_PATH: str = "data/fixtures/upstream.jsonl"
+    UPSTREAM_REPLAY_LATENCY_SCALE: float = 1.0  # multiplier on recorded upstream latency (0 = respond instantly)
+    
+    # Food Log Settings
+    FOOD_LOG_DB_PATH: str = "data/food_log.db"
+    FOOD_LOG_BATCH_SIZE: int = 500
+    ANALYTICS_MAX_PARTITIONS: int = 256  # user/month partitions kept in memory
+    STATS_MAX_RANGE_DAYS: int = 731  # longest /stats date range (each month costs a query and a rollup)
+    FOOD_LOG_EXPORT_CHUNK_SIZE: int = 1000
+    FOOD_LOG_IMPORT_MAX_ERRORS: int = 100  # rejected rows reported back per import
+    
+    # Background Job Settings
+    JOB_QUEUE_CONCURRENCY: int = 4
+    JOB_QUEUE_MAX_PENDING: int = 10000
+    JOB_QUEUE_DB_PATH: str = ""  # SQLite file to persist pending jobs across restarts (empty = in memory)
+    JOB_RETRY_DELAY_S: float = 60.0  # delay before re-resolving foods that fell back to basic data
+    JOB_WARM_CACHE_ON_STARTUP: bool = True  # pre-fetch nutrition data for the classifier's labels
+    
+    # Admission Control Settings (per route group: vision = /classify, usda = food search, chat = /chat)
+    ADMISSION_ENABLED: bool = True
+    ADMISSION_TRUST_FORWARDED_FOR: bool = False  # identify clients by X-Forwarded-For (only behind a trusted proxy)
+    ADMISSION_MAX_CLIENTS: int = 10000  # client token buckets kept per route group
+    # Per group: concurrent requests, per-client rate (0 = no rate limit), burst and queue budget
+    ADMISSION_VISION_CONCURRENCY: int = 2
+    ADMISSION_VISION_RATE_PER_MIN: float = 30.0
+    ADMISSION_VISION_BURST: int = 5
+    ADMISSION_VISION_MAX_QUEUE_MS: float = 2000.0
+    ADMISSION_USDA_CONCURRENCY: int = 16
+    ADMISSION_USDA_RATE_PER_MIN: float = 120.0
+    ADMISSION_USDA_BURST: int = 20
+    ADMISSION_USDA_MAX_QUEUE_MS: float = 1000.0
+    ADMISSION_CHAT_CONCURRENCY: int = 4
+    ADMISSION_CHAT_RATE_PER_MIN: float = 20.0
+    ADMISSION_CHAT_BURST: int = 5
+    ADMISSION_CHAT_MAX_QUEUE_MS: float = 5000.0
+    
+    # Admin Settings
+    ADMIN_TOKEN: str = ""  # Required in the X-Admin-Token header; admin API is disabled when empty
     
     # Server Settings
     HOST: str = "127.0.0.1"
     PORT: int = 8000
     DEBUG: bool = True
+    SERVER_WORKERS: int = 0  # worker processes for serve.py (0 = tune to CPU cores and model memory; set by serve.py)
+    SERVER_WORKER_MEMORY_MB: float = 0.0  # expected memory per worker (0 = estimate from the model file)
+    SERVER_MAX_REQUESTS: int = 10000  # recycle a worker after this many requests (0 = never)
+    SERVER_MAX_REQUESTS_JITTER: int = 1000  # random extra requests per worker, so workers don't recycle together
+    SERVER_THREADS_PER_WORKER: int = 0  # TensorFlow/OpenMP threads per worker (0 = cores / workers)
+    SERVER_GRACEFUL_TIMEOUT_S: int = 30  # time to finish in-flight requests on shutdown
     
     # Logging Settings
     LOG_LEVEL: str = "INFO"
+    LAZY_HOT_PATH_LOGS: bool = True  # only format per-request log messages when the level is enabled
+    
+    # Profiling Settings
+    PROFILING_ENABLED: bool = False
+    PROFILING_MODE: str = "sampler"  # "sampler" (folded stacks for flame graphs) or "cprofile"
+    PROFILING_SAMPLE_RATE: float = 1.0  # share of requests to profile
+    PROFILING_SLOW_REQUEST_MS: float = 500.0  # keep captures for requests at least this slow
+    PROFILING_MAX_CAPTURES: int = 20
+    PROFILING_SAMPLER_INTERVAL_MS: float = 5.0
+    PROFILING_CPROFILE_TOP_N: int = 60
     
     class Config:
         case_sensitive = True
@@ -0,0 +1,17 @@
+from typing import Any, Callable
+from loguru import logger
+from .config import settings
+
+
+def hot_log(level: str, message: str, *args: Callable[[], Any]) -> None:
+    """
+    Log from a per-request hot path.
+
+    Arguments are passed as zero-argument callables. With LAZY_HOT_PATH_LOGS they
+    are only evaluated, and the message only formatted, when a handler accepts the
+    level; otherwise they are evaluated eagerly like a regular f-string log call.
+    """
+    if settings.LAZY_HOT_PATH_LOGS:
+        logger.opt(lazy=True, depth=1).log(level, message, *args)
+    else:
+        logger.opt(depth=1).log(level, message, *(arg() for arg in args))
@@ -0,0 +1,225 @@
+import asyncio
+import json
+import math
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+from loguru import logger
+from ..config import settings
+
+
+class TokenBucket:
+    """Refills `rate` tokens per second up to `burst`; each request takes one (rate 0 = no limit)."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def take(self) -> float:
+        """Take a token; returns 0 on success, else seconds until one is available"""
+        if self.rate <= 0:
+            return 0.0
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class RouteGroup:
+    """
+    Admission budget for a group of routes.
+
+    Each client gets its own token bucket (rate limit), and the whole group
+    shares a fixed number of concurrent slots. Requests that find every slot
+    busy wait in line, unless the expected wait (queue length times the average
+    service time) already exceeds the group's queue budget, in which case they
+    are shed immediately.
+    """
+
+    def __init__(self, name: str, prefixes: Tuple[str, ...], concurrency: int, rate_per_min: float,
+                 burst: int, max_queue_ms: float, max_clients: int):
+        self.name = name
+        self.prefixes = prefixes
+        self.concurrency = concurrency
+        self.rate = rate_per_min / 60
+        self.burst = burst
+        self.max_queue_s = max_queue_ms / 1000
+        self.max_clients = max_clients
+        self.active = 0
+        self.waiting = 0
+        self.avg_service_s: Optional[float] = None
+        self.stats = {"admitted": 0, "queued": 0, "rate_limited": 0, "shed": 0}
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self._slots = asyncio.Semaphore(concurrency)
+
+    def matches(self, path: str) -> bool:
+        return any(path == prefix or path.startswith(prefix + "/") for prefix in self.prefixes)
+
+    def check_rate(self, client: str) -> float:
+        """Take a token from the client's bucket; returns seconds to wait if there is none"""
+        if self.rate <= 0:
+            # Rate limiting disabled for this group, no need to track clients
+            return 0.0
+        bucket = self._buckets.get(client)
+        if bucket is None:
+            bucket = self._buckets[client] = TokenBucket(self.rate, self.burst)
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(client)
+        wait_s = bucket.take()
+        if wait_s:
+            self.stats["rate_limited"] += 1
+        return wait_s
+
+    def expected_wait(self) -> float:
+        """Estimated queueing time for a request arriving now"""
+        if self.avg_service_s is None:
+            return 0.0
+        return (self.waiting + 1) * self.avg_service_s / self.concurrency
+
+    async def acquire(self) -> float:
+        """
+        Take a concurrency slot, waiting up to the queue budget
+
+        Returns:
+            0 once admitted, else the suggested retry delay in seconds
+        """
+        if not self._slots.locked():
+            await self._slots.acquire()
+        else:
+            expected = self.expected_wait()
+            if expected > self.max_queue_s:
+                self.stats["shed"] += 1
+                return expected
+            self.waiting += 1
+            self.stats["queued"] += 1
+            try:
+                await asyncio.wait_for(self._slots.acquire(), timeout=self.max_queue_s)
+            except asyncio.TimeoutError:
+                self.stats["shed"] += 1
+                return max(self.expected_wait(), self.max_queue_s)
+            finally:
+                self.waiting -= 1
+        self.active += 1
+        self.stats["admitted"] += 1
+        return 0.0
+
+    def release(self, service_s: float) -> None:
+        self.active -= 1
+        self._slots.release()
+        # Exponentially weighted average of how long admitted requests hold a slot
+        if self.avg_service_s is None:
+            self.avg_service_s = service_s
+        else:
+            self.avg_service_s = 0.8 * self.avg_service_s + 0.2 * service_s
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "concurrency": self.concurrency,
+            "active": self.active,
+            "waiting": self.waiting,
+            "avg_service_ms": round(self.avg_service_s * 1000, 1) if self.avg_service_s is not None else None,
+            "rate_per_min": self.rate * 60,
+            "burst": self.burst,
+            "clients": len(self._buckets),
+            **self.stats
+        }
+
+
+class AdmissionController:
+    """The route groups with separate budgets for vision, USDA and chat traffic."""
+
+    def __init__(self):
+        prefix = settings.API_V1_STR
+        self.groups = [
+            RouteGroup("vision", (f"{prefix}/classify",),
+                       settings.ADMISSION_VISION_CONCURRENCY, settings.ADMISSION_VISION_RATE_PER_MIN,
+                       settings.ADMISSION_VISION_BURST, settings.ADMISSION_VISION_MAX_QUEUE_MS,
+                       settings.ADMISSION_MAX_CLIENTS),
+            RouteGroup("usda", (f"{prefix}/search-foods", f"{prefix}/search-nutrition", f"{prefix}/similar"),
+                       settings.ADMISSION_USDA_CONCURRENCY, settings.ADMISSION_USDA_RATE_PER_MIN,
+                       settings.ADMISSION_USDA_BURST, settings.ADMISSION_USDA_MAX_QUEUE_MS,
+                       settings.ADMISSION_MAX_CLIENTS),
+            RouteGroup("chat", (f"{prefix}/chat",),
+                       settings.ADMISSION_CHAT_CONCURRENCY, settings.ADMISSION_CHAT_RATE_PER_MIN,
+                       settings.ADMISSION_CHAT_BURST, settings.ADMISSION_CHAT_MAX_QUEUE_MS,
+                       settings.ADMISSION_MAX_CLIENTS),
+        ]
+
+    def group_for(self, path: str) -> Optional[RouteGroup]:
+        return next((group for group in self.groups if group.matches(path)), None)
+
+    def status(self) -> Dict[str, Any]:
+        return {"enabled": settings.ADMISSION_ENABLED, "groups": {group.name: group.status() for group in self.groups}}
+
+
+class AdmissionMiddleware:
+    """
+    Rate limiting and load shedding for the expensive routes.
+
+    Runs before the request body is read: a client over its rate gets 429, and a
+    request that cannot get a concurrency slot within the group's queue budget
+    gets 503. Both carry Retry-After. Other routes pass straight through.
+    """
+
+    def __init__(self, app, controller: "AdmissionController"):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        group = self.controller.group_for(scope["path"]) if scope["type"] == "http" else None
+        if group is None or scope["method"] == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+
+        client = self._client_id(scope)
+        retry_after = group.check_rate(client)
+        if retry_after:
+            logger.warning(f"Rate limited {client} on {group.name} routes")
+            await self._reject(send, 429, f"Too many {group.name} requests, slow down", retry_after)
+            return
+
+        retry_after = await group.acquire()
+        if retry_after:
+            logger.warning(f"Shedding {scope['path']}: {group.name} routes are overloaded "
+                           f"({group.active} active, {group.waiting} waiting)")
+            await self._reject(send, 503, f"Server busy ({group.name}), try again shortly", retry_after)
+            return
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            group.release(time.perf_counter() - start)
+
+    @staticmethod
+    def _client_id(scope) -> str:
+        if settings.ADMISSION_TRUST_FORWARDED_FOR:
+            for name, value in scope.get("headers", []):
+                if name == b"x-forwarded-for":
+                    return value.decode("latin-1").split(",")[0].strip()
+        client = scope.get("client")
+        return client[0] if client else "unknown"
+
+    @staticmethod
+    async def _reject(send, status: int, detail: str, retry_after: float) -> None:
+        body = json.dumps({"detail": detail}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(max(1, math.ceil(retry_after))).encode())
+            ]
+        })
+        await send({"type": "http.response.body", "body": body})
+
+# Global instance
+admission_controller = AdmissionController()
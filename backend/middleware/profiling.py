@@ -0,0 +1,189 @@
+import cProfile
+import io
+import itertools
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+from collections import Counter, deque
+from typing import Dict, Any, Optional, List, Tuple
+from loguru import logger
+from ..config import settings
+
+
+class ProfileCapture:
+    """Profile data captured for one slow request."""
+
+    def __init__(self, capture_id: int, method: str, path: str, duration_ms: float, mode: str, data: str):
+        self.id = capture_id
+        self.method = method
+        self.path = path
+        self.duration_ms = duration_ms
+        self.mode = mode
+        self.data = data
+        self.captured_at = time.time()
+
+    @property
+    def filename(self) -> str:
+        extension = "folded" if self.mode == "sampler" else "txt"
+        return f"profile-{self.id}.{extension}"
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "duration_ms": round(self.duration_ms, 1),
+            "mode": self.mode,
+            "captured_at": self.captured_at,
+            "filename": self.filename
+        }
+
+
+class ProfileStore:
+    """Keeps the last N slow-request captures."""
+
+    def __init__(self, max_captures: int):
+        self._captures: deque = deque(maxlen=max_captures)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def add(self, method: str, path: str, duration_ms: float, mode: str, data: str) -> ProfileCapture:
+        with self._lock:
+            capture = ProfileCapture(next(self._ids), method, path, duration_ms, mode, data)
+            self._captures.append(capture)
+            return capture
+
+    def list(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [capture.summary() for capture in reversed(self._captures)]
+
+    def get(self, capture_id: int) -> Optional[ProfileCapture]:
+        with self._lock:
+            return next((capture for capture in self._captures if capture.id == capture_id), None)
+
+
+# Frames from files under this directory are application code
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__))) + os.sep
+
+
+class StackSampler(threading.Thread):
+    """
+    Low-overhead statistical profiler.
+
+    Periodically snapshots the stack of the event loop thread, plus every other
+    thread that is running application code at that moment (e.g. model inference
+    or SQLite queries sent to the threadpool), and counts identical stacks. The
+    output is "folded" text that flame graph tools read directly (one
+    `frame;frame;frame count` line per distinct stack); stacks from other threads
+    are rooted at `[thread name]`. Threadpool work of concurrent requests is
+    included as well, since worker threads are shared.
+    """
+
+    def __init__(self, thread_id: int, interval_s: float, app_dir: str = APP_DIR):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval_s = interval_s
+        self.app_dir = app_dir
+        self.stacks: Counter = Counter()
+        self._stopped = threading.Event()
+
+    def run(self) -> None:
+        while not self._stopped.wait(self.interval_s):
+            names = None
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == self.ident:
+                    continue
+                stack, in_app = self._walk(frame)
+                if thread_id != self.thread_id:
+                    # Idle workers and unrelated threads are not part of the request
+                    if not in_app:
+                        continue
+                    if names is None:
+                        names = {thread.ident: thread.name for thread in threading.enumerate()}
+                    stack.append(f"[{names.get(thread_id, thread_id)}]")
+                if stack:
+                    self.stacks[";".join(reversed(stack))] += 1
+
+    def _walk(self, frame) -> Tuple[List[str], bool]:
+        """Frames from innermost to outermost, and whether any of them is application code"""
+        stack = []
+        in_app = False
+        while frame is not None:
+            code = frame.f_code
+            in_app = in_app or code.co_filename.startswith(self.app_dir)
+            stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        return stack, in_app
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self.join()
+
+    def folded(self) -> str:
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common())
+
+
+class ProfilingMiddleware:
+    """
+    Opt-in request profiler.
+
+    A sample of requests (PROFILING_SAMPLE_RATE) is profiled with either the stack
+    sampler or cProfile (PROFILING_MODE). Only requests slower than
+    PROFILING_SLOW_REQUEST_MS are kept. One request is profiled at a time, since
+    both profilers observe the whole event loop thread while active. cProfile
+    only sees the event loop thread, so work sent to the threadpool shows up as
+    time spent awaiting it; the sampler also covers the threadpool.
+    """
+
+    def __init__(self, app, store: "ProfileStore"):
+        self.app = app
+        self.store = store
+        self.mode = settings.PROFILING_MODE
+        self.sample_rate = settings.PROFILING_SAMPLE_RATE
+        self.threshold_ms = settings.PROFILING_SLOW_REQUEST_MS
+        self.interval_s = settings.PROFILING_SAMPLER_INTERVAL_MS / 1000
+        self._active = False
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self._active or random.random() >= self.sample_rate:
+            await self.app(scope, receive, send)
+            return
+
+        self._active = True
+        start = time.perf_counter()
+        sampler = profiler = None
+        try:
+            if self.mode == "cprofile":
+                profiler = cProfile.Profile()
+                profiler.enable()
+            else:
+                sampler = StackSampler(threading.get_ident(), self.interval_s)
+                sampler.start()
+            await self.app(scope, receive, send)
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            if sampler is not None:
+                sampler.stop()
+            self._active = False
+
+            duration_ms = (time.perf_counter() - start) * 1000
+            if duration_ms >= self.threshold_ms:
+                data = sampler.folded() if sampler is not None else self._format_stats(profiler)
+                capture = self.store.add(scope["method"], scope["path"], duration_ms, self.mode, data)
+                logger.warning(f"Slow request {scope['method']} {scope['path']} took {duration_ms:.0f}ms, "
+                               f"profile #{capture.id} captured")
+
+    @staticmethod
+    def _format_stats(profiler: cProfile.Profile) -> str:
+        """Render cProfile results sorted by cumulative time"""
+        output = io.StringIO()
+        stats = pstats.Stats(profiler, stream=output)
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(settings.PROFILING_CPROFILE_TOP_N)
+        return output.getvalue()
+
+# Global instance
+profile_store = ProfileStore(settings.PROFILING_MAX_CAPTURES)
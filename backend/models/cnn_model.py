@@ -1,38 +1,50 @@
 import numpy as np
 from keras.models import load_model
 from PIL import Image
-from typing import Dict, Any, Tuple
+from typing import Dict, Any, Tuple, Optional
 import os
 
 from .base_model import BaseModel
+from .model_registry import ModelRegistry, DEFAULT_CLASS_LABELS
 from ..config import settings
 
 class CNNModel(BaseModel):
-    def __init__(self):
+    def __init__(self, model_path: Optional[str] = None, latency_budget_ms: Optional[float] = None):
         self.model = None
+        self.model_path = model_path or settings.MODEL_PATH
+        self.latency_budget_ms = settings.MODEL_LATENCY_BUDGET_MS if latency_budget_ms is None else latency_budget_ms
+        self.img_size = (settings.IMG_WIDTH, settings.IMG_HEIGHT)
+        self.model_info: Optional[Dict[str, Any]] = None
         # Default class labels - these will be updated when model loads
-        self.class_labels = {
-            0: "apple", 1: "banana", 2: "beetroot", 3: "bell pepper",
-            4: "cabbage", 5: "capsicum", 6: "carrot", 7: "cauliflower",
-            8: "chilli pepper", 9: "corn", 10: "cucumber", 11: "eggplant",
-            12: "garlic", 13: "ginger", 14: "grapes", 15: "jalepeno",
-            16: "kiwi", 17: "lemon", 18: "lettuce", 19: "mango",
-            20: "onion", 21: "orange", 22: "paprika", 23: "pear",
-            24: "peas", 25: "pineapple", 26: "pomegranate", 27: "potato",
-            28: "raddish", 29: "soy beans", 30: "spinach", 31: "sweetcorn",
-            32: "sweetpotato", 33: "tomato", 34: "turnip", 35: "watermelon"
-        }
+        self.class_labels = dict(DEFAULT_CLASS_LABELS)
         self.load_model()
 
+    def select_from_registry(self) -> None:
+        """Pick the most accurate registered model within the latency budget."""
+        entry = ModelRegistry(settings.MODEL_REGISTRY_PATH).select(self.latency_budget_ms)
+        if entry is None:
+            print(f"Warning: No registered models in {settings.MODEL_REGISTRY_PATH}, using {self.model_path}")
+            return
+        self.model_info = entry
+        self.model_path = ModelRegistry(settings.MODEL_REGISTRY_PATH).resolve_path(entry)
+        height, width = entry.get("input_size", [settings.IMG_HEIGHT, settings.IMG_WIDTH])
+        self.img_size = (width, height)
+        if entry.get("class_names"):
+            self.class_labels = dict(enumerate(entry["class_names"]))
+        print(f"Selected model '{entry['name']}' ({entry.get('latency_ms')} ms, accuracy {entry.get('accuracy')}) "
+              f"for a {self.latency_budget_ms} ms latency budget")
+
     def load_model(self) -> None:
         """Load the CNN model from disk."""
         try:
-            if not os.path.exists(settings.MODEL_PATH):
-                print(f"Warning: Model file not found at {settings.MODEL_PATH}. Using mock predictions.")
+            if self.latency_budget_ms:
+                self.select_from_registry()
+            if not os.path.exists(self.model_path):
+                print(f"Warning: Model file not found at {self.model_path}. Using mock predictions.")
                 self.model = None
                 return
-            self.model = load_model(settings.MODEL_PATH)
-            print(f"Successfully loaded model from {settings.MODEL_PATH}")
+            self.model = load_model(self.model_path)
+            print(f"Successfully loaded model from {self.model_path}")
         except Exception as e:
             print(f"Warning: Failed to load CNN model: {str(e)}. Using mock predictions.")
             self.model = None
@@ -40,7 +52,7 @@ class CNNModel(BaseModel):
     def preprocess_image(self, image: Image.Image) -> np.ndarray:
         """Preprocess the image for CNN input."""
         # Resize image
-        image = image.resize((settings.IMG_WIDTH, settings.IMG_HEIGHT))
+        image = image.resize(self.img_size)
         # Convert to array and normalize (same as training)
         image_array = np.array(image) / 255.0
         # Add batch dimension
@@ -0,0 +1,284 @@
+import asyncio
+import itertools
+import os
+import random
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, Any, Optional, Tuple, AsyncIterator
+from fastapi.concurrency import run_in_threadpool
+from loguru import logger
+from PIL import Image
+
+from .cnn_model import CNNModel
+from ..config import settings
+
+_version_counter = itertools.count(1)
+
+
+class ModelVersion:
+    """A loaded model plus the bookkeeping needed to drain it after a swap."""
+
+    def __init__(self, model: CNNModel, explicit: bool = False):
+        self.model = model
+        self.number = next(_version_counter)
+        self.path = model.model_path
+        self.explicit = explicit  # loaded from a path given by an operator, not MODEL_PATH/the registry
+        self.mtime = os.path.getmtime(model.model_path) if os.path.exists(model.model_path) else None
+        self.loaded_at = time.time()
+        self.in_flight = 0
+        self.retired = False
+        self.drained = asyncio.Event()
+
+    @property
+    def name(self) -> str:
+        return f"v{self.number}:{os.path.basename(self.path)}"
+
+    def release(self) -> None:
+        """Mark one request as finished"""
+        self.in_flight -= 1
+        if self.retired and self.in_flight == 0:
+            self.drained.set()
+
+    def retire(self) -> None:
+        """Stop routing new requests here; drained fires once in-flight requests finish"""
+        self.retired = True
+        if self.in_flight == 0:
+            self.drained.set()
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "version": self.name,
+            "path": self.path,
+            "loaded_at": self.loaded_at,
+            "in_flight": self.in_flight,
+            "model_info": self.model.model_info,
+            "mock": self.model.model is None,
+            "explicit": self.explicit
+        }
+
+
+class ShadowStats:
+    """Latency and agreement of a candidate model against the live model."""
+
+    def __init__(self):
+        self.requests = 0
+        self.agreements = 0
+        self.errors = 0
+        self.primary_ms = 0.0
+        self.candidate_ms = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        compared = self.requests - self.errors
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "agreement_rate": round(self.agreements / compared, 4) if compared else None,
+            "avg_primary_ms": round(self.primary_ms / compared, 2) if compared else None,
+            "avg_candidate_ms": round(self.candidate_ms / compared, 2) if compared else None
+        }
+
+
+class ModelManager:
+    """
+    Owns the classifier used by /classify and swaps it without a restart.
+
+    New versions are loaded and warmed in a worker thread, then the reference is
+    swapped atomically. Requests already running on the old version keep it until
+    they finish. A candidate model can receive a sample of live traffic in the
+    background (shadow mode) so its latency and agreement can be compared before
+    it is promoted.
+    """
+
+    def __init__(self):
+        self.current = ModelVersion(CNNModel())
+        self.candidate: Optional[ModelVersion] = None
+        self.shadow_sample_rate = settings.SHADOW_SAMPLE_RATE
+        self.shadow_stats = ShadowStats()
+        self.retiring: Dict[str, ModelVersion] = {}
+        self._reload_lock = asyncio.Lock()
+        self._background: set = set()
+        self._watch_task: Optional[asyncio.Task] = None
+        self._registry_mtime = self._mtime(settings.MODEL_REGISTRY_PATH)
+
+    @staticmethod
+    def _mtime(path: str) -> Optional[float]:
+        return os.path.getmtime(path) if os.path.exists(path) else None
+
+    @property
+    def model(self) -> CNNModel:
+        """The live model (for non-inference helpers such as fallback nutrition data)"""
+        return self.current.model
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[ModelVersion]:
+        """Pin the live version for the duration of a request"""
+        version = self.current
+        version.in_flight += 1
+        try:
+            yield version
+        finally:
+            version.release()
+
+    async def predict(self, image: Image.Image) -> Tuple[str, float, str]:
+        """
+        Classify an image with the live model
+
+        Returns:
+            Tuple[str, float, str]: (predicted_class, confidence, model_version)
+        """
+        async with self.acquire() as version:
+            start = time.perf_counter()
+            predicted_class, confidence = await run_in_threadpool(version.model.predict, image)
+            primary_ms = (time.perf_counter() - start) * 1000
+
+        candidate = self.candidate
+        if candidate is not None and random.random() < self.shadow_sample_rate:
+            self._spawn(self._shadow(candidate, image, predicted_class, primary_ms))
+        return predicted_class, confidence, version.name
+
+    async def _shadow(self, candidate: ModelVersion, image: Image.Image, primary_class: str,
+                      primary_ms: float) -> None:
+        """Run the candidate on a copy of live traffic and record how it compares"""
+        self.shadow_stats.requests += 1
+        try:
+            start = time.perf_counter()
+            candidate_class, _ = await run_in_threadpool(candidate.model.predict, image)
+            self.shadow_stats.candidate_ms += (time.perf_counter() - start) * 1000
+            self.shadow_stats.primary_ms += primary_ms
+            self.shadow_stats.agreements += int(candidate_class == primary_class)
+        except Exception as e:
+            self.shadow_stats.errors += 1
+            logger.warning(f"Shadow prediction failed on {candidate.name}: {str(e)}")
+
+    def _spawn(self, coro) -> None:
+        """Run a coroutine in the background, keeping a reference until it finishes"""
+        task = asyncio.create_task(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def _load_version(self, model_path: Optional[str] = None,
+                            latency_budget_ms: Optional[float] = None) -> ModelVersion:
+        """
+        Load and warm a model in a worker thread
+
+        Raises:
+            RuntimeError: If the model could not be loaded (CNNModel falls back to mock
+                predictions in that case, which must never replace a working version)
+        """
+        def load() -> CNNModel:
+            model = CNNModel(model_path=model_path, latency_budget_ms=latency_budget_ms)
+            if model.model is None:
+                raise RuntimeError(f"Could not load a model from {model.model_path}")
+            # Warm up with a dummy image so the first real request does not pay for graph tracing
+            model.predict(Image.new("RGB", model.img_size))
+            return model
+
+        return ModelVersion(await run_in_threadpool(load), explicit=model_path is not None)
+
+    async def reload(self, model_path: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Load a new model version and make it live
+
+        Args:
+            model_path: Model file to load (default: MODEL_PATH or the registry selection)
+
+        Returns:
+            Information about the new live version
+
+        Raises:
+            RuntimeError: If the model could not be loaded; the live version is kept
+        """
+        async with self._reload_lock:
+            logger.info(f"Loading new model version from {model_path or 'configured path'}")
+            # An explicit path bypasses registry selection
+            new_version = await self._load_version(model_path, 0 if model_path else None)
+            old_version, self.current = self.current, new_version
+            old_version.retire()
+            self.retiring[old_version.name] = old_version
+            self._spawn(self._drain(old_version))
+            self._registry_mtime = self._mtime(settings.MODEL_REGISTRY_PATH)
+            logger.info(f"Swapped model {old_version.name} -> {new_version.name}")
+            return new_version.info()
+
+    async def _drain(self, version: ModelVersion) -> None:
+        """Wait for in-flight requests on a retired version, then drop it"""
+        try:
+            await asyncio.wait_for(version.drained.wait(), timeout=settings.MODEL_DRAIN_TIMEOUT_S)
+            logger.info(f"Model {version.name} drained")
+        except asyncio.TimeoutError:
+            logger.warning(f"Model {version.name} still had {version.in_flight} requests after "
+                           f"{settings.MODEL_DRAIN_TIMEOUT_S}s, releasing it anyway")
+        finally:
+            self.retiring.pop(version.name, None)
+
+    async def set_candidate(self, model_path: str, sample_rate: Optional[float] = None) -> Dict[str, Any]:
+        """Load a candidate model that receives shadow traffic"""
+        self.candidate = await self._load_version(model_path, 0)
+        if sample_rate is not None:
+            self.shadow_sample_rate = sample_rate
+        self.shadow_stats = ShadowStats()
+        logger.info(f"Shadowing {self.shadow_sample_rate:.0%} of traffic to {self.candidate.name}")
+        return self.candidate.info()
+
+    def clear_candidate(self) -> None:
+        """Stop shadow traffic"""
+        self.candidate = None
+
+    async def promote_candidate(self) -> Dict[str, Any]:
+        """Make the candidate the live model"""
+        async with self._reload_lock:
+            if self.candidate is None:
+                raise ValueError("No candidate model loaded")
+            old_version, self.current, self.candidate = self.current, self.candidate, None
+            old_version.retire()
+            self.retiring[old_version.name] = old_version
+            self._spawn(self._drain(old_version))
+            logger.info(f"Promoted candidate {self.current.name}")
+            return self.current.info()
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "current": self.current.info(),
+            "retiring": [version.info() for version in self.retiring.values()],
+            "candidate": self.candidate.info() if self.candidate else None,
+            "shadow_sample_rate": self.shadow_sample_rate,
+            "shadow_stats": self.shadow_stats.to_dict()
+        }
+
+    async def _watch(self) -> None:
+        """
+        Reload when the live model file or the registry changes on disk
+
+        A version an operator loaded from an explicit path (reload with a path, or
+        a promoted candidate) is reloaded from that path; the registry only
+        drives versions that came from the configured selection.
+        """
+        while True:
+            await asyncio.sleep(settings.MODEL_WATCH_INTERVAL_S)
+            try:
+                current = self.current
+                changed = self._mtime(current.path) != current.mtime
+                if settings.MODEL_LATENCY_BUDGET_MS and not current.explicit:
+                    changed = changed or self._mtime(settings.MODEL_REGISTRY_PATH) != self._registry_mtime
+                if changed:
+                    logger.info("Model change detected on disk")
+                    await self.reload(current.path if current.explicit else None)
+            except Exception as e:
+                logger.error(f"Model reload failed: {str(e)}")
+
+    def start(self) -> None:
+        """Start watching for new model versions (if enabled)"""
+        if settings.MODEL_WATCH_INTERVAL_S > 0 and self._watch_task is None:
+            self._watch_task = asyncio.create_task(self._watch())
+            logger.info(f"Watching for model changes every {settings.MODEL_WATCH_INTERVAL_S}s")
+
+    async def stop(self) -> None:
+        """Stop the watcher and wait for background work"""
+        if self._watch_task is not None:
+            self._watch_task.cancel()
+            self._watch_task = None
+        for task in list(self._background):
+            task.cancel()
+
+# Global instance
+model_manager = ModelManager()
@@ -0,0 +1,95 @@
+import json
+import os
+import time
+from typing import Dict, Any, List, Optional
+
+# Labels of the bundled classifier, used when the registry entry has no class names
+DEFAULT_CLASS_LABELS = {
+    0: "apple", 1: "banana", 2: "beetroot", 3: "bell pepper",
+    4: "cabbage", 5: "capsicum", 6: "carrot", 7: "cauliflower",
+    8: "chilli pepper", 9: "corn", 10: "cucumber", 11: "eggplant",
+    12: "garlic", 13: "ginger", 14: "grapes", 15: "jalepeno",
+    16: "kiwi", 17: "lemon", 18: "lettuce", 19: "mango",
+    20: "onion", 21: "orange", 22: "paprika", 23: "pear",
+    24: "peas", 25: "pineapple", 26: "pomegranate", 27: "potato",
+    28: "raddish", 29: "soy beans", 30: "spinach", 31: "sweetcorn",
+    32: "sweetpotato", 33: "tomato", 34: "turnip", 35: "watermelon"
+}
+
+
+class ModelRegistry:
+    """
+    JSON registry of trained classifier models.
+
+    Each entry records where a model lives and how it performed, so the API can
+    pick the most accurate model that fits a latency budget:
+
+        {"models": [{"name": ..., "path": ..., "architecture": ..., "accuracy": ...,
+                     "size_bytes": ..., "parameters": ..., "latency_ms": ...,
+                     "input_size": [height, width], "class_names": [...], "created_at": ...}]}
+
+    Model paths are stored relative to the registry file.
+
+    This module deliberately has no dependency on the API settings so the
+    training scripts can import it directly.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.base_dir = os.path.dirname(os.path.abspath(path))
+
+    def load(self) -> List[Dict[str, Any]]:
+        """Load all registry entries (empty if the registry does not exist yet)"""
+        if not os.path.exists(self.path):
+            return []
+        with open(self.path) as f:
+            return json.load(f).get("models", [])
+
+    def record(self, entry: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Add or replace (by name) a model entry
+
+        Args:
+            entry: Model metadata; "path" may be absolute or relative to the cwd
+
+        Returns:
+            The stored entry
+        """
+        entry = dict(entry)
+        entry["path"] = os.path.relpath(os.path.abspath(entry["path"]), self.base_dir)
+        entry.setdefault("created_at", time.strftime("%Y-%m-%dT%H:%M:%S"))
+
+        models = [model for model in self.load() if model.get("name") != entry["name"]]
+        models.append(entry)
+
+        os.makedirs(self.base_dir, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"models": models}, f, indent=2)
+        os.replace(tmp_path, self.path)
+        return entry
+
+    def resolve_path(self, entry: Dict[str, Any]) -> str:
+        """Absolute path of a registered model file"""
+        return os.path.join(self.base_dir, entry["path"])
+
+    def select(self, latency_budget_ms: float) -> Optional[Dict[str, Any]]:
+        """
+        Pick the most accurate model whose latency fits the budget
+
+        Falls back to the fastest registered model when none fits.
+
+        Args:
+            latency_budget_ms: Maximum acceptable single-image latency
+
+        Returns:
+            The chosen entry, or None if the registry is empty
+        """
+        models = [model for model in self.load() if os.path.exists(self.resolve_path(model))]
+        if not models:
+            return None
+
+        within_budget = [model for model in models if model.get("latency_ms", float("inf")) <= latency_budget_ms]
+        if within_budget:
+            return max(within_budget, key=lambda model: (model.get("accuracy", 0), -model.get("latency_ms", 0)))
+        return min(models, key=lambda model: model.get("latency_ms", float("inf")))
@@ -0,0 +1,4 @@
+"""
+Record/replay of upstream (USDA and Gemini) HTTP traffic, and a driver that
+replays request scenarios through the API for deterministic load tests.
+"""
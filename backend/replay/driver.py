@@ -0,0 +1,260 @@
+"""
+Replay request scenarios through the API in-process and report how it performs.
+
+    UPSTREAM_MODE=replay python -m backend.replay.driver scenarios.json --speedup 10
+
+A scenario file lists named scenarios, each a timeline of requests:
+
+    {"scenarios": [
+        {"name": "search", "requests": [
+            {"at": 0.0, "method": "GET", "path": "/api/v1/search-foods", "params": {"query": "apple"}}]},
+        {"name": "classify", "requests": [
+            {"at": 0.0, "method": "POST", "path": "/api/v1/classify", "file": "images/apple.jpg"}]},
+        {"name": "chat", "requests": [
+            {"at": 0.0, "transcript": ["How much protein in 200g spinach?", "And in a banana?"]}]}
+    ]}
+
+Requests start at `at` seconds (divided by the speed-up) regardless of how long
+earlier ones take. A transcript is sent to /chat one message at a time, each
+with the conversation so far. Relative file paths are resolved against the
+scenario file. Scenarios run one after another; for each one the report gives
+throughput, latency percentiles, status codes, upstream calls and requests the
+driver could not complete (failures).
+
+Every request comes from the client "replay" unless a scenario or request sets
+"client", so admission control would rate-limit the whole replay as a single
+client. It is therefore off unless --admission is given.
+"""
+import argparse
+import asyncio
+import json
+import mimetypes
+import os
+import time
+import uuid
+from collections import Counter
+from typing import Dict, Any, List, Optional, Tuple
+from urllib.parse import urlencode
+
+import numpy as np
+
+from .sessions import upstream_calls, upstream_misses
+from ..config import settings
+
+LATENCY_PERCENTILES = (50, 90, 95, 99)
+
+
+async def call_app(app, method: str, path: str, params: Optional[Dict[str, Any]] = None,
+                   body: bytes = b"", content_type: Optional[str] = None,
+                   client: str = "replay") -> Tuple[int, bytes]:
+    """Send one HTTP request to an ASGI app and collect the response"""
+    headers = [(b"host", b"replay")]
+    if content_type:
+        headers.append((b"content-type", content_type.encode()))
+    if body:
+        headers.append((b"content-length", str(len(body)).encode()))
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method.upper(),
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": urlencode(params or {}, doseq=True).encode(),
+        "root_path": "",
+        "headers": headers,
+        "client": (client, 0),
+        "server": ("replay", 80)
+    }
+    sent = False
+    status = 500
+    chunks: List[bytes] = []
+
+    async def receive():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        # Nothing more to read; wait until the app finishes
+        await asyncio.Event().wait()
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return status, b"".join(chunks)
+
+
+def encode_file(path: str) -> Tuple[bytes, str]:
+    """Encode an image as a multipart upload in the "file" field"""
+    boundary = uuid.uuid4().hex
+    content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+    with open(path, "rb") as f:
+        data = f.read()
+    body = (
+        f"--{boundary}\r\n"
+        f'Content-Disposition: form-data; name="file"; filename="{os.path.basename(path)}"\r\n'
+        f"Content-Type: {content_type}\r\n\r\n"
+    ).encode() + data + f"\r\n--{boundary}--\r\n".encode()
+    return body, f"multipart/form-data; boundary={boundary}"
+
+
+class ScenarioRun:
+    """Latencies and status codes collected while replaying one scenario."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.latencies_ms: List[float] = []
+        self.statuses: Counter = Counter()
+        # Requests the driver could not complete (bad response bodies, unreadable files), by reason
+        self.failures: Counter = Counter()
+
+    async def timed(self, app, method: str, path: str, **kwargs) -> Tuple[int, bytes]:
+        start = time.perf_counter()
+        try:
+            status, body = await call_app(app, method, path, **kwargs)
+        except Exception:
+            status, body = 500, b""
+        self.latencies_ms.append((time.perf_counter() - start) * 1000)
+        self.statuses[status] += 1
+        return status, body
+
+
+async def send_request(app, run: ScenarioRun, request: Dict[str, Any], base_dir: str, client: str) -> None:
+    """Replay one timeline entry (a single request or a whole chat transcript)"""
+    if "transcript" in request:
+        history: List[Dict[str, str]] = []
+        path = request.get("path", f"{settings.API_V1_STR}/chat")
+        for message in request["transcript"]:
+            payload = json.dumps({"message": message, "history": history}).encode()
+            status, body = await run.timed(app, "POST", path, body=payload,
+                                           content_type="application/json", client=client)
+            reply = ""
+            if status == 200:
+                try:
+                    reply = json.loads(body).get("response", "")
+                except (ValueError, AttributeError):
+                    run.failures["invalid chat response"] += 1
+            history += [{"role": "user", "content": message}, {"role": "assistant", "content": reply}]
+        return
+
+    body, content_type = b"", None
+    if "file" in request:
+        body, content_type = encode_file(os.path.join(base_dir, request["file"]))
+    elif "json" in request:
+        body, content_type = json.dumps(request["json"]).encode(), "application/json"
+    await run.timed(app, request.get("method", "GET"), request["path"], params=request.get("params"),
+                    body=body, content_type=content_type, client=request.get("client", client))
+
+
+async def run_scenario(app, scenario: Dict[str, Any], speedup: float, base_dir: str) -> Dict[str, Any]:
+    """Replay a scenario's timeline and summarize it"""
+    run = ScenarioRun(scenario["name"])
+    calls_before, misses_before = Counter(upstream_calls), Counter(upstream_misses)
+    client = scenario.get("client", "replay")
+
+    async def scheduled(request: Dict[str, Any]) -> None:
+        await asyncio.sleep(request.get("at", 0) / speedup)
+        try:
+            await send_request(app, run, request, base_dir, client)
+        except Exception as e:
+            # One broken request must not abort the rest of the scenario
+            run.failures[f"{type(e).__name__}: {e}"] += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(scheduled(request) for request in scenario["requests"]))
+    duration_s = time.perf_counter() - start
+
+    latencies = np.array(run.latencies_ms)
+    report = {
+        "name": run.name,
+        "requests": len(latencies),
+        "duration_s": round(duration_s, 3),
+        "throughput_rps": round(len(latencies) / duration_s, 2) if duration_s else None,
+        "statuses": {str(status): count for status, count in sorted(run.statuses.items())},
+        "failures": dict(run.failures),
+        "upstream_calls": dict(upstream_calls - calls_before),
+        "upstream_misses": dict(upstream_misses - misses_before)
+    }
+    if len(latencies):
+        report["latency_ms"] = {
+            "mean": round(float(latencies.mean()), 2),
+            **{f"p{p}": round(float(value), 2)
+               for p, value in zip(LATENCY_PERCENTILES, np.percentile(latencies, LATENCY_PERCENTILES))},
+            "max": round(float(latencies.max()), 2)
+        }
+    return report
+
+
+async def replay(path: str, speedup: float = 1.0, only: Optional[List[str]] = None,
+                 cold: bool = False, admission: bool = False) -> List[Dict[str, Any]]:
+    """
+    Replay every scenario in a file through the app (with its lifespan running)
+
+    Args:
+        path: Scenario file
+        speedup: Divide request start times by this factor
+        only: Names of the scenarios to run (default: all)
+        cold: Empty the nutrition cache before each scenario and leave the shared
+            cache database (NUTRITION_CACHE_DB_PATH) unused for the whole replay
+        admission: Keep admission control on (its rate limits see the replay as one client)
+
+    Returns:
+        One report per scenario
+    """
+    # The app adds the admission middleware when it is imported
+    settings.ADMISSION_ENABLED = admission
+    from ..app import app
+    from ..services.nutrition_cache import nutrition_cache
+
+    if cold:
+        # The database would keep serving what earlier runs fetched
+        nutrition_cache.close()
+        nutrition_cache.db_path = ""
+
+    with open(path) as f:
+        scenarios = json.load(f)["scenarios"]
+    base_dir = os.path.dirname(os.path.abspath(path))
+
+    reports = []
+    async with app.router.lifespan_context(app):
+        for scenario in scenarios:
+            if only and scenario["name"] not in only:
+                continue
+            if cold:
+                nutrition_cache.clear()
+            reports.append(await run_scenario(app, scenario, speedup, base_dir))
+    return reports
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Replay request scenarios through the API")
+    parser.add_argument("scenarios", help="Scenario JSON file")
+    parser.add_argument("--speedup", type=float, default=1.0, help="Replay the timeline this many times faster")
+    parser.add_argument("--scenario", action="append", help="Only run the named scenario (repeatable)")
+    parser.add_argument("--cold", action="store_true",
+                        help="Empty the nutrition cache before each scenario (the shared cache database is not used)")
+    parser.add_argument("--admission", action="store_true",
+                        help="Keep admission control on (all requests count as one client unless scenarios set 'client')")
+    parser.add_argument("--output", help="Write the report to this JSON file")
+    args = parser.parse_args()
+
+    if settings.UPSTREAM_MODE != "replay":
+        print(f"Warning: UPSTREAM_MODE is '{settings.UPSTREAM_MODE}', upstream calls will hit the network")
+
+    reports = asyncio.run(replay(args.scenarios, args.speedup, args.scenario, args.cold, args.admission))
+    output = json.dumps({"upstream_mode": settings.UPSTREAM_MODE, "speedup": args.speedup,
+                         "scenarios": reports}, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+import hashlib
+import json
+import os
+import threading
+from typing import Dict, Any, Optional, Tuple
+from urllib.parse import urlsplit, urlunsplit, parse_qsl
+
+# Query parameters holding API keys; never part of a fixture key or stored
+SECRET_PARAMS = {"api_key", "key"}
+
+
+def request_key(method: str, url: str, params: Optional[Dict[str, Any]] = None,
+                body: Optional[Any] = None) -> Tuple[str, Dict[str, Any]]:
+    """
+    Identify an upstream request independently of the API key
+
+    Args:
+        method: HTTP method
+        url: Request URL (its query string is merged with params)
+        params: Query parameters
+        body: JSON body
+
+    Returns:
+        (key, description): a stable hash and the sanitized request it was built from
+    """
+    parts = urlsplit(url)
+    query = [(name, value) for name, value in parse_qsl(parts.query) if name not in SECRET_PARAMS]
+    for name, value in (params or {}).items():
+        if name in SECRET_PARAMS:
+            continue
+        for item in value if isinstance(value, (list, tuple)) else [value]:
+            query.append((name, str(item)))
+    description = {
+        "method": method.upper(),
+        "url": urlunsplit((parts.scheme, parts.netloc, parts.path, "", "")),
+        "params": sorted(query),
+        "body": body
+    }
+    key = hashlib.sha256(json.dumps(description, sort_keys=True).encode()).hexdigest()
+    return key, description
+
+
+class FixtureStore:
+    """
+    Recorded upstream responses, one JSON object per line.
+
+    Each fixture holds the sanitized request, the response status and body, and
+    how long the upstream took, so replays can reproduce latency as well as
+    content. Re-recording a request replaces the earlier fixture.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fixtures: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    if line.strip():
+                        fixture = json.loads(line)
+                        self._fixtures[fixture["key"]] = fixture
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        return self._fixtures.get(key)
+
+    def record(self, key: str, request: Dict[str, Any], status: int, body: str, latency_ms: float) -> None:
+        """Store a response (appended to the file; the last one for a key wins on load)"""
+        fixture = {"key": key, "request": request, "status": status, "body": body,
+                   "latency_ms": round(latency_ms, 2)}
+        with self._lock:
+            self._fixtures[key] = fixture
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.path, "a") as f:
+                f.write(json.dumps(fixture) + "\n")
+
+    def __len__(self) -> int:
+        return len(self._fixtures)
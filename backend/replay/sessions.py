@@ -0,0 +1,172 @@
+import asyncio
+import json
+from abc import ABC, abstractmethod
+import time
+from collections import Counter
+from typing import Dict, Any, Optional
+from urllib.parse import urlsplit
+
+import aiohttp
+from loguru import logger
+
+from .fixtures import FixtureStore, request_key
+from ..config import settings
+
+# API key placeholder so services accept requests while replaying without real keys
+REPLAY_API_KEY = "replay"
+
+# Upstream requests made through recording/replaying sessions, by "service METHOD path"
+upstream_calls: Counter = Counter()
+# Replayed requests that had no recorded fixture
+upstream_misses: Counter = Counter()
+
+_store: Optional[FixtureStore] = None
+
+
+def fixture_store() -> FixtureStore:
+    """The fixture store shared by all sessions (loaded on first use)"""
+    global _store
+    if _store is None:
+        _store = FixtureStore(settings.UPSTREAM_FIXTURES_PATH)
+        logger.info(f"Loaded {len(_store)} upstream fixtures from {settings.UPSTREAM_FIXTURES_PATH}")
+    return _store
+
+
+class FixtureResponse:
+    """The parts of an aiohttp response the services use."""
+
+    def __init__(self, status: int, body: str):
+        self.status = status
+        self._body = body
+
+    async def text(self) -> str:
+        return self._body
+
+    async def json(self) -> Any:
+        return json.loads(self._body)
+
+    async def __aenter__(self) -> "FixtureResponse":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        return None
+
+
+class _PendingRequest:
+    """Makes `async with session.get(...) as response` work like aiohttp."""
+
+    def __init__(self, coro):
+        self._coro = coro
+
+    async def __aenter__(self) -> FixtureResponse:
+        return await self._coro
+
+    async def __aexit__(self, *exc_info) -> None:
+        return None
+
+
+class _UpstreamSession(ABC):
+    """Base for sessions that stand in for aiohttp.ClientSession in the services."""
+
+    def __init__(self, service: str):
+        self.service = service
+        self.closed = False
+
+    def get(self, url: str, params: Optional[Dict[str, Any]] = None, **kwargs) -> _PendingRequest:
+        return _PendingRequest(self._request("GET", url, params, kwargs.get("json")))
+
+    def post(self, url: str, json: Optional[Any] = None, params: Optional[Dict[str, Any]] = None,
+             **kwargs) -> _PendingRequest:
+        return _PendingRequest(self._request("POST", url, params, json))
+
+    def _count(self, method: str, url: str) -> None:
+        upstream_calls[f"{self.service} {method} {urlsplit(url).path}"] += 1
+
+    @abstractmethod
+    async def _request(self, method: str, url: str, params: Optional[Dict[str, Any]],
+                       body: Optional[Any]) -> FixtureResponse:
+        """Answer one upstream request"""
+        pass
+
+    async def close(self) -> None:
+        self.closed = True
+
+
+class RecordingSession(_UpstreamSession):
+    """Makes real requests and stores each response and its latency as a fixture."""
+
+    def __init__(self, service: str, store: FixtureStore):
+        super().__init__(service)
+        self.store = store
+        self.session = aiohttp.ClientSession()
+
+    async def _request(self, method: str, url: str, params: Optional[Dict[str, Any]],
+                       body: Optional[Any]) -> FixtureResponse:
+        self._count(method, url)
+        start = time.perf_counter()
+        async with self.session.request(method, url, params=params, json=body) as response:
+            text = await response.text()
+            status = response.status
+        latency_ms = (time.perf_counter() - start) * 1000
+        key, request = request_key(method, url, params, body)
+        self.store.record(key, request, status, text, latency_ms)
+        return FixtureResponse(status, text)
+
+    async def close(self) -> None:
+        await self.session.close()
+        await super().close()
+
+
+class ReplaySession(_UpstreamSession):
+    """Answers from recorded fixtures, waiting the recorded latency (scaled)."""
+
+    def __init__(self, service: str, store: FixtureStore, latency_scale: Optional[float] = None):
+        super().__init__(service)
+        self.store = store
+        self.latency_scale = settings.UPSTREAM_REPLAY_LATENCY_SCALE if latency_scale is None else latency_scale
+
+    async def _request(self, method: str, url: str, params: Optional[Dict[str, Any]],
+                       body: Optional[Any]) -> FixtureResponse:
+        self._count(method, url)
+        key, request = request_key(method, url, params, body)
+        fixture = self.store.get(key)
+        if fixture is None:
+            upstream_misses[self.service] += 1
+            logger.warning(f"No recorded fixture for {self.service} {method} {request['url']}")
+            return FixtureResponse(503, "No recorded fixture for this request")
+        if self.latency_scale > 0:
+            await asyncio.sleep(fixture["latency_ms"] / 1000 * self.latency_scale)
+        return FixtureResponse(fixture["status"], fixture["body"])
+
+
+def create_upstream_session(service: str):
+    """
+    Create the HTTP session a service uses for upstream calls
+
+    Args:
+        service: Service name used in fixtures and call counters ("usda", "gemini")
+
+    Returns:
+        A plain aiohttp.ClientSession when UPSTREAM_MODE is "live", otherwise a
+        recording or replaying session with the same interface
+    """
+    if settings.UPSTREAM_MODE == "record":
+        return RecordingSession(service, fixture_store())
+    if settings.UPSTREAM_MODE == "replay":
+        return ReplaySession(service, fixture_store())
+    return aiohttp.ClientSession()
+
+
+def upstream_api_key(api_key: str) -> str:
+    """The configured API key, or a placeholder when replaying without one"""
+    if not api_key and settings.UPSTREAM_MODE == "replay":
+        return REPLAY_API_KEY
+    return api_key
+
+
+def upstream_status() -> Dict[str, Any]:
+    return {
+        "mode": settings.UPSTREAM_MODE,
+        "calls": dict(upstream_calls),
+        "misses": dict(upstream_misses)
+    }
@@ -0,0 +1,184 @@
+"""
+Production launcher: several uvicorn workers on one port.
+
+    python -m backend.serve [--workers N] [--host HOST] [--port PORT]
+
+Settings are loaded once here and exported to the environment, so every worker
+starts from the same configuration. Each worker gets an equal share of the
+cores for its TensorFlow and OpenMP thread pools. Workers are recycled after
+SERVER_MAX_REQUESTS requests plus a random jitter of up to
+SERVER_MAX_REQUESTS_JITTER (uvicorn replaces them), and on shutdown each worker
+gets SERVER_GRACEFUL_TIMEOUT_S to finish in-flight requests before its lifespan
+shutdown closes the HTTP sessions.
+
+State that lives in a worker process is not shared: admission limits apply per
+worker, and the admin endpoints that change the model or read profiles are
+rejected with more than one worker (see api/admin.py).
+"""
+import argparse
+import os
+import random
+from socket import socket
+from typing import List, Optional
+
+import uvicorn
+from loguru import logger
+from uvicorn.supervisors import Multiprocess
+
+from .config import settings
+from .models.model_registry import ModelRegistry
+
+# Memory a worker needs besides the model weights (interpreter, TensorFlow runtime, buffers)
+# Nutrition cache file shared by the workers when NUTRITION_CACHE_DB_PATH is not set
+SHARED_NUTRITION_CACHE_PATH = "data/nutrition_cache.db"
+WORKER_BASE_MEMORY_MB = 400
+# Loaded weights plus inference activations, relative to the model file size
+MODEL_MEMORY_FACTOR = 3
+# Share of the available memory the workers may use
+MEMORY_HEADROOM = 0.8
+
+
+def cpu_count() -> int:
+    """CPU cores available to this process"""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def available_memory_mb() -> Optional[float]:
+    """Memory available for new processes, if it can be determined"""
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_AVPHYS_PAGES") / 2 ** 20
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def model_file_path() -> str:
+    """The model file a worker will load (the registry selection when a latency budget is set)"""
+    if settings.MODEL_LATENCY_BUDGET_MS:
+        registry = ModelRegistry(settings.MODEL_REGISTRY_PATH)
+        entry = registry.select(settings.MODEL_LATENCY_BUDGET_MS)
+        if entry is not None:
+            return registry.resolve_path(entry)
+    return settings.MODEL_PATH
+
+
+def worker_memory_mb() -> float:
+    """Expected resident memory of one worker"""
+    if settings.SERVER_WORKER_MEMORY_MB:
+        return settings.SERVER_WORKER_MEMORY_MB
+    path = model_file_path()
+    model_mb = os.path.getsize(path) / 2 ** 20 if os.path.exists(path) else 0
+    return WORKER_BASE_MEMORY_MB + MODEL_MEMORY_FACTOR * model_mb
+
+
+def default_workers() -> int:
+    """One worker per core, limited by how many copies of the model fit in memory"""
+    workers = cpu_count()
+    memory_mb = available_memory_mb()
+    if memory_mb is not None:
+        workers = min(workers, int(memory_mb * MEMORY_HEADROOM // worker_memory_mb()))
+    return max(1, workers)
+
+
+def export_settings(workers: int) -> None:
+    """
+    Put the resolved settings in the environment so worker processes read the same values
+
+    With several workers the nutrition cache is shared through
+    SHARED_NUTRITION_CACHE_PATH unless a path is configured or
+    NUTRITION_CACHE_SHARED_DEFAULT is turned off, so a food fetched by one
+    worker is not fetched from USDA again by every other.
+    """
+    if workers > 1 and not settings.NUTRITION_CACHE_DB_PATH and settings.NUTRITION_CACHE_SHARED_DEFAULT:
+        settings.NUTRITION_CACHE_DB_PATH = SHARED_NUTRITION_CACHE_PATH
+    for name, value in settings.model_dump().items():
+        os.environ[name] = str(value)
+    os.environ["SERVER_WORKERS"] = str(workers)
+
+
+def export_thread_limits(workers: int) -> int:
+    """
+    Size each worker's TensorFlow and OpenMP thread pools to its share of the cores
+
+    Without a limit every worker starts one thread per core, so N workers
+    oversubscribe the CPU N times during inference. Variables already set in
+    the environment are kept.
+
+    Returns:
+        Threads per worker
+    """
+    threads = settings.SERVER_THREADS_PER_WORKER or max(1, cpu_count() // workers)
+    for name in ("TF_NUM_INTRAOP_THREADS", "TF_NUM_INTEROP_THREADS", "OMP_NUM_THREADS"):
+        os.environ.setdefault(name, str(threads))
+    return threads
+
+
+class RecyclingServer(uvicorn.Server):
+    """uvicorn server whose request limit gets a random jitter in each worker process"""
+
+    def __init__(self, config: uvicorn.Config, max_requests_jitter: int):
+        super().__init__(config)
+        self.max_requests_jitter = max_requests_jitter
+
+    def run(self, sockets: Optional[List[socket]] = None) -> None:
+        # Runs in the worker process (and again in each replacement), so every worker draws its own limit
+        if self.config.limit_max_requests and self.max_requests_jitter > 0:
+            self.config.limit_max_requests += random.randint(0, self.max_requests_jitter)
+        super().run(sockets)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run the Nutrition Tracker API with multiple workers")
+    parser.add_argument("--host", default=settings.HOST)
+    parser.add_argument("--port", type=int, default=settings.PORT)
+    parser.add_argument("--workers", type=int, default=settings.SERVER_WORKERS,
+                        help="Worker processes (default: tuned to CPU cores and model memory)")
+    parser.add_argument("--max-requests", type=int, default=settings.SERVER_MAX_REQUESTS,
+                        help="Recycle a worker after this many requests (0 = never)")
+    parser.add_argument("--max-requests-jitter", type=int, default=settings.SERVER_MAX_REQUESTS_JITTER,
+                        help="Random extra requests per worker before it is recycled")
+    parser.add_argument("--graceful-timeout", type=int, default=settings.SERVER_GRACEFUL_TIMEOUT_S,
+                        help="Seconds to finish in-flight requests on shutdown")
+    args = parser.parse_args()
+
+    workers = args.workers or default_workers()
+    export_settings(workers)
+    threads = export_thread_limits(workers)
+    if workers > 1:
+        if settings.NUTRITION_CACHE_DB_PATH:
+            logger.info(f"Workers share the nutrition cache in {settings.NUTRITION_CACHE_DB_PATH}")
+        else:
+            logger.warning("NUTRITION_CACHE_SHARED_DEFAULT is off, each worker keeps its own nutrition cache")
+        if settings.ADMISSION_ENABLED:
+            logger.info(f"Admission limits apply per worker: a client may get up to {workers}x the configured rates")
+        logger.info("Admin model reload/candidate and profile endpoints are disabled with multiple workers")
+
+    logger.info(f"Starting {settings.PROJECT_NAME} on {args.host}:{args.port} with {workers} workers "
+                f"({cpu_count()} cores, {threads} threads and ~{worker_memory_mb():.0f}MB per worker)")
+    config = uvicorn.Config(
+        "backend.app:app",
+        host=args.host,
+        port=args.port,
+        workers=workers,
+        reload=False,
+        limit_max_requests=args.max_requests or None,
+        timeout_graceful_shutdown=args.graceful_timeout,
+        log_level=settings.LOG_LEVEL.lower()
+    )
+    server = RecyclingServer(config, args.max_requests_jitter)
+    if workers > 1:
+        Multiprocess(config, target=server.run, sockets=[config.bind_socket()]).run()
+    else:
+        server.run()
+
+
+if __name__ == "__main__":
+    main()
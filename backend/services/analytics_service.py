@@ -0,0 +1,201 @@
+import calendar
+import threading
+from datetime import date, timedelta
+from typing import Dict, Any, Optional, List, Tuple, Sequence
+import numpy as np
+from loguru import logger
+from ..config import settings
+from .usda_service import NUTRIENT_FIELDS
+from .food_log_service import food_log_service, FoodLogService, parse_iso_date
+
+PERIODS = ("day", "week")
+
+
+class MonthPartition:
+    """Columnar copy of one user's food log entries for one calendar month"""
+
+    def __init__(self, days: np.ndarray, values: np.ndarray):
+        self.days = days          # datetime64[D], one per entry
+        self.values = values      # float64, shape (entries, len(NUTRIENT_FIELDS))
+
+    def __len__(self) -> int:
+        return len(self.days)
+
+
+class AnalyticsService:
+    """
+    Vectorized rollups over logged meals.
+
+    Entries are held in NumPy arrays partitioned by user and month. Partitions are
+    loaded lazily from the food log store and dropped when the store reports a
+    write for that user and month, so repeated weekly or monthly summaries only
+    pay for array reductions. Writes made by other processes sharing the database
+    (multiple server workers) are not reported, so every rollup first checks the
+    database's data version and drops all partitions when it has changed.
+    """
+
+    def __init__(self, store: FoodLogService):
+        self.store = store
+        self.max_partitions = settings.ANALYTICS_MAX_PARTITIONS
+        self.max_range_days = settings.STATS_MAX_RANGE_DAYS
+        self._partitions: Dict[Tuple[str, str], MonthPartition] = {}
+        self._lock = threading.Lock()
+        self._data_version: Optional[int] = None
+        store.add_listener(self._invalidate)
+
+    def _invalidate(self, user_id: str, entry_dates: List[str]) -> None:
+        """Drop cached partitions touched by a write"""
+        with self._lock:
+            for month in {entry_date[:7] for entry_date in entry_dates}:
+                self._partitions.pop((user_id, month), None)
+
+    def _check_external_writes(self) -> None:
+        """Drop every cached partition if another process wrote to the food log"""
+        data_version = self.store.data_version()
+        with self._lock:
+            if data_version != self._data_version:
+                if self._partitions:
+                    logger.debug(f"Food log changed in another process, dropping {len(self._partitions)} partitions")
+                self._partitions.clear()
+                self._data_version = data_version
+
+    def _get_partition(self, user_id: str, month: str) -> MonthPartition:
+        """Get the columnar partition for a user and month (YYYY-MM), loading it if needed"""
+        key = (user_id, month)
+        with self._lock:
+            partition = self._partitions.get(key)
+        if partition is not None:
+            return partition
+
+        version = self.store.version
+        year, month_number = int(month[:4]), int(month[5:7])
+        last_day = calendar.monthrange(year, month_number)[1]
+        rows = self.store.get_entry_columns(user_id, f"{month}-01", f"{month}-{last_day:02d}")
+
+        if rows:
+            days = np.array([row[0] for row in rows], dtype="datetime64[D]")
+            values = np.array([tuple(row)[1:] for row in rows], dtype=np.float64)
+        else:
+            days = np.empty(0, dtype="datetime64[D]")
+            values = np.empty((0, len(NUTRIENT_FIELDS)), dtype=np.float64)
+        partition = MonthPartition(days, values)
+
+        with self._lock:
+            # Checked under the lock so an invalidation cannot slip in before the insert
+            if self.store.version != version:
+                # A write landed while loading, serve this copy but do not cache it
+                return partition
+            if len(self._partitions) >= self.max_partitions:
+                # Evict the oldest loaded partition (dicts keep insertion order)
+                self._partitions.pop(next(iter(self._partitions)))
+            self._partitions[key] = partition
+        logger.debug(f"Loaded analytics partition {user_id}/{month} ({len(partition)} entries)")
+        return partition
+
+    def _load_range(self, user_id: str, start: date, end: date) -> Tuple[np.ndarray, np.ndarray]:
+        """Concatenate the partitions covering a date range and mask to the range"""
+        months = []
+        cursor = start.replace(day=1)
+        while cursor <= end:
+            months.append(cursor.strftime("%Y-%m"))
+            cursor = (cursor + timedelta(days=32)).replace(day=1)
+
+        partitions = [self._get_partition(user_id, month) for month in months]
+        days = np.concatenate([p.days for p in partitions])
+        values = np.concatenate([p.values for p in partitions])
+
+        mask = (days >= np.datetime64(start, "D")) & (days <= np.datetime64(end, "D"))
+        return days[mask], values[mask]
+
+    def rollup(self, user_id: str, start_date: str, end_date: str, period: str = "day",
+               percentiles: Sequence[float] = (50, 90)) -> Dict[str, Any]:
+        """
+        Summarize logged nutrients per day or week
+
+        Args:
+            user_id: User to summarize
+            start_date: First day (ISO date, inclusive)
+            end_date: Last day (ISO date, inclusive)
+            period: "day" or "week" (weeks start on Monday)
+            percentiles: Percentiles of the per-period totals to report
+
+        Returns:
+            Per-period totals, summary statistics and a linear trend per nutrient
+
+        Raises:
+            ValueError: For an unknown period, a reversed range or one longer than STATS_MAX_RANGE_DAYS
+        """
+        if period not in PERIODS:
+            raise ValueError(f"Unsupported period '{period}', expected one of {PERIODS}")
+        start, end = parse_iso_date(start_date), parse_iso_date(end_date)
+        if start > end:
+            raise ValueError("start_date must not be after end_date")
+        if (end - start).days + 1 > self.max_range_days:
+            raise ValueError(f"Date range is longer than {self.max_range_days} days")
+
+        self._check_external_writes()
+        days, values = self._load_range(user_id, start, end)
+
+        # Bucket every entry by the first day of its period
+        if period == "week":
+            # 1970-01-01 was a Thursday, shift so buckets start on Monday
+            offsets = (days.astype(np.int64) + 3) % 7
+            buckets = days - offsets.astype("timedelta64[D]")
+        else:
+            buckets = days
+        starts, inverse = np.unique(buckets, return_inverse=True)
+
+        totals = np.zeros((len(starts), len(NUTRIENT_FIELDS)), dtype=np.float64)
+        np.add.at(totals, inverse, values)
+        counts = np.bincount(inverse, minlength=len(starts))
+
+        result = {
+            "user_id": user_id,
+            "start_date": start_date,
+            "end_date": end_date,
+            "period": period,
+            "entry_count": int(len(days)),
+            "periods": [
+                {
+                    "start": str(period_start),
+                    "entries": int(count),
+                    **{field: round(float(total), 1) for field, total in zip(NUTRIENT_FIELDS, row)}
+                }
+                for period_start, count, row in zip(starts, counts, totals)
+            ],
+            "summary": self._summarize(totals, percentiles),
+            "trend": self._trend(starts, totals)
+        }
+        return result
+
+    def _summarize(self, totals: np.ndarray, percentiles: Sequence[float]) -> Dict[str, Dict[str, float]]:
+        """Sum, mean and percentiles of the per-period totals, one column per nutrient"""
+        if len(totals) == 0:
+            return {field: {} for field in NUTRIENT_FIELDS}
+
+        sums = totals.sum(axis=0)
+        means = totals.mean(axis=0)
+        pct = np.percentile(totals, percentiles, axis=0)
+        summary = {}
+        for i, field in enumerate(NUTRIENT_FIELDS):
+            stats = {"total": round(float(sums[i]), 1), "mean": round(float(means[i]), 1)}
+            for j, p in enumerate(percentiles):
+                stats[f"p{p:g}"] = round(float(pct[j, i]), 1)
+            summary[field] = stats
+        return summary
+
+    def _trend(self, starts: np.ndarray, totals: np.ndarray) -> Dict[str, Optional[Dict[str, float]]]:
+        """Least-squares line through the per-period totals (slope is per day)"""
+        if len(starts) < 2:
+            return {field: None for field in NUTRIENT_FIELDS}
+
+        x = (starts - starts[0]).astype(np.float64)
+        # polyfit accepts a 2-D y and fits every nutrient column at once
+        slopes, intercepts = np.polyfit(x, totals, deg=1)
+        return {
+            field: {"slope_per_day": round(float(slope), 3), "intercept": round(float(intercept), 1)}
+            for field, slope, intercept in zip(NUTRIENT_FIELDS, slopes, intercepts)
+        }
+
+# Global instance
+analytics_service = AnalyticsService(food_log_service)
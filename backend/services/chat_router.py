@@ -0,0 +1,253 @@
+import json
+import re
+import time
+from collections import Counter
+from typing import List, Dict, Optional, Any, Tuple
+
+from .gemini_service import gemini_service, ChatReply, GeminiService, TAG_OPEN, TAG_CLOSE
+from .usda_service import usda_service
+from .nutrition_cache import nutrition_cache
+from ..models.model_registry import DEFAULT_CLASS_LABELS
+from ..config import settings
+from ..log_utils import hot_log
+
+# Words that name a nutrient in a question, mapped to the nutrition data field
+NUTRIENT_WORDS = {
+    "calorie": "calories", "calories": "calories", "kcal": "calories", "cal": "calories", "energy": "calories",
+    "protein": "protein", "proteins": "protein",
+    "carb": "carbs", "carbs": "carbs", "carbohydrate": "carbs", "carbohydrates": "carbs",
+    "fat": "fat", "fats": "fat",
+    "fiber": "fiber", "fibre": "fiber",
+    "sugar": "sugars", "sugars": "sugars",
+    "sodium": "sodium", "salt": "sodium"
+}
+GENERAL_NUTRITION_WORDS = {"nutrition", "nutritional", "nutrients", "macros", "macro"}
+
+# Grams per unit for explicit quantities
+UNIT_GRAMS = {
+    "g": 1.0, "gr": 1.0, "gram": 1.0, "grams": 1.0, "kg": 1000.0,
+    "oz": 28.35, "ounce": 28.35, "ounces": 28.35, "lb": 453.6, "lbs": 453.6, "pound": 453.6, "pounds": 453.6
+}
+QUANTITY_PATTERN = re.compile(r"\b(\d+(?:\.\d+)?)\s*(" + "|".join(sorted(UNIT_GRAMS, key=len, reverse=True)) + r")\b")
+
+# Questions that need judgement, portions or conversation context go to Gemini
+OPEN_ENDED_PATTERN = re.compile(
+    r"\b(vs|versus|compare|compared|instead|better|worse|healthier|healthy|should|recipe|recipes|cook|"
+    r"diet|lose|gain|plan|why|recommend|suggest|substitute|allergy|allergic|it|that|those|these|them)\b"
+)
+PORTION_PATTERN = re.compile(
+    r"\b(a|an|one|two|three|half|\d+|cup|cups|slice|slices|piece|pieces|bowl|serving|servings|"
+    r"small|medium|large|tbsp|tsp|tablespoon|teaspoon|handful|can|glass)\b"
+)
+STOPWORDS = {"how", "much", "many", "what", "whats", "is", "are", "the", "in", "of", "does", "do", "there", "s",
+             "i", "had", "ate", "eat", "have", "for", "and", "with", "some", "about", "contain", "contains",
+             "per", "raw", "fresh", "tell", "me", "give", "show", "info", "information", "facts", "content",
+             "amount", "value", "values", "total", "level", "levels", "please", "get"}
+
+MAX_LOCAL_MESSAGE_LENGTH = 120
+MAX_FOOD_NAME_WORDS = 4
+
+
+class ChatRouter:
+    """
+    Routes chat messages between local answers and Gemini.
+
+    A rule-based intent/entity matcher recognizes single-food nutrition
+    questions ("how much protein in 200g spinach") over the known food
+    vocabulary: the classifier labels, USDA search aliases and every name in the
+    nutrition cache. Those are answered from USDA data in the same format as a
+    Gemini reply (including the NUTRITION_DATA tag, which goes through the same
+    extraction and validation). Everything else is forwarded to Gemini.
+    """
+
+    def __init__(self):
+        self.stats: Counter = Counter()
+        self.local_ms = 0.0
+        self._vocabulary: Dict[str, str] = {}
+        self._vocabulary_key: Optional[int] = None
+
+    @staticmethod
+    def _class_labels() -> Dict[int, str]:
+        """Labels of the live model (the default labels where TensorFlow is not installed)"""
+        try:
+            # Imported here so the chat path does not need TensorFlow (the app has already loaded it)
+            from ..models.model_manager import model_manager
+        except ImportError:
+            return DEFAULT_CLASS_LABELS
+        return model_manager.model.class_labels
+
+    def _known_foods(self) -> Dict[str, str]:
+        """Static vocabulary (term -> lookup name), rebuilt when the live model changes"""
+        labels = self._class_labels()
+        if self._vocabulary_key != id(labels):
+            vocabulary = {}
+            for label in labels.values():
+                vocabulary[nutrition_cache.normalize_name(label.replace("_", " "))] = label
+            for alias, search_term in usda_service.food_name_mapping.items():
+                vocabulary[alias] = alias
+                vocabulary[nutrition_cache.normalize_name(search_term)] = alias
+            self._vocabulary, self._vocabulary_key = vocabulary, id(labels)
+        return self._vocabulary
+
+    def _lookup_term(self, term: str) -> Optional[str]:
+        """Food name for a term (or its singular form), if it is in the vocabulary"""
+        known = self._known_foods()
+        candidates = [term]
+        if term.endswith("es"):
+            candidates.append(term[:-2])
+        if term.endswith("s"):
+            candidates.append(term[:-1])
+        for candidate in candidates:
+            if candidate in known:
+                return known[candidate]
+            if nutrition_cache.get_by_name(candidate) is not None:
+                return candidate
+        return None
+
+    def find_foods(self, words: List[str]) -> List[Tuple[int, int, str]]:
+        """
+        Find known foods in a tokenized message, longest match first
+
+        Returns:
+            Non-overlapping (start, end, food name) spans
+        """
+        found = []
+        i = 0
+        while i < len(words):
+            for size in range(min(MAX_FOOD_NAME_WORDS, len(words) - i), 0, -1):
+                span = words[i:i + size]
+                if all(word in STOPWORDS for word in span):
+                    continue
+                food_name = self._lookup_term(" ".join(span))
+                if food_name is not None:
+                    found.append((i, i + size, food_name))
+                    i += size
+                    break
+            else:
+                i += 1
+        return found
+
+    def match(self, message: str) -> Tuple[Optional[Dict[str, Any]], str]:
+        """
+        Decide whether a message can be answered locally
+
+        Returns:
+            (query, reason): query has "food", "grams" and "nutrient" (None means all)
+            when the message is a single-food nutrition question; otherwise None and
+            the reason it is forwarded
+        """
+        text = message.lower().strip()
+        if len(text) > MAX_LOCAL_MESSAGE_LENGTH:
+            return None, "long_message"
+        if OPEN_ENDED_PATTERN.search(text):
+            return None, "open_ended"
+
+        grams = 100.0
+        quantity = QUANTITY_PATTERN.search(text)
+        if quantity:
+            grams = float(quantity.group(1)) * UNIT_GRAMS[quantity.group(2)]
+            text = text[:quantity.start()] + " " + text[quantity.end():]
+
+        words = re.findall(r"[a-zà-ÿ]+", text)
+        nutrients = {NUTRIENT_WORDS[word] for word in words if word in NUTRIENT_WORDS}
+        if not nutrients and not GENERAL_NUTRITION_WORDS.intersection(words) and not quantity:
+            return None, "no_nutrition_intent"
+        if not quantity and PORTION_PATTERN.search(text):
+            # Counted or household portions need an estimate of the weight
+            return None, "portion"
+
+        remaining = [word for word in words if word not in NUTRIENT_WORDS and word not in GENERAL_NUTRITION_WORDS]
+        foods = self.find_foods(remaining)
+        if len({food_name for _, _, food_name in foods}) != 1:
+            return None, "no_food" if not foods else "multiple_foods"
+
+        # Anything left besides stopwords is an unrecognized qualifier ("fried", "dried", ...)
+        matched = {index for start, end, _ in foods for index in range(start, end)}
+        if any(word not in STOPWORDS for index, word in enumerate(remaining) if index not in matched):
+            return None, "unrecognized_words"
+
+        return {
+            "food": foods[0][2],
+            "grams": grams,
+            "nutrient": nutrients.pop() if len(nutrients) == 1 else None
+        }, "matched"
+
+    async def _local_nutrition(self, food_name: str) -> Optional[Dict[str, Any]]:
+        nutrition = await nutrition_cache.fetch_by_name(food_name)
+        if nutrition is not None:
+            self.stats["local_cached"] += 1
+            return nutrition
+        if settings.CHAT_LOCAL_USDA_LOOKUP and usda_service.api_key:
+            nutrition = await usda_service.get_nutrition_by_name(food_name)
+            if nutrition is not None and nutrition.get("source") != "fallback":
+                self.stats["local_fetched"] += 1
+                return nutrition
+        return None
+
+    @staticmethod
+    def format_answer(query: Dict[str, Any], nutrition: Dict[str, Any]) -> str:
+        """Write the answer the way the assistant does, ending with the NUTRITION_DATA tag"""
+        factor = query["grams"] / 100
+        food = query["food"]
+        values = {field: round((nutrition.get(field) or 0) * factor, 1)
+                  for field in ("calories", "protein", "carbs", "fat", "fiber", "sugars", "sodium")}
+        portion = f"{query['grams']:g}g of {food}"
+
+        lines = []
+        nutrient = query["nutrient"]
+        if nutrient == "calories":
+            lines.append(f"{portion.capitalize()} has about {values['calories']:.0f} kcal.\n")
+        elif nutrient == "sodium":
+            lines.append(f"{portion.capitalize()} has about {values['sodium']:g}mg of sodium.\n")
+        elif nutrient is not None:
+            lines.append(f"{portion.capitalize()} has about {values[nutrient]:g}g of {nutrient}.\n")
+
+        lines.append(f"{portion.capitalize()} contains approximately:")
+        lines.append(f"- Calories: {values['calories']:.0f} kcal")
+        lines.append(f"- Protein: {values['protein']:g}g")
+        lines.append(f"- Carbs: {values['carbs']:g}g")
+        lines.append(f"- Fat: {values['fat']:g}g")
+        if values["fiber"]:
+            lines.append(f"- Fiber: {values['fiber']:g}g")
+        source = nutrition.get("description") or food
+        lines.append(f"\n*Source: USDA FoodData Central ({source})*")
+
+        tag = {"name": food.title(), "calories": values["calories"], "protein": values["protein"],
+               "carbs": values["carbs"], "fat": values["fat"]}
+        lines.append(f"\n{TAG_OPEN}{json.dumps(tag)}{TAG_CLOSE}")
+        return "\n".join(lines)
+
+    async def chat(self, message: str, conversation_history: List[Dict] = None) -> ChatReply:
+        """Answer a chat message locally when possible, otherwise via Gemini"""
+        if settings.CHAT_LOCAL_ANSWERS:
+            start = time.perf_counter()
+            query, reason = self.match(message)
+            if query is not None:
+                nutrition = await self._local_nutrition(query["food"])
+                if nutrition is not None:
+                    reply = GeminiService.parse_reply(self.format_answer(query, nutrition), False)
+                    self.stats["local"] += 1
+                    self.local_ms += (time.perf_counter() - start) * 1000
+                    hot_log("INFO", "Answered chat locally for '{}'", lambda: query["food"])
+                    return reply
+                reason = "no_data"
+            self.stats[f"forwarded_{reason}"] += 1
+
+        self.stats["forwarded"] += 1
+        return await gemini_service.chat(message, conversation_history)
+
+    def status(self) -> Dict[str, Any]:
+        local = self.stats["local"]
+        total = local + self.stats["forwarded"]
+        return {
+            "enabled": settings.CHAT_LOCAL_ANSWERS,
+            "total": total,
+            "local": local,
+            "forwarded": self.stats["forwarded"],
+            "offload_ratio": round(local / total, 4) if total else None,
+            "avg_local_ms": round(self.local_ms / local, 2) if local else None,
+            "counters": dict(self.stats)
+        }
+
+# Global instance
+chat_router = ChatRouter()
@@ -0,0 +1,53 @@
+from typing import Iterable
+from loguru import logger
+from .usda_service import usda_service
+from .job_queue import JobScheduler, job_scheduler
+
+# Job priorities (lower runs first)
+PRIORITY_ENRICH = 10
+PRIORITY_RESOLVE = 20
+PRIORITY_WARMUP = 50
+
+
+async def enrich_food(fdc_id: str, description: str) -> None:
+    """Fetch full nutrition details for a search hit and cache them by FDC ID."""
+    if await usda_service.get_nutrition_by_fdc_id(fdc_id, description) is None:
+        raise RuntimeError(f"No details for FDC ID {fdc_id}")
+
+
+async def resolve_food(food_name: str) -> None:
+    """Resolve a food name against USDA and cache the result."""
+    if await usda_service.get_nutrition_by_name(food_name) is None:
+        raise RuntimeError(f"No USDA data for '{food_name}'")
+
+
+def register_enrichment_jobs(scheduler: JobScheduler) -> None:
+    """Register the enrichment handlers with a scheduler."""
+    scheduler.register("enrich_food", enrich_food)
+    scheduler.register("resolve_food", resolve_food)
+
+
+def schedule_enrichment(fdc_id: str, description: str) -> bool:
+    """Queue background enrichment of a search hit."""
+    return job_scheduler.submit("enrich_food", key=f"enrich:{fdc_id}", priority=PRIORITY_ENRICH,
+                                fdc_id=str(fdc_id), description=description)
+
+
+def schedule_resolution(food_name: str, delay_s: float = 0) -> bool:
+    """Queue (optionally delayed) re-resolution of a food that fell back to basic data."""
+    return job_scheduler.submit("resolve_food", key=f"resolve:{food_name.lower()}", priority=PRIORITY_RESOLVE,
+                                delay_s=delay_s, food_name=food_name)
+
+
+def schedule_cache_warmup(food_names: Iterable[str]) -> int:
+    """Queue low-priority lookups for names that are likely to be requested."""
+    queued = 0
+    for food_name in food_names:
+        if usda_service.cache.get_by_name(food_name) is None:
+            queued += job_scheduler.submit("resolve_food", key=f"resolve:{food_name.lower()}",
+                                           priority=PRIORITY_WARMUP, food_name=food_name)
+    logger.info(f"Queued {queued} cache warm-up lookups")
+    return queued
+
+
+register_enrichment_jobs(job_scheduler)
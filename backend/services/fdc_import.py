@@ -0,0 +1,148 @@
+"""
+Bulk-load a FoodData Central JSON download into the nutrition store.
+
+    NUTRITION_CACHE_DB_PATH=data/nutrition_cache.db \\
+        python -m backend.services.fdc_import FoodData_Central_sr_legacy_food_json.json
+
+Accepts the Foundation, SR Legacy, Survey and Branded downloads from
+https://fdc.nal.usda.gov/download-datasets.html. Files are parsed one food at
+a time and stored in batches, so the multi-gigabyte Branded download needs no
+more memory than the small ones. Foods are stored by FDC ID in the shared
+nutrition cache database, so /similar can search the whole set and lookups by
+FDC ID no longer call the USDA API.
+"""
+import argparse
+import json
+import re
+import sys
+from typing import Dict, Any, Iterable, Iterator, List, TextIO
+
+from loguru import logger
+from ..config import settings
+from .usda_service import usda_service
+from .nutrition_cache import nutrition_cache
+
+# Top-level keys of the FDC download files
+FOOD_LIST_KEYS = ("FoundationFoods", "SRLegacyFoods", "SurveyFoods", "BrandedFoods")
+
+FOOD_LIST_PATTERN = re.compile(r'"(%s)"\s*:\s*\[' % "|".join(FOOD_LIST_KEYS))
+# Characters read from the download at a time
+READ_CHUNK_SIZE = 1 << 20
+
+# SR Legacy reports total sugars as 269; the API's abridged format uses 269.3
+NUTRIENT_NUMBER_ALIASES = {"269": "269.3"}
+
+
+def flatten_food(food: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert a download record to the abridged API format _extract_nutrition_data reads"""
+    nutrients = []
+    for item in food.get("foodNutrients", []):
+        nutrient = item.get("nutrient", {})
+        number = str(nutrient.get("number") or item.get("number") or "")
+        if number:
+            nutrients.append({"number": number, "amount": item.get("amount")})
+            if number in NUTRIENT_NUMBER_ALIASES:
+                nutrients.append({"number": NUTRIENT_NUMBER_ALIASES[number], "amount": item.get("amount")})
+    return {
+        "fdcId": food.get("fdcId"),
+        "description": food.get("description", ""),
+        "dataType": food.get("dataType"),
+        "foodNutrients": nutrients
+    }
+
+
+def iter_foods(f: TextIO, chunk_size: int = READ_CHUNK_SIZE) -> Iterator[Dict[str, Any]]:
+    """
+    Yield the foods of a download file one at a time
+
+    Each element of a food list array is decoded as soon as it is complete in
+    the read buffer, so memory stays at about one chunk plus one food.
+
+    Raises:
+        ValueError: If the file ends inside a food or a food is not valid JSON
+    """
+    decoder = json.JSONDecoder()
+    buffer = ""
+    position = 0
+    in_list = False
+    eof = False
+    while True:
+        if not in_list:
+            match = FOOD_LIST_PATTERN.search(buffer, position)
+            if match is not None:
+                in_list, position = True, match.end()
+                continue
+            # Keep enough of the tail for a key split across chunks
+            buffer, position = buffer[-64:], 0
+        else:
+            while position < len(buffer) and buffer[position] in " \t\r\n,":
+                position += 1
+            if position < len(buffer) and buffer[position] == "]":
+                in_list, position = False, position + 1
+                continue
+            if position < len(buffer):
+                try:
+                    food, position = decoder.raw_decode(buffer, position)
+                    yield food
+                    continue
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+            buffer, position = buffer[position:], 0  # the food continues in the next chunk
+
+        if eof:
+            if in_list:
+                raise ValueError("Download ended inside a food list")
+            return
+        chunk = f.read(chunk_size)
+        eof = not chunk
+        buffer += chunk
+
+
+def load_foods(foods: Iterable[Dict[str, Any]], batch_size: int = 1000) -> int:
+    """
+    Standardize foods and store them in the nutrition cache
+
+    Returns:
+        Number of foods stored
+    """
+    stored = 0
+    batch: List[Dict[str, Any]] = []
+    for food in foods:
+        details = flatten_food(food)
+        if not details["fdcId"]:
+            continue
+        nutrition = usda_service._extract_nutrition_data(details, details["description"])
+        if nutrition.get("source") == "fallback":
+            continue
+        batch.append(nutrition)
+        if len(batch) >= batch_size:
+            nutrition_cache.put_many(batch, wait=True)
+            stored += len(batch)
+            batch = []
+    if batch:
+        nutrition_cache.put_many(batch, wait=True)
+        stored += len(batch)
+    return stored
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Load a FoodData Central JSON download into the nutrition store")
+    parser.add_argument("paths", nargs="+", help="FDC JSON download files")
+    args = parser.parse_args()
+
+    if not settings.NUTRITION_CACHE_DB_PATH:
+        sys.exit("Set NUTRITION_CACHE_DB_PATH so the loaded foods are kept")
+
+    # Skip the per-food extraction log lines
+    logger.disable("backend.services.usda_service")
+    for path in args.paths:
+        logger.info(f"Reading {path}")
+        with open(path, encoding="utf-8") as f:
+            stored = load_foods(iter_foods(f))
+        logger.info(f"Stored {stored} foods from {path}")
+    nutrition_cache.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+import csv
+import io
+import json
+from typing import Dict, Any, Optional, List, Iterator, AsyncIterator
+from fastapi.concurrency import run_in_threadpool
+from loguru import logger
+from ..config import settings
+from .usda_service import usda_service, NUTRIENT_FIELDS
+from .food_log_service import food_log_service, REQUIRED_FIELDS
+
+FORMATS = ("ndjson", "csv")
+EXPORT_COLUMNS = ("date", "name", "quantity") + NUTRIENT_FIELDS
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+# Longest CSV record accepted, so an unbalanced quote cannot buffer the rest of the upload
+MAX_CSV_RECORD_CHARS = 64 * 1024
+# Longest line accepted, so an upload without newlines cannot buffer the whole body
+MAX_LINE_BYTES = 64 * 1024
+
+
+def export_entries(user_id: str, fmt: str, start_date: Optional[str] = None,
+                   end_date: Optional[str] = None) -> Iterator[str]:
+    """
+    Stream a user's food log as NDJSON or CSV
+
+    Args:
+        user_id: Owner of the entries
+        fmt: "ndjson" or "csv"
+        start_date: First day (ISO date, inclusive), optional
+        end_date: Last day (ISO date, inclusive), optional
+
+    Yields:
+        Encoded chunks, one per block of entries read from the store
+    """
+    chunks = food_log_service.iter_entries(
+        user_id, start_date, end_date, chunk_size=settings.FOOD_LOG_EXPORT_CHUNK_SIZE
+    )
+    if fmt == "csv":
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=EXPORT_COLUMNS, extrasaction="ignore")
+        writer.writeheader()
+        yield buffer.getvalue()
+        for entries in chunks:
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerows(entries)
+            yield buffer.getvalue()
+    else:
+        for entries in chunks:
+            yield "".join(
+                json.dumps({column: entry[column] for column in EXPORT_COLUMNS}) + "\n"
+                for entry in entries
+            )
+
+
+class FoodLogImporter:
+    """
+    Incremental NDJSON/CSV importer for food logs.
+
+    Rows are parsed line by line as bytes arrive (a quoted CSV field may span
+    lines), validated with the same rules as FoodService.validateFood and
+    written in batches. Rows that only name a food are
+    resolved against the nutrition cache (then USDA) once per batch, with the
+    quantity scaled from the per-100g values.
+    """
+
+    def __init__(self, user_id: str, fmt: str):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unsupported format '{fmt}', expected one of {FORMATS}")
+        self.user_id = user_id
+        self.fmt = fmt
+        self.batch_size = settings.FOOD_LOG_BATCH_SIZE
+        self.max_errors = settings.FOOD_LOG_IMPORT_MAX_ERRORS
+        self.header: Optional[List[str]] = None
+        self.imported = 0
+        self.rejected = 0
+        self.errors: List[Dict[str, Any]] = []
+        self._line_number = 0
+        self._pending: List[tuple] = []
+        # Lines of a CSV record whose quoted field is still open
+        self._record: List[str] = []
+
+    async def run(self, chunks: AsyncIterator[bytes]) -> Dict[str, Any]:
+        """
+        Consume a byte stream and import every row
+
+        Args:
+            chunks: Request body chunks
+
+        Returns:
+            Import summary with counts and the first rejected rows
+        """
+        remainder = b""
+        skipping = False  # inside an over-long line, dropped up to its newline
+        async for chunk in chunks:
+            lines = (remainder + chunk).split(b"\n")
+            remainder = lines.pop()
+            for line in lines:
+                if skipping:
+                    skipping = False
+                elif len(line) > MAX_LINE_BYTES:
+                    self._reject_line("Line too long")
+                else:
+                    await self._add_line(line)
+            if len(remainder) > MAX_LINE_BYTES:
+                if not skipping:
+                    self._reject_line("Line too long")
+                skipping = True
+                remainder = b""
+        if len(remainder) > MAX_LINE_BYTES:
+            self._reject_line("Line too long")
+        elif remainder and not skipping:
+            await self._add_line(remainder)
+        if self._record:
+            self._reject(self._line_number - len(self._record) + 1, "Unterminated quoted field")
+            self._record = []
+        await self._flush()
+
+        logger.info(f"Imported {self.imported} entries for user '{self.user_id}' ({self.rejected} rejected)")
+        return {
+            "user_id": self.user_id,
+            "imported": self.imported,
+            "rejected": self.rejected,
+            "errors": self.errors
+        }
+
+    async def _add_line(self, raw: bytes) -> None:
+        """Parse one line and queue it, flushing when the batch is full"""
+        try:
+            line = raw.decode("utf-8-sig" if self._line_number == 0 else "utf-8")
+        except UnicodeDecodeError:
+            self._reject_line("Invalid UTF-8")
+            return
+        self._line_number += 1
+        line_number = self._line_number
+
+        if self.fmt == "csv":
+            # Quotes are escaped by doubling them, so an odd count means a quoted
+            # field continues on the next line
+            self._record.append(line)
+            line = "\n".join(self._record)
+            line_number = self._line_number - len(self._record) + 1
+            if line.count('"') % 2:
+                if len(line) > MAX_CSV_RECORD_CHARS:
+                    self._reject(line_number, "Unterminated quoted field")
+                    self._record = []
+                return
+            self._record = []
+
+        line = line.strip()
+        if not line:
+            return
+
+        try:
+            row = self._parse_line(line)
+        except ValueError as e:
+            self._reject(line_number, str(e))
+            return
+        if row is None:
+            return
+
+        self._pending.append((line_number, row))
+        if len(self._pending) >= self.batch_size:
+            await self._flush()
+
+    def _parse_line(self, line: str) -> Optional[Dict[str, Any]]:
+        """Turn a line into a row dict (None for the CSV header)"""
+        if self.fmt == "ndjson":
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"Invalid JSON: {e.msg}")
+            if not isinstance(row, dict):
+                raise ValueError("Expected a JSON object")
+            if not isinstance(row.get("name"), str):
+                raise ValueError("Expected 'name' to be a string")
+            return row
+
+        values = next(csv.reader(io.StringIO(line)))
+        if self.header is None:
+            self.header = [column.strip() for column in values]
+            if "name" not in self.header:
+                raise ValueError("CSV header must include a 'name' column")
+            return None
+        # Empty CSV cells count as missing values
+        return {column: value for column, value in zip(self.header, values) if value != ""}
+
+    def _reject_line(self, reason: str) -> None:
+        """Reject the next line without parsing it (and the CSV record it continues)"""
+        self._line_number += 1
+        self._reject(self._line_number - len(self._record), reason)
+        self._record = []
+
+    async def _flush(self) -> None:
+        """Resolve, validate and write the pending batch"""
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, []
+
+        # Rows with a name but no macros are resolved against the nutrition cache
+        unresolved = [
+            isinstance(row.get("name"), str) and all(row.get(field) is None for field in REQUIRED_FIELDS)
+            for _, row in pending
+        ]
+        names = {row["name"] for (_, row), needs_lookup in zip(pending, unresolved) if needs_lookup}
+        resolved = await usda_service.resolve_names(list(names)) if names else {}
+
+        rows = []
+        for (line_number, row), needs_lookup in zip(pending, unresolved):
+            if needs_lookup:
+                nutrition = resolved.get(row["name"])
+                if nutrition is None:
+                    self._reject(line_number, f"Unknown food '{row['name']}'")
+                    continue
+                row["nutrients_per_100g"] = nutrition
+            try:
+                rows.append(food_log_service.normalize_entry(row))
+            except ValueError as e:
+                self._reject(line_number, str(e))
+
+        if rows:
+            await run_in_threadpool(food_log_service.add_rows, self.user_id, rows)
+            self.imported += len(rows)
+
+    def _reject(self, line_number: int, reason: str) -> None:
+        """Count a rejected row, keeping the first few reasons for the response"""
+        self.rejected += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({"line": line_number, "error": reason})
@@ -0,0 +1,544 @@
+import os
+import re
+import sqlite3
+import threading
+from datetime import date, datetime
+from typing import Dict, Any, Optional, List, Iterable, Iterator, Tuple, Callable
+from loguru import logger
+from ..config import settings
+from .usda_service import NUTRIENT_FIELDS
+
+# Macros every log entry must carry (same as FoodService.validateFood in the frontend)
+REQUIRED_FIELDS = ("calories", "protein", "carbs", "fat")
+# ISO 8601 calendar dates in the extended (2024-01-06) or basic (20240106) format
+ISO_DATE_PATTERN = re.compile(r"([0-9]{4})-([0-9]{2})-([0-9]{2})|([0-9]{4})([0-9]{2})([0-9]{2})")
+
+
+def validate_food(food: Dict[str, Any]) -> bool:
+    """
+    Validate a food log entry using the same rules as FoodService.validateFood
+
+    Args:
+        food: Food entry with name, macros and optional quantity
+
+    Returns:
+        True if the entry is valid, False otherwise
+    """
+    name = food.get("name")
+    if not isinstance(name, str) or not name.strip():
+        return False
+
+    for field in REQUIRED_FIELDS:
+        value = _to_number(food.get(field))
+        if value is None or value < 0:
+            return False
+
+    quantity = food.get("quantity")
+    if quantity is not None and quantity != "":
+        quantity = _to_number(quantity)
+        if quantity is None or quantity <= 0:
+            return False
+
+    return True
+
+
+def scale_nutrients_for_quantity(nutrients: Dict[str, Any], quantity: float) -> Dict[str, float]:
+    """
+    Scale per-100g nutrient values to a quantity in grams
+    (server-side equivalent of FoodService.calculateNutrientsForQuantity)
+
+    Args:
+        nutrients: Nutrient values per 100g
+        quantity: Quantity in grams
+
+    Returns:
+        Nutrient values for the given quantity
+    """
+    scale = quantity / 100
+    return {field: (_to_number(nutrients.get(field)) or 0) * scale for field in NUTRIENT_FIELDS}
+
+
+def parse_iso_date(value: str) -> date:
+    """
+    Parse an ISO 8601 calendar date
+
+    Done by hand because date.fromisoformat only accepts the basic format (and
+    week dates) from Python 3.11, so results would depend on the interpreter.
+
+    Raises:
+        ValueError: If the value is not a valid date in either format
+    """
+    match = ISO_DATE_PATTERN.fullmatch(value) if isinstance(value, str) else None
+    if match is None:
+        raise ValueError(f"Invalid date {value!r}")
+    year, month, day = (int(group) for group in match.groups() if group is not None)
+    return date(year, month, day)
+
+
+def parse_date(value: Optional[str], name: str = "date") -> Optional[str]:
+    """
+    Check a YYYY-MM-DD (or YYYYMMDD) query date and return it in canonical form
+
+    Stored dates are compared as strings, so anything that is not a canonical ISO
+    date (e.g. "2024-1-6") would silently select the wrong range.
+
+    Args:
+        value: Date string, or None
+        name: Parameter name used in the error message
+
+    Returns:
+        The ISO date, or None if no date was given
+
+    Raises:
+        ValueError: If the value is not a valid date
+    """
+    if value is None:
+        return None
+    try:
+        return parse_iso_date(value).isoformat()
+    except ValueError:
+        raise ValueError(f"Invalid {name} {value!r}, expected YYYY-MM-DD")
+
+
+def _to_number(value: Any) -> Optional[float]:
+    """Convert a value to float, returning None for anything that is not numeric."""
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    if number != number:  # NaN
+        return None
+    return number
+
+
+class FoodLogService:
+    """
+    Server-side food log backed by SQLite.
+
+    Entries are appended in batches inside a single transaction. Alongside the raw
+    entries the store keeps running totals per user, per user and day, and a
+    cumulative (prefix) total per user and day, so the totals of any date range are
+    the difference of two cumulative rows, independent of how many days or entries
+    the range covers.
+    """
+
+    def __init__(self, db_path: Optional[str] = None):
+        self.db_path = db_path or settings.FOOD_LOG_DB_PATH
+        self.batch_size = settings.FOOD_LOG_BATCH_SIZE
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        # Bumped on every committed write, lets derived stores detect stale data
+        self.version = 0
+        # Called with (user_id, entry dates) after every committed batch
+        self._listeners: List[Callable[[str, List[str]], None]] = []
+
+    def add_listener(self, callback: Callable[[str, List[str]], None]) -> None:
+        """Register a callback invoked with (user_id, entry dates) after each write"""
+        self._listeners.append(callback)
+
+    def _get_connection(self) -> sqlite3.Connection:
+        """Get or create the SQLite connection"""
+        if self._conn is None:
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._create_schema(conn)
+            self._conn = conn
+            logger.info(f"Food log store opened at {self.db_path}")
+        return self._conn
+
+    def _create_schema(self, conn: sqlite3.Connection) -> None:
+        """Create tables and indexes if they do not exist yet"""
+        nutrient_columns = ", ".join(f"{field} REAL NOT NULL DEFAULT 0" for field in NUTRIENT_FIELDS)
+        conn.executescript(f"""
+            CREATE TABLE IF NOT EXISTS food_log_entries (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id TEXT NOT NULL,
+                entry_date TEXT NOT NULL,
+                name TEXT NOT NULL,
+                quantity REAL,
+                {nutrient_columns},
+                logged_at TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_entries_user_date
+                ON food_log_entries (user_id, entry_date);
+
+            CREATE TABLE IF NOT EXISTS daily_totals (
+                user_id TEXT NOT NULL,
+                entry_date TEXT NOT NULL,
+                entry_count INTEGER NOT NULL DEFAULT 0,
+                {nutrient_columns},
+                PRIMARY KEY (user_id, entry_date)
+            );
+
+            CREATE TABLE IF NOT EXISTS cumulative_totals (
+                user_id TEXT NOT NULL,
+                entry_date TEXT NOT NULL,
+                entry_count INTEGER NOT NULL DEFAULT 0,
+                {nutrient_columns},
+                PRIMARY KEY (user_id, entry_date)
+            );
+
+            CREATE TABLE IF NOT EXISTS user_totals (
+                user_id TEXT PRIMARY KEY,
+                entry_count INTEGER NOT NULL DEFAULT 0,
+                {nutrient_columns}
+            );
+        """)
+        conn.commit()
+
+    def data_version(self) -> int:
+        """
+        SQLite's data version for this store's connection
+
+        Changes whenever another connection, e.g. another server worker, commits
+        to the database. Writes through this store do not change it; they are
+        reported through `version` and the listeners instead.
+        """
+        with self._lock:
+            return self._get_connection().execute("PRAGMA data_version").fetchone()[0]
+
+    def close(self) -> None:
+        """Close the SQLite connection"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def normalize_entry(self, food: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Turn an incoming food entry into a validated row
+
+        If the entry carries ``nutrients_per_100g`` and a quantity, the macros are
+        computed from them; otherwise the values are taken as already scaled.
+
+        Args:
+            food: Raw food entry
+
+        Returns:
+            Normalized entry ready to be stored
+
+        Raises:
+            ValueError: If the entry is invalid
+        """
+        food = dict(food)
+        per_100g = food.get("nutrients_per_100g")
+        if per_100g is not None and not isinstance(per_100g, dict):
+            raise ValueError(f"Invalid nutrients_per_100g for {food.get('name')!r}")
+        if per_100g:
+            quantity = _to_number(food.get("quantity")) or 100
+            food.update(scale_nutrients_for_quantity(per_100g, quantity))
+
+        if not validate_food(food):
+            raise ValueError(f"Invalid food data: {food.get('name')!r}")
+
+        entry_date = food.get("date") or date.today().isoformat()
+        try:
+            entry_date = parse_iso_date(str(entry_date)[:10]).isoformat()
+        except ValueError:
+            raise ValueError(f"Invalid date for {food['name']!r}: {food.get('date')!r}")
+
+        quantity = food.get("quantity")
+        row = {
+            "entry_date": entry_date,
+            "name": food["name"].strip(),
+            "quantity": _to_number(quantity) if quantity not in (None, "") else None,
+        }
+        for field in NUTRIENT_FIELDS:
+            row[field] = _to_number(food.get(field)) or 0.0
+        return row
+
+    def add_entries(self, user_id: str, foods: Iterable[Dict[str, Any]]) -> List[int]:
+        """
+        Append food entries for a user and update the running totals
+
+        Args:
+            user_id: Owner of the entries
+            foods: Food entries (validated and normalized before insert)
+
+        Returns:
+            IDs of the inserted entries
+
+        Raises:
+            ValueError: If any entry is invalid (nothing is written in that case)
+        """
+        rows = [self.normalize_entry(food) for food in foods]
+        ids = []
+        for start in range(0, len(rows), self.batch_size):
+            ids.extend(self.add_rows(user_id, rows[start:start + self.batch_size]))
+        return ids
+
+    def add_rows(self, user_id: str, rows: List[Dict[str, Any]]) -> List[int]:
+        """
+        Write a batch of already normalized rows in a single transaction
+
+        Args:
+            user_id: Owner of the entries
+            rows: Rows produced by normalize_entry
+
+        Returns:
+            IDs of the inserted entries
+        """
+        if not rows:
+            return []
+
+        logged_at = datetime.utcnow().isoformat(timespec="seconds")
+        columns = ("user_id", "entry_date", "name", "quantity") + NUTRIENT_FIELDS + ("logged_at",)
+        insert_sql = (
+            f"INSERT INTO food_log_entries ({', '.join(columns)}) "
+            f"VALUES ({', '.join('?' for _ in columns)})"
+        )
+
+        # Collapse the batch into one delta per day before touching the aggregates
+        deltas: Dict[str, List[float]] = {}
+        for row in rows:
+            delta = deltas.setdefault(row["entry_date"], [0] * (len(NUTRIENT_FIELDS) + 1))
+            delta[0] += 1
+            for i, field in enumerate(NUTRIENT_FIELDS, start=1):
+                delta[i] += row[field]
+
+        with self._lock:
+            conn = self._get_connection()
+            try:
+                with conn:
+                    ids = []
+                    for row in rows:
+                        values = (user_id, row["entry_date"], row["name"], row["quantity"])
+                        values += tuple(row[field] for field in NUTRIENT_FIELDS) + (logged_at,)
+                        ids.append(conn.execute(insert_sql, values).lastrowid)
+                    for entry_date, delta in sorted(deltas.items()):
+                        self._apply_delta(conn, user_id, entry_date, delta)
+            except sqlite3.Error as e:
+                logger.error(f"Failed to write food log batch: {str(e)}")
+                raise
+            self.version += 1
+
+        for callback in self._listeners:
+            callback(user_id, sorted(deltas))
+
+        logger.info(f"Stored {len(rows)} food log entries for user '{user_id}'")
+        return ids
+
+    def _apply_delta(self, conn: sqlite3.Connection, user_id: str, entry_date: str, delta: List[float]) -> None:
+        """Add a per-day delta to the daily, cumulative and per-user totals"""
+        fields = ("entry_count",) + NUTRIENT_FIELDS
+        column_list = ", ".join(fields)
+        placeholders = ", ".join("?" for _ in fields)
+        merge = ", ".join(f"{field} = {field} + excluded.{field}" for field in fields)
+
+        conn.execute(
+            f"INSERT INTO daily_totals (user_id, entry_date, {column_list}) "
+            f"VALUES (?, ?, {placeholders}) "
+            f"ON CONFLICT (user_id, entry_date) DO UPDATE SET {merge}",
+            (user_id, entry_date, *delta)
+        )
+        conn.execute(
+            f"INSERT INTO user_totals (user_id, {column_list}) VALUES (?, {placeholders}) "
+            f"ON CONFLICT (user_id) DO UPDATE SET {merge}",
+            (user_id, *delta)
+        )
+
+        # Make sure a cumulative row exists for this day, seeded from the previous day,
+        # then shift this day and every later day. Appends in date order touch one row.
+        existing = conn.execute(
+            "SELECT 1 FROM cumulative_totals WHERE user_id = ? AND entry_date = ?",
+            (user_id, entry_date)
+        ).fetchone()
+        if existing is None:
+            previous = self._cumulative_at(conn, user_id, entry_date, inclusive=False)
+            conn.execute(
+                f"INSERT INTO cumulative_totals (user_id, entry_date, {column_list}) "
+                f"VALUES (?, ?, {placeholders})",
+                (user_id, entry_date, *previous)
+            )
+        increments = ", ".join(f"{field} = {field} + ?" for field in fields)
+        conn.execute(
+            f"UPDATE cumulative_totals SET {increments} WHERE user_id = ? AND entry_date >= ?",
+            (*delta, user_id, entry_date)
+        )
+
+    def _cumulative_at(self, conn: sqlite3.Connection, user_id: str, entry_date: str,
+                       inclusive: bool = True) -> Tuple[float, ...]:
+        """Cumulative totals up to (and optionally including) a date, zeros if none"""
+        operator = "<=" if inclusive else "<"
+        fields = ("entry_count",) + NUTRIENT_FIELDS
+        row = conn.execute(
+            f"SELECT {', '.join(fields)} FROM cumulative_totals "
+            f"WHERE user_id = ? AND entry_date {operator} ? "
+            f"ORDER BY entry_date DESC LIMIT 1",
+            (user_id, entry_date)
+        ).fetchone()
+        return tuple(row) if row else (0,) * len(fields)
+
+    def get_totals(self, user_id: str, start_date: Optional[str] = None,
+                   end_date: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Get nutrient totals for a user over a date range
+
+        Answered from the cumulative totals with two index lookups, regardless of
+        the size of the range. Without dates, the all-time running totals are used.
+
+        Args:
+            user_id: User to aggregate
+            start_date: First day of the range (ISO date, inclusive)
+            end_date: Last day of the range (ISO date, inclusive)
+
+        Returns:
+            Entry count and nutrient totals
+
+        Raises:
+            ValueError: If a date is not a valid ISO date
+        """
+        start_date = parse_date(start_date, "start_date")
+        end_date = parse_date(end_date, "end_date")
+        fields = ("entry_count",) + NUTRIENT_FIELDS
+        with self._lock:
+            conn = self._get_connection()
+            if start_date is None and end_date is None:
+                row = conn.execute(
+                    f"SELECT {', '.join(fields)} FROM user_totals WHERE user_id = ?",
+                    (user_id,)
+                ).fetchone()
+                values = tuple(row) if row else (0,) * len(fields)
+            else:
+                upper = self._cumulative_at(conn, user_id, end_date or date.max.isoformat())
+                lower = (self._cumulative_at(conn, user_id, start_date, inclusive=False)
+                         if start_date else (0,) * len(fields))
+                values = tuple(u - l for u, l in zip(upper, lower))
+
+        totals = self._format_totals(dict(zip(fields, values)))
+        totals.update({"user_id": user_id, "start_date": start_date, "end_date": end_date})
+        return totals
+
+    def get_daily_totals(self, user_id: str, start_date: str, end_date: str) -> List[Dict[str, Any]]:
+        """
+        Get the per-day totals for a user between two dates (inclusive)
+
+        Args:
+            user_id: User to aggregate
+            start_date: First day (ISO date)
+            end_date: Last day (ISO date)
+
+        Returns:
+            One totals dict per day that has entries
+
+        Raises:
+            ValueError: If a date is not a valid ISO date
+        """
+        start_date = parse_date(start_date, "start_date")
+        end_date = parse_date(end_date, "end_date")
+        fields = ("entry_date", "entry_count") + NUTRIENT_FIELDS
+        with self._lock:
+            rows = self._get_connection().execute(
+                f"SELECT {', '.join(fields)} FROM daily_totals "
+                f"WHERE user_id = ? AND entry_date BETWEEN ? AND ? ORDER BY entry_date",
+                (user_id, start_date, end_date)
+            ).fetchall()
+        return [self._format_totals(dict(row)) for row in rows]
+
+    def get_entries(self, user_id: str, start_date: Optional[str] = None, end_date: Optional[str] = None,
+                    limit: int = 100, offset: int = 0) -> List[Dict[str, Any]]:
+        """
+        Get logged entries for a user, oldest first
+
+        Args:
+            user_id: Owner of the entries
+            start_date: First day (ISO date, inclusive), optional
+            end_date: Last day (ISO date, inclusive), optional
+            limit: Maximum number of entries to return
+            offset: Number of entries to skip
+
+        Returns:
+            List of food log entries
+
+        Raises:
+            ValueError: If a date is not a valid ISO date
+        """
+        start_date = parse_date(start_date, "start_date")
+        end_date = parse_date(end_date, "end_date")
+        with self._lock:
+            rows = self._get_connection().execute(
+                "SELECT * FROM food_log_entries WHERE user_id = ? AND entry_date BETWEEN ? AND ? "
+                "ORDER BY entry_date, id LIMIT ? OFFSET ?",
+                (user_id, start_date or date.min.isoformat(), end_date or date.max.isoformat(), limit, offset)
+            ).fetchall()
+        return [self._format_entry(row) for row in rows]
+
+    def iter_entries(self, user_id: str, start_date: Optional[str] = None, end_date: Optional[str] = None,
+                     chunk_size: int = 1000) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Iterate over a user's entries in chunks, oldest first
+
+        Uses keyset pagination so the lock is only held while a chunk is read and
+        memory stays bounded by the chunk size.
+
+        Args:
+            user_id: Owner of the entries
+            start_date: First day (ISO date, inclusive), optional
+            end_date: Last day (ISO date, inclusive), optional
+            chunk_size: Entries per chunk
+
+        Yields:
+            Lists of food log entries
+        """
+        last_key = ("", 0)
+        start_date = start_date or date.min.isoformat()
+        end_date = end_date or date.max.isoformat()
+        while True:
+            with self._lock:
+                rows = self._get_connection().execute(
+                    "SELECT * FROM food_log_entries WHERE user_id = ? AND entry_date BETWEEN ? AND ? "
+                    "AND (entry_date, id) > (?, ?) ORDER BY entry_date, id LIMIT ?",
+                    (user_id, start_date, end_date, last_key[0], last_key[1], chunk_size)
+                ).fetchall()
+            if not rows:
+                return
+            last_key = (rows[-1]["entry_date"], rows[-1]["id"])
+            yield [self._format_entry(row) for row in rows]
+
+    def get_entry_columns(self, user_id: str, start_date: str, end_date: str) -> List[Tuple]:
+        """
+        Get (entry_date, *nutrients) tuples for a user between two dates (inclusive)
+
+        Args:
+            user_id: Owner of the entries
+            start_date: First day (ISO date)
+            end_date: Last day (ISO date)
+
+        Returns:
+            Rows ordered by date, with nutrients in NUTRIENT_FIELDS order
+        """
+        with self._lock:
+            return self._get_connection().execute(
+                f"SELECT entry_date, {', '.join(NUTRIENT_FIELDS)} FROM food_log_entries "
+                f"WHERE user_id = ? AND entry_date BETWEEN ? AND ? ORDER BY entry_date",
+                (user_id, start_date, end_date)
+            ).fetchall()
+
+    def _format_entry(self, row: sqlite3.Row) -> Dict[str, Any]:
+        """Convert a stored row into the entry shape used by the frontend"""
+        entry = {
+            "id": row["id"],
+            "name": row["name"],
+            "quantity": row["quantity"],
+            "date": row["entry_date"],
+            "logged_at": row["logged_at"],
+        }
+        for field in NUTRIENT_FIELDS:
+            entry[field] = round(row[field], 1)
+        return entry
+
+    def _format_totals(self, totals: Dict[str, Any]) -> Dict[str, Any]:
+        """Round nutrient totals the same way USDA values are rounded"""
+        for field in NUTRIENT_FIELDS:
+            totals[field] = round(totals.get(field, 0), 1)
+        return totals
+
+# Global instance
+food_log_service = FoodLogService()
@@ -1,13 +1,197 @@
+import json
+import re
 import aiohttp
 from loguru import logger
-from typing import List, Dict, Optional
+from pydantic import BaseModel, Field, ValidationError
+from typing import List, Dict, Optional, Any, Tuple
+from .nutrition_cache import nutrition_cache
+from ..replay.sessions import create_upstream_session, upstream_api_key
 from ..config import settings
 
+TAG_OPEN = "<!--NUTRITION_DATA:"
+TAG_CLOSE = "-->"
+
+# Energy per gram of protein, carbohydrate and fat (Atwater factors)
+MACRO_KCAL_PER_GRAM = {"protein": 4.0, "carbs": 4.0, "fat": 9.0}
+
+# Start of the "reply" string in a structured response
+REPLY_FIELD_PATTERN = re.compile(r'"reply"\s*:\s*"')
+
+# Request fields of JSON mode; a 400 naming one of them means the model does not support it
+STRUCTURED_OUTPUT_FIELDS = ("responseschema", "responsemimetype")
+
+
+class NutritionData(BaseModel):
+    """Nutrition estimate attached to a chat reply."""
+    name: str = Field("Food Item", min_length=1)
+    calories: float = Field(..., ge=0, le=10000)
+    protein: float = Field(0, ge=0, le=1000)
+    carbs: float = Field(0, ge=0, le=1000)
+    fat: float = Field(0, ge=0, le=1000)
+    fiber: Optional[float] = Field(None, ge=0, le=1000)
+    sugars: Optional[float] = Field(None, ge=0, le=1000)
+    sodium: Optional[float] = Field(None, ge=0)
+    warnings: List[str] = []
+    reference: Optional[Dict[str, Any]] = None
+
+
+class ChatReply(BaseModel):
+    """A chat reply with any nutrition data already extracted from the text."""
+    response: str
+    nutrition_data: Optional[NutritionData] = None
+
+
+class NutritionTagParser:
+    """
+    Incremental extractor for the <!--NUTRITION_DATA:{...}--> tag.
+
+    feed() takes response text in arbitrarily split chunks and returns the part
+    that is safe to display, holding back anything that might be the start of a
+    tag. The JSON between the tag markers is collected whole, so nested braces
+    and markers split across chunks are handled.
+    """
+
+    def __init__(self):
+        self.payloads: List[str] = []
+        self._buffer = ""
+        self._in_tag = False
+
+    def feed(self, chunk: str) -> str:
+        """Consume a chunk of text and return the displayable part"""
+        self._buffer += chunk
+        output = []
+        while True:
+            if self._in_tag:
+                end = self._buffer.find(TAG_CLOSE)
+                if end == -1:
+                    break
+                self.payloads.append(self._buffer[:end].strip())
+                self._buffer = self._buffer[end + len(TAG_CLOSE):]
+                self._in_tag = False
+            else:
+                start = self._buffer.find(TAG_OPEN)
+                if start == -1:
+                    # Hold back a suffix that could be the beginning of a tag
+                    keep = self._partial_tag_length(self._buffer)
+                    output.append(self._buffer[:len(self._buffer) - keep])
+                    self._buffer = self._buffer[len(self._buffer) - keep:]
+                    break
+                output.append(self._buffer[:start])
+                self._buffer = self._buffer[start + len(TAG_OPEN):]
+                self._in_tag = True
+        return "".join(output)
+
+    def close(self) -> str:
+        """Flush held-back text at the end of the response (an unterminated tag is dropped)"""
+        text = "" if self._in_tag else self._buffer
+        if self._in_tag:
+            logger.warning("Response ended inside a NUTRITION_DATA tag")
+        self._buffer = ""
+        self._in_tag = False
+        return text
+
+    @staticmethod
+    def _partial_tag_length(text: str) -> int:
+        for length in range(min(len(TAG_OPEN) - 1, len(text)), 0, -1):
+            if TAG_OPEN.startswith(text[-length:]):
+                return length
+        return 0
+
+    def nutrition_data(self) -> Optional[NutritionData]:
+        """The last tag in the response that validates"""
+        for payload in reversed(self.payloads):
+            data = parse_nutrition_data(payload)
+            if data is not None:
+                return data
+        return None
+
+
+def parse_nutrition_data(raw: Any) -> Optional[NutritionData]:
+    """
+    Validate nutrition data from a tag payload (JSON text) or a structured reply (dict)
+
+    Returns:
+        NutritionData, or None if the data is missing or malformed
+    """
+    if not raw:
+        return None
+    try:
+        if isinstance(raw, str):
+            raw = json.loads(raw)
+        return NutritionData.model_validate(raw)
+    except (ValueError, ValidationError) as e:
+        logger.warning(f"Discarding malformed nutrition data: {str(e)}")
+        return None
+
+
+def extract_partial_reply(text: str) -> Optional[str]:
+    """
+    Recover the "reply" string from a structured response that is not valid JSON,
+    typically because the output was cut off at maxOutputTokens
+
+    Returns:
+        The (possibly truncated) reply text, or None if there is no reply field
+    """
+    match = REPLY_FIELD_PATTERN.search(text)
+    if match is None:
+        return None
+    chars = []
+    escaped = False
+    for char in text[match.end():]:
+        if char == '"' and not escaped:
+            break
+        chars.append(char)
+        escaped = char == "\\" and not escaped
+    raw = "".join(chars)
+    # Drop an escape sequence cut off at the end (a lone backslash or part of \uXXXX)
+    for trim in range(min(len(raw), 6) + 1):
+        try:
+            return json.loads(f'"{raw[:len(raw) - trim]}"', strict=False)
+        except ValueError:
+            continue
+    return None
+
+
+def cross_check(data: NutritionData) -> NutritionData:
+    """
+    Compare a model estimate with energy arithmetic and cached USDA data
+
+    Adds a warning when the calories do not match the macronutrient energy, and
+    when the food is in the nutrition cache, scales the cached per-100g values to
+    the same calories and warns about macros that disagree. The implied serving
+    size and the USDA entry used are returned in `reference`.
+    """
+    warnings = []
+    macro_kcal = sum(getattr(data, field) * kcal for field, kcal in MACRO_KCAL_PER_GRAM.items())
+    if abs(macro_kcal - data.calories) > max(25.0, 0.2 * max(macro_kcal, data.calories)):
+        warnings.append(f"Calories ({data.calories:g} kcal) do not match the macronutrients "
+                        f"(~{macro_kcal:.0f} kcal)")
+
+    cached = nutrition_cache.get_by_name(data.name)
+    if cached and cached.get("calories"):
+        serving_g = data.calories / cached["calories"] * 100
+        for field in MACRO_KCAL_PER_GRAM:
+            expected = (cached.get(field) or 0) * serving_g / 100
+            actual = getattr(data, field)
+            if abs(actual - expected) > max(3.0, 0.35 * max(actual, expected)):
+                warnings.append(f"{field.capitalize()} ({actual:g}g) differs from USDA data "
+                                f"(~{expected:.1f}g for the same calories)")
+        data.reference = {
+            "name": cached.get("description") or cached.get("name"),
+            "fdc_id": cached.get("fdc_id"),
+            "serving_g": round(serving_g)
+        }
+
+    data.warnings = warnings
+    return data
+
+
 class GeminiService:
     def __init__(self):
-        self.api_key = settings.GEMINI_API_KEY
+        self.api_key = upstream_api_key(settings.GEMINI_API_KEY)
         self.base_url = "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent"
         self.session: Optional[aiohttp.ClientSession] = None
+        self.structured_output = settings.GEMINI_STRUCTURED_OUTPUT
         
         self.system_prompt = """You are a friendly and knowledgeable nutrition expert assistant. Your role is to:
 
@@ -42,83 +226,179 @@ Always include the NUTRITION_DATA tag when you provide specific nutritional numb
 
 Be conversational but concise. Focus on being helpful for nutrition tracking."""
 
+        self.structured_prompt = """RESPONSE FORMAT: Reply with a JSON object instead of plain text. Put your message for the user in "reply". When you provide specific nutritional numbers, put them in "nutrition" (same fields as the NUTRITION_DATA tag) instead of adding the tag to the reply; otherwise leave "nutrition" null."""
+
+        self.response_schema = {
+            "type": "OBJECT",
+            "properties": {
+                "reply": {"type": "STRING"},
+                "nutrition": {
+                    "type": "OBJECT",
+                    "nullable": True,
+                    "properties": {
+                        "name": {"type": "STRING"},
+                        "calories": {"type": "NUMBER"},
+                        "protein": {"type": "NUMBER"},
+                        "carbs": {"type": "NUMBER"},
+                        "fat": {"type": "NUMBER"}
+                    },
+                    "required": ["name", "calories", "protein", "carbs", "fat"]
+                }
+            },
+            "required": ["reply"]
+        }
+
     async def get_session(self) -> aiohttp.ClientSession:
         if self.session is None or self.session.closed:
-            self.session = aiohttp.ClientSession()
+            self.session = create_upstream_session("gemini")
         return self.session
 
     async def close_session(self):
         if self.session and not self.session.closed:
             await self.session.close()
 
-    async def chat(self, message: str, conversation_history: List[Dict] = None) -> str:
-        """Send a message to Gemini and get a response."""
+    async def chat(self, message: str, conversation_history: List[Dict] = None) -> ChatReply:
+        """
+        Send a message to Gemini and get a response
+
+        Nutrition data is taken from the structured reply when JSON output is
+        enabled, otherwise extracted from the NUTRITION_DATA tag, then validated
+        and cross-checked against the nutrition cache.
+
+        Returns:
+            ChatReply with the display text and any nutrition data
+        """
         if not self.api_key:
             logger.warning("Gemini API key not configured")
-            return "I'm sorry, the AI assistant is not configured. Please add a Gemini API key."
+            return ChatReply(response="I'm sorry, the AI assistant is not configured. Please add a Gemini API key.")
 
         try:
-            session = await self.get_session()
-            
-            # Build the conversation contents
-            contents = []
-            
-            # Add system prompt as first user message
-            contents.append({
-                "role": "user",
-                "parts": [{"text": f"[System Instructions]: {self.system_prompt}"}]
-            })
-            contents.append({
-                "role": "model", 
-                "parts": [{"text": "Understood! I'm ready to help you with nutrition tracking. What would you like to know about?"}]
-            })
-            
-            # Add conversation history if provided
-            if conversation_history:
-                for msg in conversation_history:
-                    role = "user" if msg["role"] == "user" else "model"
-                    contents.append({
-                        "role": role,
-                        "parts": [{"text": msg["content"]}]
-                    })
-            
-            # Add current message
-            contents.append({
-                "role": "user",
-                "parts": [{"text": message}]
-            })
-            
-            payload = {
-                "contents": contents,
-                "generationConfig": {
-                    "temperature": 0.7,
-                    "topK": 40,
-                    "topP": 0.95,
-                    "maxOutputTokens": 1024,
-                }
-            }
-            
-            url = f"{self.base_url}?key={self.api_key}"
-            
-            async with session.post(url, json=payload) as response:
-                if response.status != 200:
-                    error_text = await response.text()
-                    logger.error(f"Gemini API error: {response.status} - {error_text}")
-                    return "I'm having trouble connecting right now. Please try again."
-                
-                data = await response.json()
-                
-                # Extract the response text
-                candidates = data.get("candidates", [])
-                if candidates and candidates[0].get("content", {}).get("parts"):
-                    return candidates[0]["content"]["parts"][0]["text"]
-                else:
-                    logger.warning(f"Unexpected Gemini response format: {data}")
-                    return "I couldn't generate a response. Please try again."
-                    
+            structured = self.structured_output
+            status, data = await self._generate(message, conversation_history, structured)
+            if status == 400 and structured and self._rejects_structured_output(data.get("error", "")):
+                # Model or API version without JSON mode: use the tag from now on
+                logger.warning("Gemini structured output rejected, falling back to NUTRITION_DATA tags")
+                self.structured_output = structured = False
+                status, data = await self._generate(message, conversation_history, structured)
+
+            if status != 200:
+                return ChatReply(response="I'm having trouble connecting right now. Please try again.")
+
+            # Extract the response text
+            candidates = data.get("candidates", [])
+            if not (candidates and candidates[0].get("content", {}).get("parts")):
+                logger.warning(f"Unexpected Gemini response format: {data}")
+                return ChatReply(response="I couldn't generate a response. Please try again.")
+
+            text = "".join(part.get("text", "") for part in candidates[0]["content"]["parts"])
+            reply = self.parse_reply(text, structured)
+            if reply.nutrition_data is not None:
+                reply.nutrition_data = cross_check(reply.nutrition_data)
+            return reply
+
         except Exception as e:
             logger.error(f"Error calling Gemini API: {str(e)}")
-            return f"Sorry, I encountered an error. Please try again."
+            return ChatReply(response="Sorry, I encountered an error. Please try again.")
+
+    async def _generate(self, message: str, conversation_history: Optional[List[Dict]],
+                        structured: bool) -> Tuple[int, Dict]:
+        """
+        Call generateContent
+
+        Returns:
+            The HTTP status and the decoded body, or {"error": <response text>}
+            if the request failed
+        """
+        session = await self.get_session()
+
+        system_prompt = self.system_prompt
+        if structured:
+            system_prompt = f"{system_prompt}\n\n{self.structured_prompt}"
+
+        # Build the conversation contents
+        contents = []
+
+        # Add system prompt as first user message
+        contents.append({
+            "role": "user",
+            "parts": [{"text": f"[System Instructions]: {system_prompt}"}]
+        })
+        contents.append({
+            "role": "model",
+            "parts": [{"text": "Understood! I'm ready to help you with nutrition tracking. What would you like to know about?"}]
+        })
+
+        # Add conversation history if provided
+        if conversation_history:
+            for msg in conversation_history:
+                role = "user" if msg["role"] == "user" else "model"
+                contents.append({
+                    "role": role,
+                    "parts": [{"text": msg["content"]}]
+                })
+
+        # Add current message
+        contents.append({
+            "role": "user",
+            "parts": [{"text": message}]
+        })
+
+        generation_config = {
+            "temperature": 0.7,
+            "topK": 40,
+            "topP": 0.95,
+            "maxOutputTokens": 1024,
+        }
+        if structured:
+            generation_config["responseMimeType"] = "application/json"
+            generation_config["responseSchema"] = self.response_schema
+
+        payload = {
+            "contents": contents,
+            "generationConfig": generation_config
+        }
+
+        url = f"{self.base_url}?key={self.api_key}"
+
+        async with session.post(url, json=payload) as response:
+            if response.status != 200:
+                error_text = await response.text()
+                logger.error(f"Gemini API error: {response.status} - {error_text}")
+                return response.status, {"error": error_text}
+            return response.status, await response.json()
+
+    @staticmethod
+    def _rejects_structured_output(error_text: str) -> bool:
+        """Whether a 400 error is about the JSON mode fields rather than the request itself"""
+        normalized = error_text.lower().replace("_", "")
+        return any(field in normalized for field in STRUCTURED_OUTPUT_FIELDS)
+
+    @staticmethod
+    def parse_reply(text: str, structured: bool) -> ChatReply:
+        """Split a model reply into display text and validated nutrition data"""
+        if structured:
+            try:
+                body = json.loads(text)
+                if isinstance(body, dict) and isinstance(body.get("reply"), str):
+                    # The model may still have added a tag to the reply text
+                    reply = GeminiService.parse_reply(body["reply"], False)
+                    nutrition_data = parse_nutrition_data(body.get("nutrition")) or reply.nutrition_data
+                    return ChatReply(response=reply.response, nutrition_data=nutrition_data)
+            except ValueError:
+                pass
+
+            partial = extract_partial_reply(text)
+            if partial is not None:
+                logger.warning("Gemini returned incomplete JSON in structured mode, using the partial reply")
+                return GeminiService.parse_reply(partial, False)
+            if text.lstrip().startswith(("{", "[")):
+                logger.warning("Gemini returned JSON without a reply in structured mode")
+                return ChatReply(response="I couldn't generate a response. Please try again.")
+            logger.warning("Gemini returned plain text in structured mode, extracting tag instead")
+
+        parser = NutritionTagParser()
+        display = parser.feed(text) + parser.close()
+        return ChatReply(response=display.strip(), nutrition_data=parser.nutrition_data())
 
 gemini_service = GeminiService()
 
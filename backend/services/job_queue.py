@@ -0,0 +1,240 @@
+import asyncio
+import itertools
+import json
+import os
+import sqlite3
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Any, Optional, Callable, Awaitable, List, Tuple
+from loguru import logger
+from ..config import settings
+
+JobHandler = Callable[..., Awaitable[Any]]
+
+
+def _process_alive(pid: int) -> bool:
+    """Whether a process with this id is running on this host"""
+    if pid <= 0 or os.name == "nt":  # signal 0 is not a liveness check on Windows
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class JobScheduler:
+    """
+    In-process asyncio job scheduler for deferred work.
+
+    Jobs are named handlers with keyword payloads, run by a fixed number of
+    worker tasks in priority order (lower number first). Each job has a key; a
+    job whose key is already pending or running is dropped, so the same
+    enrichment is never queued twice. With a persistence path, pending jobs are
+    mirrored to SQLite and picked up again after a restart; the writes run in
+    order on a single background thread that owns the connection, so submitting
+    a job never waits for a commit. Rows are owned by the process that queued
+    them, so several workers can share one file: on start a worker only takes
+    over the rows of processes that no longer exist.
+    """
+
+    def __init__(self, concurrency: Optional[int] = None, persist_path: Optional[str] = None):
+        self.concurrency = concurrency or settings.JOB_QUEUE_CONCURRENCY
+        self.max_pending = settings.JOB_QUEUE_MAX_PENDING
+        self.persist_path = persist_path if persist_path is not None else settings.JOB_QUEUE_DB_PATH
+        self.owner = os.getpid()
+        self.handlers: Dict[str, JobHandler] = {}
+        self._queue: asyncio.PriorityQueue = asyncio.PriorityQueue()
+        self._jobs: Dict[str, Tuple[str, Dict[str, Any]]] = {}  # key -> (name, payload), pending or running
+        self._sequence = itertools.count()
+        self._workers: List[asyncio.Task] = []
+        self._timers: Dict[str, asyncio.TimerHandle] = {}  # key -> timer of a delayed job
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_thread: Optional[ThreadPoolExecutor] = None
+        self.stats = {"submitted": 0, "deduplicated": 0, "rejected": 0, "completed": 0, "failed": 0}
+
+    def register(self, name: str, handler: JobHandler) -> None:
+        """Register an async handler for jobs of the given name"""
+        self.handlers[name] = handler
+
+    def submit(self, name: str, key: str, priority: int = 10, delay_s: float = 0, **payload: Any) -> bool:
+        """
+        Queue a job unless one with the same key is pending or running
+
+        Args:
+            name: Registered handler name
+            key: Deduplication key
+            priority: Lower runs first
+            delay_s: Seconds to wait before the job becomes runnable
+            **payload: Keyword arguments for the handler (JSON-serializable when persisted)
+
+        Returns:
+            True if the job was queued, False if deduplicated or the queue is full
+        """
+        if name not in self.handlers:
+            raise ValueError(f"No handler registered for job '{name}'")
+        if key in self._jobs:
+            self.stats["deduplicated"] += 1
+            return False
+        if len(self._jobs) >= self.max_pending:
+            self.stats["rejected"] += 1
+            logger.warning(f"Job queue full, dropping job {key}")
+            return False
+
+        self._jobs[key] = (name, payload)
+        self.stats["submitted"] += 1
+        self._in_db_thread(self._persist, key, name, priority, json.dumps(payload), time.time() + delay_s)
+        self._schedule(priority, key, delay_s)
+        return True
+
+    def _schedule(self, priority: int, key: str, delay_s: float) -> None:
+        if delay_s > 0:
+            self._timers[key] = asyncio.get_running_loop().call_later(delay_s, self._enqueue, priority, key)
+        else:
+            self._enqueue(priority, key)
+
+    def _enqueue(self, priority: int, key: str) -> None:
+        self._timers.pop(key, None)
+        self._queue.put_nowait((priority, next(self._sequence), key))
+
+    async def _worker(self) -> None:
+        while True:
+            _, _, key = await self._queue.get()
+            name, payload = self._jobs[key]
+            try:
+                await self.handlers[name](**payload)
+                self.stats["completed"] += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.stats["failed"] += 1
+                logger.warning(f"Job {key} failed: {str(e)}")
+            finally:
+                self._queue.task_done()
+            # Only forget the job once it finished (a cancelled job stays persisted)
+            self._jobs.pop(key, None)
+            self._in_db_thread(self._unpersist, key)
+
+    # --------------------------
+    # Persistence (runs on the database thread)
+    # --------------------------
+
+    def _in_db_thread(self, fn: Callable[..., Any], *args: Any) -> Optional[Future]:
+        """Run a persistence call on the database thread without waiting for it"""
+        if not self.persist_path:
+            return None
+        if self._db_thread is None:
+            self._db_thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix="job-queue-db")
+        future = self._db_thread.submit(fn, *args)
+        future.add_done_callback(self._log_db_error)
+        return future
+
+    @staticmethod
+    def _log_db_error(future: Future) -> None:
+        if not future.cancelled() and future.exception() is not None:
+            logger.error(f"Job persistence failed: {str(future.exception())}")
+
+    def _get_db(self) -> Optional[sqlite3.Connection]:
+        if not self.persist_path:
+            return None
+        if self._db is None:
+            directory = os.path.dirname(self.persist_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(self.persist_path)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "owner INTEGER NOT NULL, key TEXT NOT NULL, name TEXT NOT NULL, priority INTEGER NOT NULL, "
+                "payload TEXT NOT NULL, run_at REAL NOT NULL, PRIMARY KEY (owner, key))"
+            )
+            self._db.commit()
+        return self._db
+
+    def _persist(self, key: str, name: str, priority: int, payload: str, run_at: float) -> None:
+        db = self._get_db()
+        if db is not None:
+            with db:
+                db.execute(
+                    "INSERT OR REPLACE INTO jobs (owner, key, name, priority, payload, run_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (self.owner, key, name, priority, payload, run_at)
+                )
+
+    def _unpersist(self, key: str) -> None:
+        db = self._get_db()
+        if db is not None:
+            with db:
+                db.execute("DELETE FROM jobs WHERE owner = ? AND key = ?", (self.owner, key))
+
+    def _claim_jobs(self) -> List[Tuple[str, str, int, str, float]]:
+        """Take over the rows of processes that are gone, then load this process's rows"""
+        db = self._get_db()
+        owners = [owner for owner, in db.execute("SELECT DISTINCT owner FROM jobs WHERE owner != ?", (self.owner,))]
+        with db:
+            for owner in owners:
+                if not _process_alive(owner):
+                    # Each UPDATE is atomic, so two workers starting together never both claim a row
+                    db.execute("UPDATE OR REPLACE jobs SET owner = ? WHERE owner = ?", (self.owner, owner))
+        return db.execute(
+            "SELECT key, name, priority, payload, run_at FROM jobs WHERE owner = ? ORDER BY priority, run_at",
+            (self.owner,)
+        ).fetchall()
+
+    def _close_db(self) -> None:
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    async def _restore(self) -> None:
+        """Re-queue jobs left over from a previous run"""
+        future = self._in_db_thread(self._claim_jobs)
+        if future is None:
+            return
+        rows = await asyncio.wrap_future(future)
+        now = time.time()
+        restored = 0
+        for key, name, priority, payload, run_at in rows:
+            if name not in self.handlers or key in self._jobs:
+                continue
+            self._jobs[key] = (name, json.loads(payload))
+            self._schedule(priority, key, run_at - now)
+            restored += 1
+        if restored:
+            logger.info(f"Restored {restored} pending jobs from {self.persist_path}")
+
+    # --------------------------
+    # Lifecycle
+    # --------------------------
+
+    async def start(self) -> None:
+        """Start the workers (and restore persisted jobs)"""
+        if self._workers:
+            return
+        await self._restore()
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+        logger.info(f"Job scheduler started with {self.concurrency} workers")
+
+    async def stop(self) -> None:
+        """Cancel the workers; persisted jobs are picked up on the next start"""
+        for timer in self._timers.values():
+            timer.cancel()
+        self._timers.clear()
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        if self._db_thread is not None:
+            # Let queued writes finish before closing the connection on its own thread
+            self._db_thread.submit(self._close_db)
+            await asyncio.get_running_loop().run_in_executor(None, self._db_thread.shutdown)
+            self._db_thread = None
+
+    def status(self) -> Dict[str, Any]:
+        return {"pending": len(self._jobs), "workers": len(self._workers), **self.stats}
+
+# Global instance
+job_scheduler = JobScheduler()
@@ -0,0 +1,263 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Any, Optional, Iterable, Iterator, List, Tuple
+from fastapi.concurrency import run_in_threadpool
+from loguru import logger
+from ..config import settings
+
+
+class NutritionCache:
+    """
+    In-memory LRU cache of standardized nutrition data.
+
+    Entries are the dicts produced by USDAService._extract_nutrition_data and are
+    reachable both by (normalized) food name and by FDC ID.
+
+    With a database path, entries are also written to a shared SQLite file, so
+    every worker process sees data fetched by any other. The database is never
+    touched on the event loop: the get_* methods only read memory, the async
+    fetch_* methods look up memory misses there in a worker thread, and writes
+    are applied in order by a background writer thread. The lock only guards the
+    in-memory tables; the connection has its own lock.
+    """
+
+    # Keys per SELECT ... IN (...) query, below SQLite's bound-parameter limit
+    LOAD_BATCH_SIZE = 500
+
+    def __init__(self, max_entries: Optional[int] = None, db_path: Optional[str] = None):
+        self.max_entries = max_entries or settings.NUTRITION_CACHE_MAX_ENTRIES
+        self.db_path = db_path if db_path is not None else settings.NUTRITION_CACHE_DB_PATH
+        self._by_name: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._by_fdc_id: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._writer: Optional[ThreadPoolExecutor] = None
+        self.version = 0  # bumped on every write, so derived indexes know when to rebuild
+
+    @staticmethod
+    def normalize_name(name: str) -> str:
+        """Normalize a food name for use as a cache key"""
+        return " ".join(name.lower().split())
+
+    # --------------------------
+    # Shared database (never called on the event loop)
+    # --------------------------
+
+    def _get_db(self) -> Optional[sqlite3.Connection]:
+        """Open the shared database (caller holds the database lock)"""
+        if not self.db_path:
+            return None
+        if self._db is None:
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(self.db_path, check_same_thread=False, timeout=5)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS nutrition_cache ("
+                "kind TEXT NOT NULL, key TEXT NOT NULL, data TEXT NOT NULL, updated_at REAL NOT NULL, "
+                "PRIMARY KEY (kind, key))"
+            )
+            self._db.commit()
+        return self._db
+
+    def _load(self, kind: str, keys: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Read entries from the shared database"""
+        rows = []
+        with self._db_lock:
+            db = self._get_db()
+            if db is None:
+                return {}
+            for start in range(0, len(keys), self.LOAD_BATCH_SIZE):
+                batch = keys[start:start + self.LOAD_BATCH_SIZE]
+                rows.extend(db.execute(
+                    f"SELECT key, data FROM nutrition_cache WHERE kind = ? AND key IN ({', '.join('?' * len(batch))})",
+                    (kind, *batch)
+                ).fetchall())
+        return {key: json.loads(data) for key, data in rows}
+
+    def _write_rows(self, rows: List[Tuple[str, str, str, float]]) -> None:
+        with self._db_lock:
+            db = self._get_db()
+            with db:
+                db.executemany(
+                    "INSERT OR REPLACE INTO nutrition_cache (kind, key, data, updated_at) VALUES (?, ?, ?, ?)",
+                    rows
+                )
+
+    @staticmethod
+    def _log_write_error(future: Future) -> None:
+        if not future.cancelled() and future.exception() is not None:
+            logger.error(f"Nutrition cache write failed: {str(future.exception())}")
+
+    # --------------------------
+    # Lookups
+    # --------------------------
+
+    def _peek(self, table: "OrderedDict[str, Dict[str, Any]]", key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = table.get(key)
+            if entry is not None:
+                table.move_to_end(key)
+            return entry
+
+    async def _fetch(self, table: "OrderedDict[str, Dict[str, Any]]", kind: str,
+                     keys: List[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        found = {key: self._peek(table, key) for key in keys}
+        missing = [key for key, entry in found.items() if entry is None]
+        if missing and self.db_path:
+            loaded = await run_in_threadpool(self._load, kind, missing)
+            with self._lock:
+                for key, entry in loaded.items():
+                    self._store(table, key, entry)
+            found.update(loaded)
+        return found
+
+    def get_by_name(self, name: str) -> Optional[Dict[str, Any]]:
+        """Get nutrition data for a food name from memory (never blocks on the database)"""
+        return self._peek(self._by_name, self.normalize_name(name))
+
+    def get_many(self, names: Iterable[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        """Get nutrition data for several names from memory (misses map to None)"""
+        return {name: self.get_by_name(name) for name in names}
+
+    def get_by_fdc_id(self, fdc_id: Any) -> Optional[Dict[str, Any]]:
+        """Get nutrition data for an FDC ID from memory (never blocks on the database)"""
+        return self._peek(self._by_fdc_id, str(fdc_id))
+
+    async def fetch_by_name(self, name: str) -> Optional[Dict[str, Any]]:
+        """Get cached nutrition data for a food name, falling back to the shared database"""
+        key = self.normalize_name(name)
+        return (await self._fetch(self._by_name, "name", [key]))[key]
+
+    async def fetch_many(self, names: Iterable[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        """Get cached nutrition data for several names (one database query for the memory misses)"""
+        keys = {name: self.normalize_name(name) for name in names}
+        found = await self._fetch(self._by_name, "name", list(set(keys.values())))
+        return {name: found[key] for name, key in keys.items()}
+
+    async def fetch_by_fdc_id(self, fdc_id: Any) -> Optional[Dict[str, Any]]:
+        """Get cached nutrition data for an FDC ID, falling back to the shared database"""
+        key = str(fdc_id)
+        return (await self._fetch(self._by_fdc_id, "fdc_id", [key]))[key]
+
+    # --------------------------
+    # Writes
+    # --------------------------
+
+    def put(self, nutrition: Dict[str, Any], name: Optional[str] = None) -> None:
+        """
+        Store nutrition data under its FDC ID and, if given, a food name
+
+        Args:
+            nutrition: Standardized nutrition data
+            name: Food name the data was looked up by
+        """
+        self.put_many([nutrition], names=[name])
+
+    def put_many(self, entries: List[Dict[str, Any]], names: Optional[List[Optional[str]]] = None,
+                 wait: bool = False) -> None:
+        """
+        Store several entries at once (one database transaction)
+
+        The in-memory tables are updated immediately; the database write is
+        queued on the writer thread.
+
+        Args:
+            entries: Standardized nutrition data
+            names: Food name for each entry (None where there is none)
+            wait: Block until the database write has been committed (for bulk loads)
+        """
+        items = []
+        rows = []
+        now = time.time()
+        for nutrition, name in zip(entries, names or [None] * len(entries)):
+            data = json.dumps(nutrition) if self.db_path else ""
+            if name:
+                items.append((self._by_name, self.normalize_name(name), nutrition))
+                rows.append(("name", self.normalize_name(name), data, now))
+            if nutrition.get("fdc_id"):
+                items.append((self._by_fdc_id, str(nutrition["fdc_id"]), nutrition))
+                rows.append(("fdc_id", str(nutrition["fdc_id"]), data, now))
+
+        with self._lock:
+            for table, key, nutrition in items:
+                self._store(table, key, nutrition)
+            self.version += 1
+            if not self.db_path or not rows:
+                return
+            if self._writer is None:
+                self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="nutrition-cache-db")
+            future = self._writer.submit(self._write_rows, rows)
+        future.add_done_callback(self._log_write_error)
+        if wait:
+            future.result()
+
+    # --------------------------
+    # Derived indexes (called from worker threads)
+    # --------------------------
+
+    def fdc_entries(self) -> Iterator[Dict[str, Any]]:
+        """
+        All entries with an FDC ID
+
+        Reads the shared database when there is one (it holds everything any
+        worker or bulk load stored), otherwise the in-memory entries. Rows are
+        decoded as they are iterated, outside both locks.
+        """
+        if not self.db_path:
+            with self._lock:
+                entries = list(self._by_fdc_id.values())
+            return iter(entries)
+        with self._db_lock:
+            rows = self._get_db().execute("SELECT data FROM nutrition_cache WHERE kind = 'fdc_id'").fetchall()
+        return (json.loads(row[0]) for row in rows)
+
+    def change_token(self) -> Tuple[Any, ...]:
+        """Changes whenever the set of FDC entries may have changed (including in other processes)"""
+        if not self.db_path:
+            return (self.version,)
+        with self._db_lock:
+            count, updated_at = self._get_db().execute(
+                "SELECT COUNT(*), MAX(updated_at) FROM nutrition_cache WHERE kind = 'fdc_id'"
+            ).fetchone()
+        return (count, updated_at)
+
+    def _store(self, table: "OrderedDict[str, Dict[str, Any]]", key: str, value: Dict[str, Any]) -> None:
+        """Insert into one of the LRU tables, evicting the least recently used entry"""
+        table[key] = value
+        table.move_to_end(key)
+        while len(table) > self.max_entries:
+            table.popitem(last=False)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._by_fdc_id)
+
+    def clear(self) -> None:
+        """Drop the in-memory entries (the shared database is kept)"""
+        with self._lock:
+            self._by_name.clear()
+            self._by_fdc_id.clear()
+            self.version += 1
+
+    def close(self) -> None:
+        """Finish queued writes and close the shared database connection"""
+        with self._lock:
+            writer, self._writer = self._writer, None
+        if writer is not None:
+            writer.shutdown(wait=True)
+        with self._db_lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+# Global instance
+nutrition_cache = NutritionCache()
@@ -0,0 +1,201 @@
+import copy
+import threading
+import time
+from typing import Dict, Any, Optional, List, Tuple
+import numpy as np
+from loguru import logger
+from ..config import settings
+from .usda_service import NUTRIENT_FIELDS
+from .nutrition_cache import nutrition_cache, NutritionCache
+
+# (min, max) per nutrient field; either bound may be None
+Constraints = Dict[str, Tuple[Optional[float], Optional[float]]]
+
+
+class NutrientIndex:
+    """Contiguous nutrient matrices for every food with an FDC ID"""
+
+    def __init__(self, entries: List[Dict[str, Any]], token: Tuple[Any, ...], scale: Optional[np.ndarray] = None):
+        self.token = token
+        self.built_at = time.monotonic()
+        self.fdc_ids = [str(entry["fdc_id"]) for entry in entries]
+        self.names = [entry.get("description") or entry.get("name") or "" for entry in entries]
+        self.data_types = [entry.get("data_type") for entry in entries]
+        self.positions = {fdc_id: position for position, fdc_id in enumerate(self.fdc_ids)}
+
+        # Raw per-100g values, used for constraint filters and the response
+        self.values = np.array(
+            [[entry.get(field) or 0 for field in NUTRIENT_FIELDS] for entry in entries],
+            dtype=np.float32
+        ).reshape(len(entries), len(NUTRIENT_FIELDS))
+
+        # log1p tames the long tails (sodium in mg, energy-dense foods), dividing by the
+        # column spread weighs every nutrient equally, and unit rows make cosine a dot product
+        features = np.log1p(np.maximum(self.values, 0))
+        if scale is None:
+            scale = features.std(axis=0)
+            scale = np.where(scale > 0, scale, 1)
+        self.scale = scale
+        features /= scale
+        norms = np.linalg.norm(features, axis=1, keepdims=True)
+        self.vectors = np.ascontiguousarray(features / np.where(norms > 0, norms, 1), dtype=np.float32)
+
+    def __len__(self) -> int:
+        return len(self.fdc_ids)
+
+    def extended(self, entries: List[Dict[str, Any]]) -> "NutrientIndex":
+        """
+        A copy with more foods appended, scaled with this index's column spread
+
+        Much cheaper than a rebuild, which re-reads the whole store; the spread
+        is recomputed at the next rebuild.
+        """
+        added = NutrientIndex(entries, self.token, self.scale)
+        index = copy.copy(self)
+        index.fdc_ids = self.fdc_ids + added.fdc_ids
+        index.names = self.names + added.names
+        index.data_types = self.data_types + added.data_types
+        index.positions = dict(self.positions)
+        index.positions.update((fdc_id, len(self) + position) for fdc_id, position in added.positions.items())
+        index.values = np.concatenate([self.values, added.values])
+        index.vectors = np.concatenate([self.vectors, added.vectors])
+        return index
+
+
+class SimilarityService:
+    """
+    Nearest-neighbour search over nutrient profiles.
+
+    Every food in the nutrition store is a normalized float32 vector of the
+    NUTRIENT_FIELDS values; a query is one matrix-vector product, a boolean mask
+    for the constraints and an argpartition for the top k.
+
+    Only the first search builds the index on the request path. After that the
+    store is checked for changes at most every SIMILARITY_REBUILD_INTERVAL_S and
+    the index is rebuilt in a background thread, while searches keep using the
+    current one. A single food fetched for an unknown FDC ID is appended with
+    add() instead of triggering a rebuild.
+    """
+
+    def __init__(self, cache: NutritionCache):
+        self.cache = cache
+        self.rebuild_interval_s = settings.SIMILARITY_REBUILD_INTERVAL_S
+        self._index: Optional[NutrientIndex] = None
+        self._lock = threading.Lock()  # guards swapping self._index
+        self._build_lock = threading.Lock()  # one build at a time
+        self._refresh_thread: Optional[threading.Thread] = None
+
+    def _build(self) -> NutrientIndex:
+        start = time.perf_counter()
+        token = self.cache.change_token()
+        index = NutrientIndex(list(self.cache.fdc_entries()), token)
+        logger.info(f"Built nutrient index of {len(index)} foods in {(time.perf_counter() - start) * 1000:.0f}ms")
+        return index
+
+    def get_index(self) -> NutrientIndex:
+        """The current index (built on first use, refreshed in the background once due)"""
+        index = self._index
+        if index is None:
+            with self._build_lock:
+                if self._index is None:
+                    index = self._build()
+                    with self._lock:
+                        self._index = index
+                return self._index
+
+        if time.monotonic() - index.built_at >= self.rebuild_interval_s:
+            with self._lock:
+                if self._refresh_thread is None or not self._refresh_thread.is_alive():
+                    index.built_at = time.monotonic()
+                    self._refresh_thread = threading.Thread(target=self._refresh, name="similarity-index",
+                                                            daemon=True)
+                    self._refresh_thread.start()
+        return index
+
+    def _refresh(self) -> None:
+        """Rebuild the index if the store changed (runs in the background thread)"""
+        try:
+            with self._build_lock:
+                if self.cache.change_token() == self._index.token:
+                    return
+                index = self._build()
+                with self._lock:
+                    self._index = index
+        except Exception as e:
+            logger.error(f"Nutrient index rebuild failed: {str(e)}")
+
+    def add(self, entries: List[Dict[str, Any]]) -> None:
+        """
+        Append foods to the current index without rebuilding it
+
+        Args:
+            entries: Standardized nutrition data (entries without an FDC ID or
+                already indexed are skipped)
+        """
+        with self._lock:
+            index = self._index
+            if index is None:
+                return  # the first build reads them from the store
+            seen = set(index.positions)
+            new = []
+            for entry in entries:
+                fdc_id = str(entry.get("fdc_id") or "")
+                if fdc_id and fdc_id not in seen:
+                    seen.add(fdc_id)
+                    new.append(entry)
+            if new:
+                self._index = index.extended(new)
+
+    def similar(self, fdc_id: str, limit: int = 10, constraints: Optional[Constraints] = None) -> Optional[Dict[str, Any]]:
+        """
+        Find the foods with the most similar nutrient profile
+
+        Args:
+            fdc_id: FDC ID of the reference food
+            limit: Number of results
+            constraints: Per-field (min, max) bounds on per-100g values, e.g. {"sugars": (None, 5)}
+
+        Returns:
+            The reference food and its neighbours by cosine similarity, or None if
+            the food is not in the nutrition store
+        """
+        fdc_id = str(fdc_id)
+        index = self.get_index()
+        if fdc_id not in index.positions:
+            return None
+
+        position = index.positions[fdc_id]
+        scores = index.vectors @ index.vectors[position]
+
+        mask = np.ones(len(index), dtype=bool)
+        mask[position] = False
+        for field, (low, high) in (constraints or {}).items():
+            column = index.values[:, NUTRIENT_FIELDS.index(field)]
+            if low is not None:
+                mask &= column >= low
+            if high is not None:
+                mask &= column <= high
+
+        candidates = np.flatnonzero(mask)
+        if len(candidates) > limit:
+            candidates = candidates[np.argpartition(-scores[candidates], limit)[:limit]]
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+
+        return {
+            "food": self._describe(index, position),
+            "results": [dict(self._describe(index, i), similarity=round(float(scores[i]), 4)) for i in candidates],
+            "indexed_foods": len(index),
+            "matched_constraints": int(mask.sum())
+        }
+
+    @staticmethod
+    def _describe(index: NutrientIndex, position: int) -> Dict[str, Any]:
+        return {
+            "id": index.fdc_ids[position],
+            "name": index.names[position],
+            "data_type": index.data_types[position],
+            "nutrients": {field: round(float(value), 1) for field, value in zip(NUTRIENT_FIELDS, index.values[position])}
+        }
+
+# Global instance
+similarity_service = SimilarityService(nutrition_cache)
@@ -3,14 +3,21 @@ import asyncio
 from typing import Dict, Any, Optional, List
 from loguru import logger
 from ..config import settings
+from ..log_utils import hot_log
+from .nutrition_cache import nutrition_cache
+from ..replay.sessions import create_upstream_session, upstream_api_key
+
+# Nutrient fields produced by USDAService._extract_nutrition_data (values per 100g)
+NUTRIENT_FIELDS = ("calories", "protein", "carbs", "fat", "fiber", "sugars", "sodium")
 
 class USDAService:
     """Service for fetching nutritional data from USDA FoodData Central API"""
     
     def __init__(self):
-        self.api_key = settings.USDA_API_KEY
+        self.api_key = upstream_api_key(settings.USDA_API_KEY)
         self.base_url = settings.USDA_BASE_URL
         self.session = None
+        self.cache = nutrition_cache
         
         # Mapping from model class names to better USDA search terms
         self.food_name_mapping = {
@@ -29,7 +36,7 @@ class USDAService:
     async def _get_session(self) -> aiohttp.ClientSession:
         """Get or create aiohttp session"""
         if self.session is None or self.session.closed:
-            self.session = aiohttp.ClientSession()
+            self.session = create_upstream_session("usda")
         return self.session
     
     async def close_session(self):
@@ -66,13 +73,13 @@ class USDAService:
                 "sortOrder": "asc"
             }
             
-            logger.info(f"Searching USDA database for: {food_name}")
+            hot_log("INFO", "Searching USDA database for: {}", lambda: food_name)
             
             async with session.get(url, params=params) as response:
                 if response.status == 200:
                     data = await response.json()
                     foods = data.get("foods", [])
-                    logger.info(f"Found {len(foods)} food items for '{food_name}'")
+                    hot_log("INFO", "Found {} food items for '{}'", lambda: len(foods), lambda: food_name)
                     return foods
                 else:
                     logger.error(f"USDA API error: {response.status} - {await response.text()}")
@@ -118,12 +125,12 @@ class USDAService:
                 "format": "abridged"  # Get essential nutrition info
             }
             
-            logger.info(f"Fetching details for FDC ID: {fdc_id}")
+            hot_log("INFO", "Fetching details for FDC ID: {}", lambda: fdc_id)
             
             async with session.get(url, params=params) as response:
                 if response.status == 200:
                     data = await response.json()
-                    logger.info(f"Retrieved details for food: {data.get('description', 'Unknown')}")
+                    hot_log("INFO", "Retrieved details for food: {}", lambda: data.get('description', 'Unknown'))
                     return data
                 else:
                     logger.error(f"USDA API error: {response.status} - {await response.text()}")
@@ -143,6 +150,10 @@ class USDAService:
         Returns:
             Standardized nutrition information or None if not found
         """
+        cached = await self.cache.fetch_by_name(food_name)
+        if cached is not None:
+            return dict(cached, name=food_name)
+        
         # Use mapped name if available, otherwise use original name
         search_term = self.food_name_mapping.get(food_name.lower(), food_name)
         
@@ -168,7 +179,64 @@ class USDAService:
             return None
         
         # Extract and standardize nutrition data
-        return self._extract_nutrition_data(food_details, food_name)
+        nutrition_data = self._extract_nutrition_data(food_details, food_name)
+        if nutrition_data.get("source") != "fallback":
+            self.cache.put(nutrition_data, name=food_name)
+        return nutrition_data
+    
+    async def get_nutrition_by_fdc_id(self, fdc_id: str, food_name: str) -> Optional[Dict[str, Any]]:
+        """
+        Get nutritional information for a specific FDC ID (cached)
+        
+        Args:
+            fdc_id: FDC ID of the food item
+            food_name: Name to report if the details have no description
+            
+        Returns:
+            Standardized nutrition information or None if not found
+        """
+        cached = await self.cache.fetch_by_fdc_id(fdc_id)
+        if cached is not None:
+            return cached
+        
+        food_details = await self.get_food_details(str(fdc_id))
+        if not food_details:
+            return None
+        
+        nutrition_data = self._extract_nutrition_data(food_details, food_name)
+        if nutrition_data.get("source") != "fallback":
+            self.cache.put(nutrition_data)
+        return nutrition_data
+    
+    async def resolve_names(self, food_names: List[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        """
+        Resolve nutrition data for several food names at once
+        
+        Cached names are answered directly; the remaining names are looked up
+        concurrently (bounded by USDA_MAX_CONCURRENCY).
+        
+        Args:
+            food_names: Food names to resolve
+            
+        Returns:
+            Mapping of each name to its nutrition data, or None if not found
+        """
+        resolved = await self.cache.fetch_many(set(food_names))
+        misses = [name for name, nutrition in resolved.items() if nutrition is None]
+        if not misses:
+            return resolved
+        
+        logger.info(f"Resolving {len(misses)} uncached food names ({len(resolved) - len(misses)} cached)")
+        semaphore = asyncio.Semaphore(settings.USDA_MAX_CONCURRENCY)
+        
+        async def resolve(name: str) -> Optional[Dict[str, Any]]:
+            async with semaphore:
+                return await self.get_nutrition_by_name(name)
+        
+        results = await asyncio.gather(*(resolve(name) for name in misses), return_exceptions=True)
+        for name, result in zip(misses, results):
+            resolved[name] = None if isinstance(result, BaseException) else result
+        return resolved
     
     def _extract_nutrition_data(self, food_details: Dict[str, Any], food_name: str) -> Dict[str, Any]:
         """
@@ -226,7 +294,8 @@ class USDAService:
                 "serving_size": "100g"  # USDA data is per 100g
             }
             
-            logger.info(f"Extracted nutrition data for '{food_name}': {calories} kcal, {protein}g protein")
+            hot_log("INFO", "Extracted nutrition data for '{}': {} kcal, {}g protein",
+                    lambda: food_name, lambda: calories, lambda: protein)
             return nutrition_data
             
         except Exception as e:
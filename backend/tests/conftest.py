@@ -0,0 +1,15 @@
+import pytest
+from backend.services.food_log_service import FoodLogService
+
+
+@pytest.fixture
+def food_log(tmp_path):
+    """A food log store in a throwaway database"""
+    service = FoodLogService(db_path=str(tmp_path / "food_log.db"))
+    yield service
+    service.close()
+
+
+def make_food(name="Apple", calories=52, protein=0.3, carbs=14, fat=0.2, **extra):
+    """A valid food log entry with the given overrides"""
+    return dict(name=name, calories=calories, protein=protein, carbs=carbs, fat=fat, **extra)
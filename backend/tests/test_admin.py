@@ -0,0 +1,27 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from backend.api import admin
+from backend.config import settings
+
+
+def make_client(monkeypatch, workers):
+    monkeypatch.setattr(settings, "ADMIN_TOKEN", "secret")
+    monkeypatch.setattr(settings, "SERVER_WORKERS", workers)
+    app = FastAPI()
+    app.include_router(admin.router)
+    return TestClient(app, headers={"X-Admin-Token": "secret"})
+
+
+def test_per_worker_endpoints_are_rejected_with_several_workers(monkeypatch):
+    client = make_client(monkeypatch, workers=4)
+    assert client.post("/models/reload", json={}).status_code == 409
+    assert client.post("/models/candidate/promote").status_code == 409
+    assert client.get("/profiles/1").status_code == 409
+    assert client.get("/jobs").status_code == 200
+
+
+def test_per_worker_endpoints_work_with_one_worker(monkeypatch):
+    client = make_client(monkeypatch, workers=1)
+    assert client.get("/profiles").status_code == 200
+    assert client.get("/profiles/12345").status_code == 404
+    assert client.post("/models/candidate/promote").status_code == 400
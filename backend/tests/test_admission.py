@@ -0,0 +1,115 @@
+import asyncio
+import json
+import time
+from types import SimpleNamespace
+import pytest
+from backend.middleware import admission
+from backend.middleware.admission import TokenBucket, RouteGroup, AdmissionMiddleware, AdmissionController
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Controllable time.monotonic for the token buckets"""
+    now = [1000.0]
+    # Replaces the module's time rather than patching time.monotonic, which the event loop uses
+    monkeypatch.setattr(admission, "time", SimpleNamespace(monotonic=lambda: now[0], perf_counter=time.perf_counter))
+    return now
+
+
+def test_token_bucket_allows_a_burst_then_refills(clock):
+    bucket = TokenBucket(rate=2.0, burst=3)
+    assert [bucket.take() for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert bucket.take() == pytest.approx(0.5)
+
+    clock[0] += 0.5
+    assert bucket.take() == 0.0
+    assert bucket.take() == pytest.approx(0.5)
+
+    # Refill never exceeds the burst
+    clock[0] += 60
+    assert [bucket.take() for _ in range(4)][:3] == [0.0, 0.0, 0.0]
+    assert bucket.tokens < 1
+
+
+def test_zero_rate_means_no_limit(clock):
+    bucket = TokenBucket(rate=0.0, burst=1)
+    assert all(bucket.take() == 0.0 for _ in range(100))
+
+    group = RouteGroup("usda", ("/api",), 4, rate_per_min=0, burst=1, max_queue_ms=100, max_clients=10)
+    assert all(group.check_rate("client") == 0.0 for _ in range(100))
+    assert group.status()["rate_limited"] == 0
+
+
+def test_clients_have_separate_buckets_and_are_bounded(clock):
+    group = RouteGroup("chat", ("/api/v1/chat",), 4, rate_per_min=60, burst=1, max_queue_ms=100, max_clients=2)
+    assert group.check_rate("a") == 0.0
+    assert group.check_rate("a") == pytest.approx(1.0)
+    assert group.check_rate("b") == 0.0
+    group.check_rate("c")
+    assert group.status()["clients"] == 2
+    assert group.stats["rate_limited"] == 1
+
+
+async def call(middleware, path, client="1.2.3.4"):
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": "GET", "path": path, "headers": [], "client": (client, 1234)}
+    await middleware(scope, None, send)
+    headers = dict(sent[0].get("headers", []))
+    return sent[0]["status"], headers, b"".join(m.get("body", b"") for m in sent[1:])
+
+
+def make_middleware(release: asyncio.Event = None):
+    async def app(scope, receive, send):
+        if release is not None:
+            await release.wait()
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+    controller = AdmissionController()
+    controller.groups = [RouteGroup("vision", ("/api/v1/classify",), 1, rate_per_min=60, burst=2,
+                                    max_queue_ms=50, max_clients=100)]
+    return AdmissionMiddleware(app, controller), controller.groups[0]
+
+
+def test_middleware_rate_limits_with_retry_after(clock):
+    async def main():
+        middleware, _ = make_middleware()
+        return [await call(middleware, "/api/v1/classify") for _ in range(3)]
+
+    (first, _, _), (second, _, _), (third, headers, body) = asyncio.run(main())
+    assert (first, second, third) == (200, 200, 429)
+    assert headers[b"retry-after"] == b"1"
+    assert "slow down" in json.loads(body)["detail"]
+
+
+def test_middleware_passes_other_routes_through(clock):
+    async def main():
+        middleware, group = make_middleware()
+        results = [await call(middleware, "/api/v1/food-log") for _ in range(10)]
+        return results, group
+
+    results, group = asyncio.run(main())
+    assert {status for status, _, _ in results} == {200}
+    assert group.stats["admitted"] == 0
+
+
+def test_middleware_sheds_when_the_queue_budget_is_exceeded(clock):
+    async def main():
+        release = asyncio.Event()
+        middleware, group = make_middleware(release)
+        # Occupies the only slot until released
+        running = asyncio.create_task(call(middleware, "/api/v1/classify", client="a"))
+        await asyncio.sleep(0)
+        shed = await call(middleware, "/api/v1/classify", client="b")
+        release.set()
+        return await running, shed, group
+
+    running, shed, group = asyncio.run(main())
+    assert running[0] == 200
+    assert shed[0] == 503
+    assert b"retry-after" in shed[1]
+    assert group.stats["shed"] == 1 and group.active == 0
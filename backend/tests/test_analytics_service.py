@@ -0,0 +1,55 @@
+import pytest
+from backend.services.analytics_service import AnalyticsService
+from backend.services.food_log_service import FoodLogService
+from .conftest import make_food
+
+
+def daily_calories(stats):
+    return [(period["start"], period["calories"]) for period in stats["periods"]]
+
+
+def test_rollup_reflects_writes_after_caching(food_log):
+    analytics = AnalyticsService(food_log)
+    food_log.add_entries("alice", [make_food(calories=100, date="2024-01-05")])
+    assert daily_calories(analytics.rollup("alice", "2024-01-01", "2024-01-31")) == [("2024-01-05", 100)]
+
+    food_log.add_entries("alice", [make_food(calories=50, date="2024-01-06")])
+    assert daily_calories(analytics.rollup("alice", "2024-01-01", "2024-01-31")) == [
+        ("2024-01-05", 100), ("2024-01-06", 50)
+    ]
+
+
+def test_rollup_sees_writes_from_another_process(tmp_path):
+    db_path = str(tmp_path / "food_log.db")
+    # Two stores on one database stand in for two server workers
+    worker_a, worker_b = FoodLogService(db_path=db_path), FoodLogService(db_path=db_path)
+    analytics = AnalyticsService(worker_a)
+    try:
+        worker_a.add_entries("alice", [make_food(calories=100, date="2024-01-05")])
+        assert analytics.rollup("alice", "2024-01-01", "2024-01-31")["entry_count"] == 1
+
+        worker_b.add_entries("alice", [make_food(calories=50, date="2024-01-06")])
+        stats = analytics.rollup("alice", "2024-01-01", "2024-01-31")
+        assert stats["entry_count"] == 2
+        assert daily_calories(stats) == [("2024-01-05", 100), ("2024-01-06", 50)]
+    finally:
+        worker_a.close()
+        worker_b.close()
+
+
+def test_weekly_rollup_buckets_start_on_monday(food_log):
+    analytics = AnalyticsService(food_log)
+    # 2024-01-07 is a Sunday, 2024-01-08 a Monday
+    food_log.add_entries("alice", [make_food(calories=10, date="2024-01-07"),
+                                   make_food(calories=20, date="2024-01-08"),
+                                   make_food(calories=30, date="2024-01-14")])
+    stats = analytics.rollup("alice", "2024-01-01", "2024-01-31", period="week")
+    assert daily_calories(stats) == [("2024-01-01", 10), ("2024-01-08", 50)]
+
+
+def test_rollup_rejects_ranges_over_the_limit(food_log):
+    analytics = AnalyticsService(food_log)
+    analytics.max_range_days = 31
+    assert analytics.rollup("alice", "2024-01-01", "2024-01-31")["entry_count"] == 0
+    with pytest.raises(ValueError, match="longer than 31 days"):
+        analytics.rollup("alice", "0001-01-01", "2024-01-31")
@@ -0,0 +1,76 @@
+import asyncio
+import pytest
+from backend.services import chat_router as chat_router_module
+from backend.services.chat_router import ChatRouter
+from backend.services.gemini_service import ChatReply
+from backend.services.nutrition_cache import NutritionCache
+
+SPINACH = {"fdc_id": "168462", "description": "Spinach, raw", "calories": 23, "protein": 2.9, "carbs": 3.6,
+           "fat": 0.4, "fiber": 2.2, "sugars": 0.4, "sodium": 79, "source": "USDA"}
+
+
+@pytest.fixture
+def router(monkeypatch):
+    cache = NutritionCache(db_path="")
+    cache.put(SPINACH, name="spinach")
+    monkeypatch.setattr(chat_router_module, "nutrition_cache", cache)
+    monkeypatch.setattr(chat_router_module.settings, "CHAT_LOCAL_ANSWERS", True)
+    return ChatRouter()
+
+
+@pytest.mark.parametrize("message, food, grams, nutrient", [
+    ("How much protein in spinach?", "spinach", 100, "protein"),
+    ("calories in 200g spinach", "spinach", 200, "calories"),
+    ("what's the sodium in 8 oz spinach", "spinach", 226.8, "sodium"),
+    ("Spinach nutrition facts", "spinach", 100, None),
+    ("how many carbs are in bananas", "banana", 100, "carbs"),
+])
+def test_single_food_questions_are_matched(router, message, food, grams, nutrient):
+    query, reason = router.match(message)
+    assert reason == "matched"
+    assert query["food"] == food
+    assert query["grams"] == pytest.approx(grams)
+    assert query["nutrient"] == nutrient
+
+
+@pytest.mark.parametrize("message, reason", [
+    ("is spinach healthy?", "open_ended"),
+    ("spinach vs kale protein", "open_ended"),
+    ("how much protein is in it", "open_ended"),
+    ("how many calories in a banana", "portion"),
+    ("protein in two cups of spinach", "portion"),
+    ("tell me about spinach", "no_nutrition_intent"),
+    ("how much fat in fried spinach", "unrecognized_words"),
+    ("calories in spinach and banana", "multiple_foods"),
+    ("how much protein in quinoaberry", "no_food"),
+    ("protein " * 40, "long_message"),
+])
+def test_other_questions_are_forwarded(router, message, reason):
+    assert router.match(message) == (None, reason)
+
+
+def test_local_answer_matches_the_assistant_format(router, monkeypatch):
+    async def fail(*args, **kwargs):
+        raise AssertionError("should be answered locally")
+
+    monkeypatch.setattr(chat_router_module.gemini_service, "chat", fail)
+    reply = asyncio.run(router.chat("how much protein in 200g spinach"))
+    assert reply.response.startswith("200g of spinach has about 5.8g of protein.")
+    assert "NUTRITION_DATA" not in reply.response
+    assert reply.nutrition_data.name == "Spinach"
+    assert reply.nutrition_data.calories == 46
+    assert router.status()["local"] == 1
+
+
+def test_unanswerable_questions_go_to_gemini(router, monkeypatch):
+    forwarded = []
+
+    async def chat(message, history=None):
+        forwarded.append(message)
+        return ChatReply(response="From Gemini")
+
+    monkeypatch.setattr(chat_router_module.gemini_service, "chat", chat)
+    reply = asyncio.run(router.chat("is spinach healthy?"))
+    assert reply.response == "From Gemini"
+    assert forwarded == ["is spinach healthy?"]
+    assert router.status()["counters"]["forwarded_open_ended"] == 1
@@ -0,0 +1,26 @@
+import io
+import json
+import pytest
+from backend.services.fdc_import import iter_foods
+
+FOODS = [
+    {"fdcId": 1, "description": "Apple, \"raw\" [skin]", "foodNutrients": [{"nutrient": {"number": "208"}, "amount": 52}]},
+    {"fdcId": 2, "description": "Pear {ripe}", "foodNutrients": []},
+]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 1 << 20])
+def test_foods_are_streamed_across_chunk_boundaries(chunk_size):
+    text = json.dumps({"SRLegacyFoods": FOODS}, indent=2)
+    assert list(iter_foods(io.StringIO(text), chunk_size)) == FOODS
+
+
+def test_empty_and_unknown_lists_yield_nothing():
+    assert list(iter_foods(io.StringIO('{"BrandedFoods": []}'))) == []
+    assert list(iter_foods(io.StringIO('{"Other": [{"fdcId": 1}]}'))) == []
+
+
+def test_truncated_download_is_an_error():
+    text = json.dumps({"BrandedFoods": FOODS})[:-20]
+    with pytest.raises(ValueError):
+        list(iter_foods(io.StringIO(text), 16))
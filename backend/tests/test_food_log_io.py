@@ -0,0 +1,118 @@
+import asyncio
+import json
+import pytest
+from backend.services import food_log_io
+from backend.services.food_log_io import FoodLogImporter
+
+SPINACH = {"calories": 23, "protein": 2.9, "carbs": 3.6, "fat": 0.4}
+
+
+@pytest.fixture(autouse=True)
+def store(food_log, monkeypatch):
+    """Import into a throwaway store and resolve names from a fixed table"""
+    async def resolve_names(names):
+        return {name: SPINACH for name in names if name.lower() == "spinach"}
+
+    monkeypatch.setattr(food_log_io, "food_log_service", food_log)
+    monkeypatch.setattr(food_log_io.usda_service, "resolve_names", resolve_names)
+    return food_log
+
+
+def run_import(fmt, body, chunk_size=7):
+    async def chunks():
+        data = body if isinstance(body, bytes) else body.encode()
+        for start in range(0, len(data), chunk_size):
+            yield data[start:start + chunk_size]
+
+    return asyncio.run(FoodLogImporter("alice", fmt).run(chunks()))
+
+
+def ndjson(*rows):
+    return "".join((row if isinstance(row, str) else json.dumps(row)) + "\n" for row in rows)
+
+
+def test_ndjson_rows_are_imported_and_names_resolved(store):
+    summary = run_import("ndjson", ndjson(
+        {"name": "Apple", "calories": 52, "protein": 0.3, "carbs": 14, "fat": 0.2, "date": "2024-01-05"},
+        {"name": "spinach", "quantity": 200, "date": "2024-01-05"}
+    ))
+    assert summary["imported"] == 2 and summary["rejected"] == 0
+    assert store.get_totals("alice")["calories"] == 98
+
+
+def test_ndjson_error_rows_are_reported_by_line(store):
+    summary = run_import("ndjson", ndjson(
+        "{not json",
+        "[1, 2]",
+        {"name": ["Apple"], "calories": 52, "protein": 0.3, "carbs": 14, "fat": 0.2},
+        {"name": {"en": "Apple"}},
+        {"name": "Apple", "calories": -5, "protein": 0.3, "carbs": 14, "fat": 0.2},
+        {"name": "Apple", "calories": 52, "protein": 0.3, "carbs": 14, "fat": 0.2, "date": "2024-13-01"},
+        {"name": "Dragonfruit", "quantity": 100},
+        {"name": "Apple", "calories": 52, "protein": 0.3, "carbs": 14, "fat": 0.2, "nutrients_per_100g": [1, 2]},
+        {"name": "Apple", "calories": 52, "protein": 0.3, "carbs": 14, "fat": 0.2, "date": "2024-01-05"}
+    ))
+    assert summary["imported"] == 1
+    assert summary["rejected"] == 8
+    errors = {error["line"]: error["error"] for error in summary["errors"]}
+    assert sorted(errors) == [1, 2, 3, 4, 5, 6, 7, 8]
+    assert errors[1].startswith("Invalid JSON")
+    assert errors[2] == "Expected a JSON object"
+    assert errors[3] == errors[4] == "Expected 'name' to be a string"
+    assert errors[7] == "Unknown food 'Dragonfruit'"
+    assert store.get_totals("alice")["entry_count"] == 1
+
+
+def test_csv_quoted_fields_may_span_lines(store):
+    body = (
+        "name,quantity,calories,protein,carbs,fat,date\r\n"
+        '"Apple, sliced\r\nwith ""skin""",150,78,0.5,21,0.3,2024-01-05\r\n'
+        "spinach,100,,,,,2024-01-06\r\n"
+    )
+    summary = run_import("csv", body, chunk_size=5)
+    assert summary == {"user_id": "alice", "imported": 2, "rejected": 0, "errors": []}
+    entries = store.get_entries("alice")
+    assert entries[0]["name"] == 'Apple, sliced\r\nwith "skin"'
+    assert entries[1]["calories"] == 23
+
+
+def test_csv_error_rows_report_their_first_line(store):
+    body = (
+        "name,calories,protein,carbs,fat\n"
+        "Apple,-1,0.3,14,0.2\n"
+        '"Pear\nhalves",57,0.4,15,0.1\n'
+        "Kiwi,abc,1,15,0.5\n"
+        '"Plum,46,0.7,11,0.3\n'
+        "Fig,74,0.8,19,0.3\n"
+    )
+    summary = run_import("csv", body)
+    assert summary["imported"] == 1
+    errors = {error["line"]: error["error"] for error in summary["errors"]}
+    assert sorted(errors) == [2, 5, 6]
+    assert errors[6] == "Unterminated quoted field"
+
+
+def test_csv_requires_name_column(store):
+    summary = run_import("csv", "calories,protein\n52,0.3\n")
+    assert summary["errors"][0] == {"line": 1, "error": "CSV header must include a 'name' column"}
+    assert summary["imported"] == 0
+
+
+def test_rows_with_macros_keep_them_when_a_namesake_is_resolved(store):
+    summary = run_import("ndjson", ndjson(
+        {"name": "spinach", "calories": 1, "protein": 1, "carbs": 1, "fat": 1, "quantity": 50},
+        {"name": "spinach", "quantity": 100},
+        {"name": "Kale", "calories": 49, "protein": 4.3, "carbs": 8.8, "fat": 0.9},
+        {"name": "Kale"}
+    ))
+    assert summary["imported"] == 3
+    assert summary["errors"] == [{"line": 4, "error": "Unknown food 'Kale'"}]
+    assert store.get_totals("alice")["calories"] == 1 + 23 + 49
+
+
+def test_invalid_utf8_and_overlong_lines_are_rejected(store):
+    body = (ndjson({"name": "spinach"}).encode() + b'{"name": "\xff"}\n'
+            + b"x" * (food_log_io.MAX_LINE_BYTES + 10) + b"\n" + ndjson({"name": "spinach"}).encode())
+    summary = run_import("ndjson", body, chunk_size=4096)
+    assert summary["imported"] == 2
+    assert summary["errors"] == [{"line": 2, "error": "Invalid UTF-8"}, {"line": 3, "error": "Line too long"}]
@@ -0,0 +1,85 @@
+import pytest
+from backend.services.food_log_service import validate_food, parse_date
+from .conftest import make_food
+
+
+def test_validate_food_rejects_blank_and_non_string_names():
+    assert validate_food(make_food())
+    assert not validate_food(make_food(name=""))
+    assert not validate_food(make_food(name="   \t"))
+    assert not validate_food(make_food(name=["Apple"]))
+    assert not validate_food(make_food(calories=-1))
+    assert not validate_food(make_food(quantity=0))
+
+
+def test_backdated_entries_shift_later_cumulative_totals(food_log):
+    food_log.add_entries("alice", [make_food(calories=100, date="2024-01-05"),
+                                   make_food(calories=200, date="2024-01-10")])
+    # Backdated after later days already exist
+    food_log.add_entries("alice", [make_food(calories=50, date="2024-01-07"),
+                                   make_food(calories=25, date="2024-01-01")])
+
+    assert food_log.get_totals("alice")["calories"] == 375
+    assert food_log.get_totals("alice")["entry_count"] == 4
+    assert food_log.get_totals("alice", "2024-01-01", "2024-01-01")["calories"] == 25
+    assert food_log.get_totals("alice", "2024-01-02", "2024-01-09")["calories"] == 150
+    assert food_log.get_totals("alice", "2024-01-06", None)["calories"] == 250
+    assert food_log.get_totals("alice", None, "2024-01-07")["calories"] == 175
+    assert food_log.get_totals("alice", "2024-01-11", "2024-02-01")["entry_count"] == 0
+
+    days = food_log.get_daily_totals("alice", "2024-01-01", "2024-01-31")
+    assert [(day["entry_date"], day["calories"]) for day in days] == [
+        ("2024-01-01", 25), ("2024-01-05", 100), ("2024-01-07", 50), ("2024-01-10", 200)
+    ]
+
+
+def test_totals_match_entries_for_every_range(food_log):
+    dates = ["2024-03-%02d" % day for day in (9, 2, 5, 2, 8, 1, 5)]
+    for i, entry_date in enumerate(dates):
+        food_log.add_entries("bob", [make_food(calories=10 * (i + 1), date=entry_date)])
+
+    for start in range(1, 11):
+        for end in range(start, 11):
+            start_date, end_date = "2024-03-%02d" % start, "2024-03-%02d" % end
+            expected = sum(10 * (i + 1) for i, d in enumerate(dates) if start_date <= d <= end_date)
+            assert food_log.get_totals("bob", start_date, end_date)["calories"] == expected
+
+
+def test_users_are_isolated(food_log):
+    food_log.add_entries("alice", [make_food(calories=100, date="2024-01-05")])
+    food_log.add_entries("bob", [make_food(calories=40, date="2024-01-05")])
+    assert food_log.get_totals("alice", "2024-01-01", "2024-01-31")["calories"] == 100
+    assert food_log.get_totals("bob")["calories"] == 40
+
+
+def test_invalid_entry_rejects_whole_request(food_log):
+    with pytest.raises(ValueError):
+        food_log.add_entries("alice", [make_food(), make_food(name="  ")])
+    assert food_log.get_totals("alice")["entry_count"] == 0
+
+
+@pytest.mark.parametrize("value", [
+    "2024-1-6", "garbage", "2024-02-30", "", "2024-01-06T10:00",
+    # Accepted by date.fromisoformat on Python 3.11+ only, or not at all
+    "2024-W01-6", "2024-0106", "２０２４０１０６"
+])
+def test_parse_date_rejects_non_iso_dates(value):
+    with pytest.raises(ValueError, match="start_date"):
+        parse_date(value, "start_date")
+
+
+def test_parse_date_normalizes():
+    assert parse_date(None) is None
+    assert parse_date("2024-01-06") == "2024-01-06"
+    assert parse_date("20240106") == "2024-01-06"
+
+
+@pytest.mark.parametrize("start_date, end_date", [("2024-1-6", None), (None, "garbage")])
+def test_queries_reject_invalid_dates(food_log, start_date, end_date):
+    food_log.add_entries("alice", [make_food(date="2024-01-06")])
+    with pytest.raises(ValueError):
+        food_log.get_totals("alice", start_date, end_date)
+    with pytest.raises(ValueError):
+        food_log.get_entries("alice", start_date, end_date)
+    with pytest.raises(ValueError):
+        food_log.get_daily_totals("alice", start_date or "2024-01-01", end_date or "2024-01-31")
@@ -0,0 +1,73 @@
+import asyncio
+import json
+import pytest
+from backend.services.gemini_service import GeminiService, extract_partial_reply
+
+BANANA = {"name": "Banana", "calories": 105, "protein": 1.3, "carbs": 27, "fat": 0.4}
+
+
+def test_structured_reply_is_parsed():
+    reply = GeminiService.parse_reply(json.dumps({"reply": "A banana has 105 kcal.", "nutrition": BANANA}), True)
+    assert reply.response == "A banana has 105 kcal."
+    assert reply.nutrition_data.calories == 105
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('{"reply": "A medium banana has about 105 kcal and', "A medium banana has about 105 kcal and"),
+    ('{"reply": "Line one\\nLine \\"two\\" \\u00e9t\\u00', 'Line one\nLine "two" ét'),
+    ('{"reply": "Ends on a backslash \\', "Ends on a backslash "),
+    ('{"reply": "Complete", "nutrition": {"name": "Ban', "Complete"),
+])
+def test_truncated_structured_reply_shows_the_partial_text(text, expected):
+    assert extract_partial_reply(text) == expected
+    reply = GeminiService.parse_reply(text, True)
+    assert reply.response == expected.strip()
+    assert reply.nutrition_data is None
+
+
+def test_structured_reply_without_reply_field_is_not_shown_raw():
+    reply = GeminiService.parse_reply('{"nutrition": {"name": "Ban', True)
+    assert "{" not in reply.response
+
+
+def test_plain_text_in_structured_mode_uses_the_tag():
+    text = 'About 105 kcal.\n<!--NUTRITION_DATA:' + json.dumps(BANANA) + '-->'
+    reply = GeminiService.parse_reply(text, True)
+    assert reply.response == "About 105 kcal."
+    assert reply.nutrition_data.name == "Banana"
+
+
+def make_service(responses):
+    service = GeminiService()
+    service.api_key = "test"
+    service.structured_output = True
+    calls = []
+
+    async def generate(message, history, structured):
+        calls.append(structured)
+        return responses.pop(0)
+
+    service._generate = generate
+    return service, calls
+
+
+def ok(text):
+    return 200, {"candidates": [{"content": {"parts": [{"text": text}]}}]}
+
+
+def test_schema_rejection_falls_back_to_tags():
+    error = '{"error": {"code": 400, "message": "Invalid JSON payload received. Unknown name \\"responseSchema\\""}}'
+    service, calls = make_service([(400, {"error": error}), ok("Hello!")])
+    reply = asyncio.run(service.chat("hi"))
+    assert reply.response == "Hello!"
+    assert calls == [True, False]
+    assert service.structured_output is False
+
+
+def test_other_bad_requests_keep_structured_output():
+    error = '{"error": {"code": 400, "message": "Request contains an invalid argument."}}'
+    service, calls = make_service([(400, {"error": error})])
+    reply = asyncio.run(service.chat("hi"))
+    assert "trouble" in reply.response
+    assert calls == [True]
+    assert service.structured_output is True
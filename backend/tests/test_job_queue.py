@@ -0,0 +1,97 @@
+import os
+import subprocess
+import sys
+import asyncio
+from backend.services.job_queue import JobScheduler
+
+
+def make_scheduler(persist_path=""):
+    scheduler = JobScheduler(concurrency=2, persist_path=persist_path)
+    scheduler.ran = []
+
+    async def record(value):
+        scheduler.ran.append(value)
+
+    scheduler.register("record", record)
+    return scheduler
+
+
+def test_jobs_are_deduplicated_and_run_once():
+    async def main():
+        scheduler = make_scheduler()
+        await scheduler.start()
+        assert scheduler.submit("record", key="a", value=1)
+        assert not scheduler.submit("record", key="a", value=2)
+        await scheduler._queue.join()
+        await scheduler.stop()
+        return scheduler
+
+    scheduler = asyncio.run(main())
+    assert scheduler.ran == [1]
+    assert scheduler.stats["deduplicated"] == 1
+
+
+def test_delayed_jobs_drop_their_timer_when_they_fire():
+    async def main():
+        scheduler = make_scheduler()
+        await scheduler.start()
+        for i in range(5):
+            scheduler.submit("record", key=f"job-{i}", delay_s=0.01, value=i)
+        assert len(scheduler._timers) == 5
+        await asyncio.sleep(0.05)
+        await scheduler._queue.join()
+        await scheduler.stop()
+        return scheduler
+
+    scheduler = asyncio.run(main())
+    assert sorted(scheduler.ran) == [0, 1, 2, 3, 4]
+    assert scheduler._timers == {}
+
+
+def test_pending_jobs_survive_a_restart(tmp_path):
+    db_path = str(tmp_path / "jobs.db")
+
+    async def first_run():
+        scheduler = make_scheduler(db_path)
+        await scheduler.start()
+        scheduler.submit("record", key="done", value="done")
+        scheduler.submit("record", key="later", delay_s=60, value="later")
+        await scheduler._queue.join()
+        await scheduler.stop()
+        return scheduler
+
+    async def second_run():
+        scheduler = make_scheduler(db_path)
+        await scheduler.start()
+        pending = dict(scheduler._jobs)
+        await scheduler.stop()
+        return pending
+
+    assert asyncio.run(first_run()).ran == ["done"]
+    assert asyncio.run(second_run()) == {"later": ("record", {"value": "later"})}
+
+
+def test_workers_sharing_a_file_only_restore_jobs_of_exited_processes(tmp_path):
+    db_path = str(tmp_path / "jobs.db")
+
+    async def queue_as(owner):
+        scheduler = make_scheduler(db_path)
+        scheduler.owner = owner
+        await scheduler.start()
+        scheduler.submit("record", key="later", delay_s=60, value=owner)
+        await scheduler.stop()
+
+    async def restore():
+        scheduler = make_scheduler(db_path)
+        await scheduler.start()
+        pending = dict(scheduler._jobs)
+        await scheduler.stop()
+        return pending
+
+    asyncio.run(queue_as(os.getppid()))  # a live sibling worker
+    assert asyncio.run(restore()) == {}
+
+    exited = subprocess.Popen([sys.executable, "-c", "pass"])
+    exited.wait()
+    asyncio.run(queue_as(exited.pid))
+    assert asyncio.run(restore()) == {"later": ("record", {"value": exited.pid})}
@@ -0,0 +1,78 @@
+import asyncio
+import pytest
+from backend.models import model_manager as model_manager_module
+from backend.models.model_manager import ModelManager
+
+
+class FakeCNNModel:
+    """Stands in for CNNModel; paths containing 'broken' fail to load like a missing file"""
+
+    def __init__(self, model_path=None, latency_budget_ms=None):
+        self.model_path = model_path or "trained_models/live.h5"
+        self.model = None if "broken" in self.model_path else object()
+        self.model_info = None
+        self.img_size = (8, 8)
+
+    def predict(self, image):
+        return "apple", 0.9
+
+
+@pytest.fixture
+def manager(monkeypatch):
+    monkeypatch.setattr(model_manager_module, "CNNModel", FakeCNNModel)
+    return ModelManager()
+
+
+def test_failed_reload_keeps_the_live_version(manager):
+    live = manager.current
+
+    async def reload():
+        with pytest.raises(RuntimeError, match="broken.h5"):
+            await manager.reload("trained_models/broken.h5")
+
+    asyncio.run(reload())
+    assert manager.current is live
+    assert not live.retired
+    assert manager.retiring == {}
+
+
+def test_failed_candidate_is_not_shadowed(manager):
+    async def set_candidate():
+        with pytest.raises(RuntimeError):
+            await manager.set_candidate("trained_models/broken.h5", 0.5)
+
+    asyncio.run(set_candidate())
+    assert manager.candidate is None
+    assert manager.shadow_sample_rate != 0.5
+
+
+def test_reload_swaps_and_retires_the_old_version(manager):
+    live = manager.current
+
+    async def reload():
+        info = await manager.reload("trained_models/next.h5")
+        await asyncio.sleep(0)
+        return info
+
+    info = asyncio.run(reload())
+    assert info["path"] == "trained_models/next.h5"
+    assert manager.current is not live
+    assert live.retired and live.drained.is_set()
+
+
+def test_watcher_reloads_an_explicit_version_from_its_own_path(manager, monkeypatch):
+    monkeypatch.setattr(model_manager_module.settings, "MODEL_WATCH_INTERVAL_S", 0.01)
+    monkeypatch.setattr(manager, "_mtime", lambda path: 1.0)  # every file looks changed
+
+    async def run():
+        await manager.reload("trained_models/operator.h5")
+        loaded = manager.current
+        manager.start()
+        await asyncio.sleep(0.05)
+        await manager.stop()
+        return loaded
+
+    loaded = asyncio.run(run())
+    assert manager.current is not loaded  # reloaded by the watcher
+    assert manager.current.path == "trained_models/operator.h5"
+    assert manager.current.explicit
@@ -0,0 +1,42 @@
+import pytest
+from backend.models.model_registry import ModelRegistry
+
+
+@pytest.fixture
+def registry(tmp_path):
+    registry = ModelRegistry(str(tmp_path / "registry.json"))
+    for name, accuracy, latency_ms in [("small", 0.80, 5), ("medium", 0.88, 20), ("large", 0.93, 80)]:
+        path = tmp_path / f"{name}.h5"
+        path.write_bytes(b"weights")
+        registry.record({"name": name, "path": str(path), "accuracy": accuracy, "latency_ms": latency_ms})
+    return registry
+
+
+def test_most_accurate_model_within_budget_is_selected(registry):
+    assert registry.select(100)["name"] == "large"
+    assert registry.select(50)["name"] == "medium"
+    assert registry.select(5)["name"] == "small"
+
+
+def test_fastest_model_is_the_fallback_when_none_fits(registry):
+    assert registry.select(1)["name"] == "small"
+
+
+def test_missing_empty_or_unloadable_registry_selects_nothing(tmp_path):
+    assert ModelRegistry(str(tmp_path / "missing.json")).select(100) is None
+    (tmp_path / "empty.json").write_text('{"models": []}')
+    assert ModelRegistry(str(tmp_path / "empty.json")).select(100) is None
+    registry = ModelRegistry(str(tmp_path / "registry.json"))
+    registry.record({"name": "gone", "path": str(tmp_path / "deleted.h5"), "accuracy": 0.9, "latency_ms": 1})
+    assert registry.select(100) is None  # the model file does not exist
+
+
+def test_record_replaces_an_entry_by_name(registry, tmp_path):
+    stored = registry.record({"name": "medium", "path": str(tmp_path / "medium.h5"), "accuracy": 0.95,
+                              "latency_ms": 20})
+    assert stored["path"] == "medium.h5"  # relative to the registry file
+    models = registry.load()
+    assert [model["name"] for model in models].count("medium") == 1
+    assert len(models) == 3
+    assert registry.select(50)["accuracy"] == 0.95
+    assert registry.resolve_path(stored) == str(tmp_path / "medium.h5")
@@ -0,0 +1,45 @@
+import asyncio
+from backend.services.nutrition_cache import NutritionCache
+
+APPLE = {"fdc_id": "1750339", "name": "Apple", "calories": 52.0, "source": "USDA"}
+
+
+def test_database_is_shared_but_only_read_by_fetch(tmp_path):
+    path = str(tmp_path / "cache.db")
+    writer = NutritionCache(db_path=path)
+    writer.put(APPLE, name="Apple")
+    writer.close()
+
+    reader = NutritionCache(db_path=path)
+    assert reader.get_by_name("apple") is None  # memory only
+
+    async def main():
+        return (await reader.fetch_by_name(" APPLE "), await reader.fetch_by_fdc_id(1750339),
+                await reader.fetch_many(["apple", "pear"]))
+
+    by_name, by_id, many = asyncio.run(main())
+    assert by_name == APPLE and by_id == APPLE
+    assert many == {"apple": APPLE, "pear": None}
+    assert reader.get_by_name("apple") == APPLE  # promoted into memory
+    assert [entry["fdc_id"] for entry in reader.fdc_entries()] == ["1750339"]
+    assert reader.change_token()[0] == 1
+    reader.close()
+
+
+def test_memory_access_does_not_wait_for_the_database(tmp_path):
+    cache = NutritionCache(db_path=str(tmp_path / "cache.db"))
+    with cache._db_lock:
+        # A slow database write must not block puts or memory lookups
+        cache.put(APPLE, name="apple")
+        assert cache.get_by_fdc_id("1750339") == APPLE
+    cache.close()
+    assert NutritionCache(db_path=cache.db_path).change_token()[0] == 1
+
+
+def test_lru_eviction_without_database():
+    cache = NutritionCache(max_entries=1, db_path="")
+    cache.put(APPLE, name="apple")
+    cache.put(dict(APPLE, fdc_id="2"), name="pear")
+    assert cache.get_by_name("apple") is None
+    assert len(cache) == 1
+    assert cache.change_token() == (2,)
@@ -0,0 +1,20 @@
+import asyncio
+from backend.replay.driver import run_scenario
+
+
+async def plain_text_app(scope, receive, send):
+    """Answers every request with a 200 that is not JSON"""
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"not json"})
+
+
+def test_bad_responses_and_requests_are_counted_not_raised(tmp_path):
+    scenario = {"name": "chat", "requests": [
+        {"at": 0, "transcript": ["hi", "and again?"]},
+        {"at": 0, "method": "POST", "path": "/api/v1/classify", "file": "missing.jpg"},
+        {"at": 0, "method": "GET", "path": "/api/v1/search-foods"}
+    ]}
+    report = asyncio.run(run_scenario(plain_text_app, scenario, speedup=1, base_dir=str(tmp_path)))
+    assert report["statuses"] == {"200": 3}
+    assert report["failures"]["invalid chat response"] == 2
+    assert sum(report["failures"].values()) == 3
@@ -0,0 +1,43 @@
+import uvicorn
+from backend import serve
+
+
+def test_threads_are_split_between_workers(monkeypatch):
+    monkeypatch.setattr(serve, "cpu_count", lambda: 8)
+    monkeypatch.setattr(serve.settings, "SERVER_THREADS_PER_WORKER", 0)
+    monkeypatch.setenv("OMP_NUM_THREADS", "1")  # explicit settings are kept
+    monkeypatch.delenv("TF_NUM_INTRAOP_THREADS", raising=False)
+    monkeypatch.delenv("TF_NUM_INTEROP_THREADS", raising=False)
+    assert serve.export_thread_limits(4) == 2
+    assert serve.os.environ["TF_NUM_INTRAOP_THREADS"] == "2"
+    assert serve.os.environ["OMP_NUM_THREADS"] == "1"
+    assert serve.export_thread_limits(16) == 1
+
+
+def test_each_worker_draws_its_own_request_limit(monkeypatch):
+    monkeypatch.setattr(uvicorn.Server, "run", lambda self, sockets=None: None)
+    limits = set()
+    for _ in range(20):
+        server = serve.RecyclingServer(uvicorn.Config("backend.app:app", limit_max_requests=100), 50)
+        server.run()
+        limits.add(server.config.limit_max_requests)
+    assert all(100 <= limit <= 150 for limit in limits)
+    assert len(limits) > 1
+
+
+def test_several_workers_share_a_nutrition_cache_file(monkeypatch):
+    monkeypatch.setattr(serve.os, "environ", {})
+    monkeypatch.setattr(serve.settings, "NUTRITION_CACHE_DB_PATH", "")
+    serve.export_settings(1)
+    assert serve.os.environ["NUTRITION_CACHE_DB_PATH"] == ""
+    serve.export_settings(4)
+    assert serve.os.environ["NUTRITION_CACHE_DB_PATH"] == serve.SHARED_NUTRITION_CACHE_PATH
+    assert serve.os.environ["SERVER_WORKERS"] == "4"
+
+
+def test_shared_nutrition_cache_can_be_turned_off(monkeypatch):
+    monkeypatch.setattr(serve.os, "environ", {})
+    monkeypatch.setattr(serve.settings, "NUTRITION_CACHE_DB_PATH", "")
+    monkeypatch.setattr(serve.settings, "NUTRITION_CACHE_SHARED_DEFAULT", False)
+    serve.export_settings(4)
+    assert serve.os.environ["NUTRITION_CACHE_DB_PATH"] == ""
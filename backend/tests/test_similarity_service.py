@@ -0,0 +1,43 @@
+from backend.services.nutrition_cache import NutritionCache
+from backend.services.similarity_service import SimilarityService
+
+
+def food(fdc_id, **nutrients):
+    return dict({"calories": 0, "protein": 0, "carbs": 0, "fat": 0, "fiber": 0, "sugars": 0, "sodium": 0},
+                fdc_id=str(fdc_id), description=f"food {fdc_id}", source="USDA", **nutrients)
+
+
+def make_service(interval_s=3600):
+    cache = NutritionCache(db_path="")
+    cache.put_many([food(1, calories=50, carbs=12, sugars=10), food(2, calories=52, carbs=13, sugars=9),
+                    food(3, calories=160, protein=30, fat=4)])
+    service = SimilarityService(cache)
+    service.rebuild_interval_s = interval_s
+    return service
+
+
+def test_nearest_foods_respect_constraints():
+    service = make_service()
+    result = service.similar("1", limit=1)
+    assert [food["id"] for food in result["results"]] == ["2"]
+    assert [food["id"] for food in service.similar("1", constraints={"sugars": (None, 5)})["results"]] == ["3"]
+    assert service.similar("404") is None
+
+
+def test_added_foods_are_searchable_without_a_rebuild():
+    service = make_service()
+    built = service.get_index()
+    service.add([food(4, calories=51, carbs=12, sugars=10), food(1)])
+    index = service.get_index()
+    assert index.token == built.token and len(index) == 4
+    assert service.similar("4", limit=1)["results"][0]["id"] in ("1", "2")
+    assert service._refresh_thread is None
+
+
+def test_changed_store_is_rebuilt_in_the_background():
+    service = make_service(interval_s=0)
+    first = service.get_index()
+    service.cache.put(food(5, protein=20))
+    assert service.get_index() is first  # still served while the rebuild runs
+    service._refresh_thread.join()
+    assert "5" in service.get_index().positions
@@ -1,8 +1,17 @@
 import os
+import json
+import sys
+import time
+import argparse
 import tensorflow as tf
 import matplotlib.pyplot as plt
 import numpy as np
 
+from pipeline import load_metadata, load_tfrecord_dataset
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from backend.models.model_registry import ModelRegistry
+
 # ----------------------
 # Configuration Settings
 # ----------------------
@@ -10,174 +19,467 @@ import numpy as np
 # Base directory where dataset folders are located.
 BASE_DIR = "archive"  # Update this to your dataset's folder if needed
 
-# Define paths for train, validation, and test directories.
-TRAIN_DIR = os.path.join(BASE_DIR, "train")
-VALIDATION_DIR = os.path.join(BASE_DIR, "validation")
-TEST_DIR = os.path.join(BASE_DIR, "test")  # Optional: used for final evaluation
+# TFRecord shards produced by `python pipeline.py prepare` (used when present)
+PREPARED_DIR = "prepared"
 
 # Hyperparameters for image processing and training
 IMG_WIDTH, IMG_HEIGHT = 150, 150  # Adjust image dimensions if necessary
-BATCH_SIZE = 32
+BATCH_SIZE = 32  # Per replica
 EPOCHS = 25
 
 # Seed for reproducibility
 SEED = 42
 
-# --------------------------
-# Data Preparation & Augmentation
-# --------------------------
+# Where the trained model and the resumable training state are written
+OUTPUT_PATH = "../../trained_models/fruit_vegetable_classifier.h5"
+CHECKPOINT_DIR = "checkpoints"
+REGISTRY_PATH = "../../trained_models/registry.json"
+
+# Pretrained backbones: constructor and the rescaling from [0, 1] inputs to what
+# the backbone expects ([-1, 1] for MobileNetV2, [0, 255] for the others, which
+# normalize internally)
+BACKBONES = {
+    "mobilenet_v2": (tf.keras.applications.MobileNetV2, {}, (2.0, -1.0)),
+    "mobilenet_v3_small": (tf.keras.applications.MobileNetV3Small, {"include_preprocessing": True}, (255.0, 0.0)),
+    "efficientnet_b0": (tf.keras.applications.EfficientNetB0, {}, (255.0, 0.0)),
+}
+
+# CPU flags that indicate native bfloat16 support
+BF16_CPU_FLAGS = ("avx512_bf16", "amx_bf16")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Train the fruit and vegetable classifier.")
+    parser.add_argument("--base-dir", default=BASE_DIR, help="Dataset with train/validation/test folders")
+    parser.add_argument("--prepared-dir", default=PREPARED_DIR, help="TFRecord shards from pipeline.py prepare")
+    parser.add_argument("--img-size", type=int, nargs=2, default=[IMG_HEIGHT, IMG_WIDTH], metavar=("HEIGHT", "WIDTH"))
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="Batch size per replica")
+    parser.add_argument("--epochs", type=int, default=EPOCHS)
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--output", default=OUTPUT_PATH, help="Where to save the trained model")
+    parser.add_argument("--precision", choices=("auto", "float32", "bfloat16"), default="auto",
+                        help="auto uses mixed bfloat16 when the CPU supports it natively")
+    parser.add_argument("--strategy", choices=("auto", "default", "mirrored", "multi-worker"), default="auto",
+                        help="auto uses multi-worker when TF_CONFIG is set")
+    parser.add_argument("--intra-op-threads", type=int, default=None,
+                        help="Threads per op (default: number of CPU cores)")
+    parser.add_argument("--inter-op-threads", type=int, default=2,
+                        help="Ops run in parallel (default: 2)")
+    parser.add_argument("--checkpoint-dir", default=CHECKPOINT_DIR,
+                        help="Training state for resuming interrupted runs")
+    parser.add_argument("--baseline-images-per-sec", type=float, default=None,
+                        help="Single-worker throughput used to report scaling efficiency")
+    parser.add_argument("--no-plot", action="store_true", help="Skip the training history plots")
+    parser.add_argument("--architecture", choices=("cnn",) + tuple(BACKBONES), default="cnn",
+                        help="Custom CNN or a pretrained backbone to fine-tune")
+    parser.add_argument("--backbone-weights", default=None,
+                        help="Locally cached no-top ImageNet weights (.h5) for the backbone")
+    parser.add_argument("--trainable-layers", type=int, default=20,
+                        help="Number of top backbone layers to fine-tune (the rest stay frozen)")
+    parser.add_argument("--learning-rate", type=float, default=None,
+                        help="Adam learning rate (default: 1e-3 for cnn, 1e-4 for backbones)")
+    parser.add_argument("--registry", default=REGISTRY_PATH, help="Model registry to record the trained model in")
+    parser.add_argument("--name", default=None, help="Registry name (default: output file name)")
+    return parser.parse_args()
 
-# Create the training dataset with augmentation
-train_ds = tf.keras.utils.image_dataset_from_directory(
-    TRAIN_DIR,
-    validation_split=0.2,
-    subset="training",
-    seed=SEED,
-    image_size=(IMG_HEIGHT, IMG_WIDTH),
-    batch_size=BATCH_SIZE
-)
-
-# Create the validation dataset
-val_ds = tf.keras.utils.image_dataset_from_directory(
-    VALIDATION_DIR,
-    seed=SEED,
-    image_size=(IMG_HEIGHT, IMG_WIDTH),
-    batch_size=BATCH_SIZE
-)
-
-# Create the test dataset (if exists)
-try:
-    test_ds = tf.keras.utils.image_dataset_from_directory(
-        TEST_DIR,
-        seed=SEED,
-        image_size=(IMG_HEIGHT, IMG_WIDTH),
-        batch_size=BATCH_SIZE,
-        shuffle=False
-    )
-    has_test_data = True
-except:
-    print("No test directory found, skipping test evaluation.")
-    has_test_data = False
-
-# Get number of classes
-class_names = train_ds.class_names
-num_classes = len(class_names)
-print("Number of classes:", num_classes)
-print("Class names:", class_names)
-
-# Normalize pixel values and apply data augmentation
-normalization_layer = tf.keras.layers.Rescaling(1./255)
-
-data_augmentation = tf.keras.Sequential([
-    tf.keras.layers.RandomFlip("horizontal"),
-    tf.keras.layers.RandomRotation(0.1),
-    tf.keras.layers.RandomZoom(0.1),
-])
-
-# Apply normalization and augmentation
-def prepare_ds(ds, shuffle=False, augment=False):
-    # Normalize pixel values
-    ds = ds.map(lambda x, y: (normalization_layer(x), y), num_parallel_calls=tf.data.AUTOTUNE)
-    
-    if shuffle:
-        ds = ds.shuffle(1000)
-    
-    # Apply data augmentation
-    if augment:
-        ds = ds.map(lambda x, y: (data_augmentation(x, training=True), y), num_parallel_calls=tf.data.AUTOTUNE)
-    
-    # Use buffered prefetching
-    return ds.prefetch(buffer_size=tf.data.AUTOTUNE)
-
-train_ds = prepare_ds(train_ds, shuffle=True, augment=True)
-val_ds = prepare_ds(val_ds)
-if has_test_data:
-    test_ds = prepare_ds(test_ds)
 
 # --------------------------
-# Build the CNN Model
+# Runtime Configuration
 # --------------------------
-model = tf.keras.Sequential([
-    # First convolutional block
-    tf.keras.layers.Conv2D(32, (3, 3), activation='relu', input_shape=(IMG_WIDTH, IMG_HEIGHT, 3)),
-    tf.keras.layers.MaxPooling2D(pool_size=(2, 2)),
 
-    # Second convolutional block
-    tf.keras.layers.Conv2D(64, (3, 3), activation='relu'),
-    tf.keras.layers.MaxPooling2D(pool_size=(2, 2)),
+def configure_threads(intra_op_threads, inter_op_threads):
+    """Set TensorFlow thread pools. Must run before any op executes."""
+    intra_op_threads = intra_op_threads or os.cpu_count() or 1
+    tf.config.threading.set_intra_op_parallelism_threads(intra_op_threads)
+    tf.config.threading.set_inter_op_parallelism_threads(inter_op_threads)
+    print(f"Threads: intra-op={intra_op_threads}, inter-op={inter_op_threads}")
 
-    # Third convolutional block
-    tf.keras.layers.Conv2D(128, (3, 3), activation='relu'),
-    tf.keras.layers.MaxPooling2D(pool_size=(2, 2)),
 
-    # Flattening layer to convert 3D feature maps to a 1D feature vector
-    tf.keras.layers.Flatten(),
+def cpu_supports_bfloat16():
+    """Check /proc/cpuinfo for native bfloat16 instructions."""
+    try:
+        with open("/proc/cpuinfo") as f:
+            flags = f.read()
+    except OSError:
+        return False
+    return any(flag in flags for flag in BF16_CPU_FLAGS)
 
-    # Dropout layer to reduce overfitting
-    tf.keras.layers.Dropout(0.5),
 
-    # Dense layer for further feature extraction
-    tf.keras.layers.Dense(512, activation='relu'),
+def configure_precision(precision):
+    """Enable the mixed bfloat16 policy when requested (or when available for auto)."""
+    if precision == "auto":
+        precision = "bfloat16" if cpu_supports_bfloat16() else "float32"
+    if precision == "bfloat16":
+        tf.keras.mixed_precision.set_global_policy("mixed_bfloat16")
+    print(f"Precision: {tf.keras.mixed_precision.global_policy().name}")
+    return precision
 
-    # Output layer with softmax activation for multi-class classification
-    tf.keras.layers.Dense(num_classes, activation='softmax')
-])
 
-# Display the model summary for quick inspection
-model.summary()
+def select_strategy(name):
+    """Pick a tf.distribute strategy."""
+    if name == "auto":
+        name = "multi-worker" if os.environ.get("TF_CONFIG") else "default"
+    if name == "multi-worker":
+        strategy = tf.distribute.MultiWorkerMirroredStrategy()
+    elif name == "mirrored":
+        strategy = tf.distribute.MirroredStrategy()
+    else:
+        strategy = tf.distribute.get_strategy()
+    print(f"Strategy: {type(strategy).__name__} with {strategy.num_replicas_in_sync} replica(s)")
+    return strategy
 
-# --------------------------
-# Compile the Model
-# --------------------------
-model.compile(
-    optimizer=tf.keras.optimizers.Adam(),
-    loss='sparse_categorical_crossentropy',
-    metrics=['accuracy']
-)
 
-# --------------------------
-# Train the Model
-# --------------------------
-history = model.fit(
-    train_ds,
-    validation_data=val_ds,
-    epochs=EPOCHS
-)
+def is_chief():
+    """Only the chief writes the final model in multi-worker training."""
+    tf_config = json.loads(os.environ.get("TF_CONFIG", "{}"))
+    task = tf_config.get("task")
+    if not task or task.get("type") == "chief":
+        return True
+    # Without an explicit chief, worker 0 acts as chief
+    return (task.get("type") == "worker" and task.get("index", 0) == 0
+            and "chief" not in tf_config.get("cluster", {}))
+
 
 # --------------------------
-# Save the Trained Model
+# Data Preparation & Augmentation
 # --------------------------
-# Create the trained_models directory if it doesn't exist
-os.makedirs("../../trained_models", exist_ok=True)
-model.save("../../trained_models/fruit_vegetable_classifier.h5")
-print("Model saved as trained_models/fruit_vegetable_classifier.h5")
+
+def load_datasets(args, global_batch_size):
+    """
+    Load train/validation/test datasets, preferring prepared TFRecord shards.
+
+    Also returns the number of training examples, so throughput counts the
+    partial last batch of an epoch at its real size.
+    """
+    img_height, img_width = args.img_size
+    test_ds = None
+
+    train_metadata = load_metadata(os.path.join(args.prepared_dir, "train"))
+    if train_metadata is not None:
+        train_examples = train_metadata["num_examples"]
+        # Fast path: read the TFRecord shards written by `python pipeline.py prepare`
+        train_ds, class_names = load_tfrecord_dataset(
+            os.path.join(args.prepared_dir, "train"), global_batch_size, shuffle=True, seed=args.seed,
+            image_size=args.img_size
+        )
+        val_ds, _ = load_tfrecord_dataset(
+            os.path.join(args.prepared_dir, "validation"), global_batch_size, image_size=args.img_size
+        )
+        if load_metadata(os.path.join(args.prepared_dir, "test")) is not None:
+            test_ds, _ = load_tfrecord_dataset(
+                os.path.join(args.prepared_dir, "test"), global_batch_size, image_size=args.img_size
+            )
+        else:
+            print("No test directory found, skipping test evaluation.")
+    else:
+        print(f"No prepared shards in {args.prepared_dir}, decoding images from {args.base_dir} "
+              f"(run `python pipeline.py prepare` once to speed up training).")
+
+        # Create the training dataset with augmentation
+        train_ds = tf.keras.utils.image_dataset_from_directory(
+            os.path.join(args.base_dir, "train"),
+            validation_split=0.2,
+            subset="training",
+            seed=args.seed,
+            image_size=(img_height, img_width),
+            batch_size=global_batch_size
+        )
+
+        # Create the validation dataset
+        val_ds = tf.keras.utils.image_dataset_from_directory(
+            os.path.join(args.base_dir, "validation"),
+            seed=args.seed,
+            image_size=(img_height, img_width),
+            batch_size=global_batch_size
+        )
+
+        # Create the test dataset (if exists)
+        try:
+            test_ds = tf.keras.utils.image_dataset_from_directory(
+                os.path.join(args.base_dir, "test"),
+                seed=args.seed,
+                image_size=(img_height, img_width),
+                batch_size=global_batch_size,
+                shuffle=False
+            )
+        except Exception:
+            print("No test directory found, skipping test evaluation.")
+
+        class_names = train_ds.class_names
+        train_examples = len(train_ds.file_paths)
+
+        # Normalize pixel values once and keep the decoded images in memory
+        normalization_layer = tf.keras.layers.Rescaling(1./255)
+
+        def normalize_and_cache(ds):
+            return ds.map(lambda x, y: (normalization_layer(x), y), num_parallel_calls=tf.data.AUTOTUNE).cache()
+
+        train_ds = normalize_and_cache(train_ds)
+        val_ds = normalize_and_cache(val_ds)
+        if test_ds is not None:
+            test_ds = normalize_and_cache(test_ds)
+
+    # Data augmentation (applied after the cache so every epoch sees new variations)
+    data_augmentation = tf.keras.Sequential([
+        tf.keras.layers.RandomFlip("horizontal", seed=args.seed),
+        tf.keras.layers.RandomRotation(0.1, seed=args.seed),
+        tf.keras.layers.RandomZoom(0.1, seed=args.seed),
+    ])
+
+    def prepare_ds(ds, augment=False):
+        # Apply data augmentation
+        if augment:
+            ds = ds.map(lambda x, y: (data_augmentation(x, training=True), y), num_parallel_calls=tf.data.AUTOTUNE)
+
+        # Use buffered prefetching
+        return ds.prefetch(buffer_size=tf.data.AUTOTUNE)
+
+    train_ds = prepare_ds(train_ds, augment=True)
+    val_ds = prepare_ds(val_ds)
+    if test_ds is not None:
+        test_ds = prepare_ds(test_ds)
+    return train_ds, val_ds, test_ds, class_names, train_examples
+
 
 # --------------------------
-# Optional: Evaluate on the Test Set
+# Build the CNN Model
 # --------------------------
-if has_test_data:
-    test_loss, test_accuracy = model.evaluate(test_ds)
-    print("Test Loss: {:.4f}, Test Accuracy: {:.4f}".format(test_loss, test_accuracy))
+
+def build_model(num_classes, img_height, img_width):
+    model = tf.keras.Sequential([
+        # First convolutional block
+        tf.keras.layers.Conv2D(32, (3, 3), activation='relu', input_shape=(img_height, img_width, 3)),
+        tf.keras.layers.MaxPooling2D(pool_size=(2, 2)),
+
+        # Second convolutional block
+        tf.keras.layers.Conv2D(64, (3, 3), activation='relu'),
+        tf.keras.layers.MaxPooling2D(pool_size=(2, 2)),
+
+        # Third convolutional block
+        tf.keras.layers.Conv2D(128, (3, 3), activation='relu'),
+        tf.keras.layers.MaxPooling2D(pool_size=(2, 2)),
+
+        # Flattening layer to convert 3D feature maps to a 1D feature vector
+        tf.keras.layers.Flatten(),
+
+        # Dropout layer to reduce overfitting
+        tf.keras.layers.Dropout(0.5),
+
+        # Dense layer for further feature extraction
+        tf.keras.layers.Dense(512, activation='relu'),
+
+        # Output layer with softmax activation for multi-class classification
+        # (kept in float32 so mixed precision does not affect the probabilities)
+        tf.keras.layers.Dense(num_classes, activation='softmax', dtype='float32')
+    ])
+    return model
+
+
+def build_backbone_model(architecture, num_classes, img_height, img_width, weights_path, trainable_layers):
+    """Pretrained backbone with global average pooling and a small classification head."""
+    if not weights_path or not os.path.exists(weights_path):
+        raise SystemExit(
+            f"--backbone-weights must point to locally cached no-top ImageNet weights for {architecture} "
+            f"(for example a file from ~/.keras/models)"
+        )
+    constructor, kwargs, (scale, offset) = BACKBONES[architecture]
+    backbone = constructor(
+        input_shape=(img_height, img_width, 3), include_top=False, weights=weights_path, **kwargs
+    )
+
+    # Fine-tune only the top layers, batch norm statistics stay frozen
+    for layer in backbone.layers[:-trainable_layers] if trainable_layers > 0 else backbone.layers:
+        layer.trainable = False
+    for layer in backbone.layers:
+        if isinstance(layer, tf.keras.layers.BatchNormalization):
+            layer.trainable = False
+
+    inputs = tf.keras.Input(shape=(img_height, img_width, 3))
+    x = tf.keras.layers.Rescaling(scale, offset=offset)(inputs)
+    x = backbone(x)
+    x = tf.keras.layers.GlobalAveragePooling2D()(x)
+    x = tf.keras.layers.Dropout(0.2)(x)
+    outputs = tf.keras.layers.Dense(num_classes, activation='softmax', dtype='float32')(x)
+    return tf.keras.Model(inputs, outputs, name=f"{architecture}_classifier")
+
+
+def measure_latency(model, img_height, img_width, runs=50, warmup=5):
+    """Median single-image inference latency in milliseconds."""
+    image = np.random.rand(1, img_height, img_width, 3).astype("float32")
+    for _ in range(warmup):
+        model(image, training=False)
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        model(image, training=False)
+        timings.append((time.perf_counter() - start) * 1000)
+    return float(np.median(timings))
+
 
 # --------------------------
-# Plot Training History
+# Epoch Timing
 # --------------------------
-# Plot accuracy history
-plt.figure(figsize=(8, 4))
-plt.plot(history.history['accuracy'], label='Train Accuracy')
-plt.plot(history.history['val_accuracy'], label='Validation Accuracy')
-plt.title('Model Accuracy')
-plt.xlabel('Epoch')
-plt.ylabel('Accuracy')
-plt.legend()
-plt.show()
-
-# Plot loss history
-plt.figure(figsize=(8, 4))
-plt.plot(history.history['loss'], label='Train Loss')
-plt.plot(history.history['val_loss'], label='Validation Loss')
-plt.title('Model Loss')
-plt.xlabel('Epoch')
-plt.ylabel('Loss')
-plt.legend()
-plt.show()
+
+class EpochTimer(tf.keras.callbacks.Callback):
+    """
+    Log wall time, throughput and scaling efficiency for every epoch.
+
+    Throughput covers the training steps only: the clock stops at the last
+    training batch, so the validation pass at the end of the epoch is reported
+    separately instead of diluting images/sec. With examples_per_epoch, the
+    partial last batch counts at its real size instead of a full batch.
+    """
+
+    def __init__(self, global_batch_size, num_workers, baseline_images_per_sec=None, examples_per_epoch=None):
+        super().__init__()
+        self.global_batch_size = global_batch_size
+        self.examples_per_epoch = examples_per_epoch
+        self.num_workers = num_workers
+        self.baseline_images_per_sec = baseline_images_per_sec
+        self.epoch_logs = []
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self._start = time.perf_counter()
+        self._train_end = self._start
+        self._steps = 0
+
+    def on_train_batch_end(self, batch, logs=None):
+        self._steps += 1
+        self._train_end = time.perf_counter()
+
+    def on_epoch_end(self, epoch, logs=None):
+        seconds = self._train_end - self._start
+        validation_seconds = time.perf_counter() - self._train_end
+        images = self._steps * self.global_batch_size
+        if self.examples_per_epoch:
+            # The last batch of an epoch is usually partial
+            images = min(images, self.examples_per_epoch)
+        images_per_sec = images / seconds if seconds > 0 else 0.0
+        entry = {"epoch": epoch + 1, "seconds": round(seconds, 2), "validation_seconds": round(validation_seconds, 2),
+                 "images_per_sec": round(images_per_sec, 1)}
+        message = (f"Epoch {epoch + 1}: {seconds:.1f}s training ({validation_seconds:.1f}s validation), "
+                   f"{images_per_sec:.1f} images/sec")
+        if self.baseline_images_per_sec:
+            # Fraction of perfect linear scaling over the single-worker baseline
+            efficiency = images_per_sec / (self.num_workers * self.baseline_images_per_sec)
+            entry["scaling_efficiency"] = round(efficiency, 3)
+            message += f", scaling efficiency {efficiency:.0%} over {self.num_workers} worker(s)"
+        self.epoch_logs.append(entry)
+        print(message)
+
+
+def plot_history(history):
+    # Plot accuracy history
+    plt.figure(figsize=(8, 4))
+    plt.plot(history.history['accuracy'], label='Train Accuracy')
+    plt.plot(history.history['val_accuracy'], label='Validation Accuracy')
+    plt.title('Model Accuracy')
+    plt.xlabel('Epoch')
+    plt.ylabel('Accuracy')
+    plt.legend()
+    plt.show()
+
+    # Plot loss history
+    plt.figure(figsize=(8, 4))
+    plt.plot(history.history['loss'], label='Train Loss')
+    plt.plot(history.history['val_loss'], label='Validation Loss')
+    plt.title('Model Loss')
+    plt.xlabel('Epoch')
+    plt.ylabel('Loss')
+    plt.legend()
+    plt.show()
+
+
+def main():
+    args = parse_args()
+
+    # Thread pools must be configured before TensorFlow runs anything
+    configure_threads(args.intra_op_threads, args.inter_op_threads)
+    configure_precision(args.precision)
+    strategy = select_strategy(args.strategy)
+    num_workers = len(json.loads(os.environ.get("TF_CONFIG", "{}")).get("cluster", {}).get("worker", [])) or 1
+
+    global_batch_size = args.batch_size * strategy.num_replicas_in_sync
+    train_ds, val_ds, test_ds, class_names, train_examples = load_datasets(args, global_batch_size)
+
+    # Get number of classes
+    num_classes = len(class_names)
+    print("Number of classes:", num_classes)
+    print("Class names:", class_names)
+
+    # --------------------------
+    # Compile the Model
+    # --------------------------
+    learning_rate = args.learning_rate or (1e-3 if args.architecture == "cnn" else 1e-4)
+    with strategy.scope():
+        if args.architecture == "cnn":
+            model = build_model(num_classes, *args.img_size)
+        else:
+            model = build_backbone_model(args.architecture, num_classes, *args.img_size,
+                                         args.backbone_weights, args.trainable_layers)
+        model.compile(
+            optimizer=tf.keras.optimizers.Adam(learning_rate=learning_rate),
+            loss='sparse_categorical_crossentropy',
+            metrics=['accuracy']
+        )
+
+    # Display the model summary for quick inspection
+    model.summary()
+
+    # --------------------------
+    # Train the Model
+    # --------------------------
+    # BackupAndRestore resumes from the last completed epoch if a run is interrupted
+    timer = EpochTimer(global_batch_size, num_workers, args.baseline_images_per_sec, train_examples)
+    history = model.fit(
+        train_ds,
+        validation_data=val_ds,
+        epochs=args.epochs,
+        callbacks=[tf.keras.callbacks.BackupAndRestore(backup_dir=args.checkpoint_dir), timer]
+    )
+
+    # --------------------------
+    # Save the Trained Model
+    # --------------------------
+    if is_chief():
+        # Create the trained_models directory if it doesn't exist
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        model.save(args.output)
+        print(f"Model saved as {args.output}")
+
+    # --------------------------
+    # Optional: Evaluate on the Test Set
+    # --------------------------
+    if test_ds is not None:
+        test_loss, test_accuracy = model.evaluate(test_ds)
+        print("Test Loss: {:.4f}, Test Accuracy: {:.4f}".format(test_loss, test_accuracy))
+
+    # --------------------------
+    # Record the Model in the Registry
+    # --------------------------
+    if is_chief():
+        accuracy = test_accuracy if test_ds is not None else history.history['val_accuracy'][-1]
+        latency_ms = measure_latency(model, *args.img_size)
+        entry = ModelRegistry(args.registry).record({
+            "name": args.name or os.path.splitext(os.path.basename(args.output))[0],
+            "path": args.output,
+            "architecture": args.architecture,
+            "accuracy": round(float(accuracy), 4),
+            "size_bytes": os.path.getsize(args.output),
+            "parameters": int(model.count_params()),
+            "latency_ms": round(latency_ms, 2),
+            "input_size": list(args.img_size),
+            "class_names": list(class_names),
+        })
+        print(f"Registered {entry['name']}: accuracy {entry['accuracy']:.4f}, "
+              f"{entry['latency_ms']:.1f} ms/image, {entry['size_bytes'] / 1e6:.1f} MB")
+
+    # --------------------------
+    # Plot Training History
+    # --------------------------
+    if not args.no_plot and is_chief():
+        plot_history(history)
+
+
+if __name__ == "__main__":
+    main()
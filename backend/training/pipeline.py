@@ -0,0 +1,249 @@
+import os
+import json
+import time
+import random
+import argparse
+import tensorflow as tf
+
+# ----------------------
+# Input pipeline for classifier training
+# ----------------------
+#
+# The raw dataset is decoded and resized once into sharded TFRecord files of
+# uint8 pixels, in a seeded random order so every shard mixes all classes.
+# Training then reads the shards with parallel interleaved reads, normalizes in
+# the same map that parses each record, caches the decoded tensors in memory and
+# shuffles with a fixed seed.
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".gif")
+METADATA_FILE = "metadata.json"
+# Shards read concurrently; fixed (not AUTOTUNE) so the interleaved order is reproducible
+INTERLEAVE_CYCLE_LENGTH = 8
+
+
+def list_images(source_dir):
+    """List (path, label) pairs with class names taken from sorted subdirectories."""
+    class_names = sorted(
+        entry for entry in os.listdir(source_dir)
+        if os.path.isdir(os.path.join(source_dir, entry))
+    )
+    samples = []
+    for label, class_name in enumerate(class_names):
+        class_dir = os.path.join(source_dir, class_name)
+        for filename in sorted(os.listdir(class_dir)):
+            if filename.lower().endswith(IMAGE_EXTENSIONS):
+                samples.append((os.path.join(class_dir, filename), label))
+    return samples, class_names
+
+
+def _serialize_example(pixels, label):
+    """Serialize a uint8 image tensor and its label as a tf.train.Example."""
+    feature = {
+        "image": tf.train.Feature(bytes_list=tf.train.BytesList(value=[pixels.tobytes()])),
+        "label": tf.train.Feature(int64_list=tf.train.Int64List(value=[label])),
+    }
+    return tf.train.Example(features=tf.train.Features(feature=feature)).SerializeToString()
+
+
+def write_tfrecord_shards(source_dir, output_dir, img_height, img_width, num_shards=16, seed=42):
+    """
+    Decode and resize every image in source_dir once and write sharded TFRecords.
+
+    Samples are shuffled with a fixed seed before they are dealt out to the shards,
+    so each shard (and each read of a few shards) covers every class instead of
+    a run of one class.
+
+    Returns the metadata written next to the shards (class names, image size,
+    number of examples and shard file names).
+    """
+    samples, class_names = list_images(source_dir)
+    random.Random(seed).shuffle(samples)
+    os.makedirs(output_dir, exist_ok=True)
+    shard_names = [f"shard-{i:05d}-of-{num_shards:05d}.tfrecord" for i in range(num_shards)]
+    writers = [tf.io.TFRecordWriter(os.path.join(output_dir, name)) for name in shard_names]
+
+    written = 0
+    try:
+        for index, (path, label) in enumerate(samples):
+            try:
+                image = tf.io.decode_image(tf.io.read_file(path), channels=3, expand_animations=False)
+            except tf.errors.InvalidArgumentError:
+                print(f"Skipping unreadable image: {path}")
+                continue
+            image = tf.image.resize(image, (img_height, img_width))
+            pixels = tf.cast(tf.clip_by_value(tf.round(image), 0, 255), tf.uint8).numpy()
+            writers[index % num_shards].write(_serialize_example(pixels, label))
+            written += 1
+    finally:
+        for writer in writers:
+            writer.close()
+
+    metadata = {
+        "class_names": class_names,
+        "image_size": [img_height, img_width],
+        "num_examples": written,
+        "shards": shard_names,
+        "seed": seed,
+    }
+    with open(os.path.join(output_dir, METADATA_FILE), "w") as f:
+        json.dump(metadata, f, indent=2)
+    print(f"Wrote {written} images from {source_dir} into {num_shards} shards in {output_dir}")
+    return metadata
+
+
+def load_metadata(shard_dir):
+    """Load the metadata written by write_tfrecord_shards, or None if missing."""
+    path = os.path.join(shard_dir, METADATA_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def load_tfrecord_dataset(shard_dir, batch_size, shuffle=False, seed=42, shuffle_buffer=2048, image_size=None):
+    """
+    Build a batched dataset of normalized images from TFRecord shards.
+
+    Shards are read in parallel with a deterministic interleave, decoded tensors
+    are cached after the first epoch and, when shuffling, the order is driven by
+    a fixed seed so runs are reproducible. If image_size differs from the size the
+    shards were prepared at, images are resized once before the cache.
+    """
+    metadata = load_metadata(shard_dir)
+    if metadata is None:
+        raise FileNotFoundError(f"No prepared shards found in {shard_dir}")
+    img_height, img_width = metadata["image_size"]
+    files = [os.path.join(shard_dir, name) for name in metadata["shards"]]
+
+    feature_spec = {
+        "image": tf.io.FixedLenFeature([], tf.string),
+        "label": tf.io.FixedLenFeature([], tf.int64),
+    }
+
+    def parse(record):
+        example = tf.io.parse_single_example(record, feature_spec)
+        image = tf.reshape(tf.io.decode_raw(example["image"], tf.uint8), (img_height, img_width, 3))
+        # Normalization happens here instead of in a separate Rescaling map
+        image = tf.cast(image, tf.float32) * (1.0 / 255)
+        if image_size is not None and tuple(image_size) != (img_height, img_width):
+            image = tf.image.resize(image, image_size)
+        return image, tf.cast(example["label"], tf.int32)
+
+    ds = tf.data.Dataset.from_tensor_slices(files)
+    if shuffle:
+        ds = ds.shuffle(len(files), seed=seed, reshuffle_each_iteration=True)
+    ds = ds.interleave(
+        tf.data.TFRecordDataset,
+        cycle_length=min(len(files), INTERLEAVE_CYCLE_LENGTH),
+        num_parallel_calls=tf.data.AUTOTUNE,
+        deterministic=True,
+    )
+    ds = ds.map(parse, num_parallel_calls=tf.data.AUTOTUNE, deterministic=True)
+    ds = ds.cache()
+    if shuffle:
+        ds = ds.shuffle(shuffle_buffer, seed=seed, reshuffle_each_iteration=True)
+    ds = ds.batch(batch_size)
+    return ds.prefetch(tf.data.AUTOTUNE), metadata["class_names"]
+
+
+def load_directory_dataset(source_dir, img_height, img_width, batch_size, shuffle=False, seed=42):
+    """The original pipeline: decode JPEGs from disk each epoch, rescale in a separate map."""
+    ds = tf.keras.utils.image_dataset_from_directory(
+        source_dir,
+        seed=seed,
+        image_size=(img_height, img_width),
+        batch_size=batch_size,
+        shuffle=shuffle
+    )
+    normalization_layer = tf.keras.layers.Rescaling(1./255)
+    ds = ds.map(lambda x, y: (normalization_layer(x), y), num_parallel_calls=tf.data.AUTOTUNE)
+    return ds.prefetch(tf.data.AUTOTUNE)
+
+
+def measure_throughput(ds, epochs=2, max_batches=None):
+    """
+    Iterate a dataset for a few epochs and report images/sec per epoch.
+
+    The first epoch of a cached pipeline includes the cost of filling the cache,
+    later epochs show the steady state that most of training runs at.
+    """
+    results = []
+    for epoch in range(epochs):
+        images = 0
+        start = time.perf_counter()
+        for batch_index, (batch, _) in enumerate(ds):
+            images += int(batch.shape[0])
+            if max_batches is not None and batch_index + 1 >= max_batches:
+                break
+        elapsed = time.perf_counter() - start
+        results.append({"epoch": epoch + 1, "images": images, "seconds": round(elapsed, 3),
+                        "images_per_sec": round(images / elapsed, 1) if elapsed > 0 else 0.0})
+    return results
+
+
+def throughput_report(source_dir, shard_dir, img_height, img_width, batch_size, epochs=2, max_batches=None):
+    """Compare the directory pipeline against the TFRecord pipeline on the same data."""
+    before = measure_throughput(
+        load_directory_dataset(source_dir, img_height, img_width, batch_size, shuffle=True),
+        epochs, max_batches
+    )
+    tfrecord_ds, _ = load_tfrecord_dataset(shard_dir, batch_size, shuffle=True)
+    after = measure_throughput(tfrecord_ds, epochs, max_batches)
+
+    report = {"batch_size": batch_size, "directory_pipeline": before, "tfrecord_pipeline": after}
+    print("Input pipeline throughput (images/sec):")
+    for name, results in (("directory", before), ("tfrecord", after)):
+        per_epoch = ", ".join(f"epoch {r['epoch']}: {r['images_per_sec']}" for r in results)
+        print(f"  {name:<10} {per_epoch}")
+    if before[-1]["images_per_sec"] > 0:
+        speedup = after[-1]["images_per_sec"] / before[-1]["images_per_sec"]
+        report["steady_state_speedup"] = round(speedup, 2)
+        print(f"  steady-state speedup: {speedup:.2f}x")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prepare and benchmark classifier training data.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    prepare = subparsers.add_parser("prepare", help="Convert archive/{train,validation,test} into TFRecord shards")
+    prepare.add_argument("--base-dir", default="archive")
+    prepare.add_argument("--output-dir", default="prepared")
+    prepare.add_argument("--img-size", type=int, nargs=2, default=[150, 150], metavar=("HEIGHT", "WIDTH"))
+    prepare.add_argument("--num-shards", type=int, default=16)
+    prepare.add_argument("--seed", type=int, default=42, help="Seed for the order images are written in")
+
+    benchmark = subparsers.add_parser("benchmark", help="Report images/sec before and after preparation")
+    benchmark.add_argument("--base-dir", default="archive")
+    benchmark.add_argument("--output-dir", default="prepared")
+    benchmark.add_argument("--split", default="train")
+    benchmark.add_argument("--batch-size", type=int, default=32)
+    benchmark.add_argument("--epochs", type=int, default=2)
+    benchmark.add_argument("--max-batches", type=int, default=None)
+    benchmark.add_argument("--report", default=None, help="Optional path to write the report as JSON")
+
+    args = parser.parse_args()
+
+    if args.command == "prepare":
+        for split in ("train", "validation", "test"):
+            source_dir = os.path.join(args.base_dir, split)
+            if not os.path.isdir(source_dir):
+                print(f"No {split} directory found, skipping.")
+                continue
+            write_tfrecord_shards(source_dir, os.path.join(args.output_dir, split),
+                                  args.img_size[0], args.img_size[1], args.num_shards, args.seed)
+    else:
+        shard_dir = os.path.join(args.output_dir, args.split)
+        metadata = load_metadata(shard_dir)
+        if metadata is None:
+            parser.error(f"No prepared shards found in {shard_dir}, run 'python pipeline.py prepare' first")
+        img_height, img_width = metadata["image_size"]
+        report = throughput_report(os.path.join(args.base_dir, args.split), shard_dir,
+                                   img_height, img_width, args.batch_size, args.epochs, args.max_batches)
+        if args.report:
+            with open(args.report, "w") as f:
+                json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -57,6 +57,57 @@ class FoodApi {
     }
   }
 
+  /**
+   * Search USDA database via the streaming backend endpoint.
+   * Hits arrive first without nutrients; each item's nutrients follow as they load.
+   * @param {string} query - The search query
+   * @param {Object} handlers - Callbacks: onHits(items), onItem(item), onItemError(id, detail)
+   * @returns {Promise<Array>} Array of USDA food items (completed ones include nutrients)
+   */
+  static async searchUSDAStream(query, { onHits, onItem, onItemError } = {}) {
+    const url = `${BACKEND_API_URL}/search-foods/stream?query=${encodeURIComponent(query)}&limit=10`;
+    const response = await fetch(url);
+
+    if (!response.ok || !response.body) {
+      throw new Error(`USDA stream search failed: ${response.status}`);
+    }
+
+    const items = new Map();
+    const handleEvent = (event) => {
+      if (event.event === 'hits') {
+        event.results.forEach(hit => items.set(hit.id, this.processUSDAResult(hit)));
+        if (onHits) onHits([...items.values()]);
+      } else if (event.event === 'item') {
+        const item = this.processUSDAResult(event.result);
+        items.set(item.id, item);
+        if (onItem) onItem(item);
+      } else if (event.event === 'error') {
+        if (event.id === null || event.id === undefined) {
+          throw new Error(event.detail);
+        }
+        if (onItemError) onItemError(event.id, event.detail);
+      }
+    };
+
+    // Newline-delimited JSON: parse each complete line as soon as it arrives
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    while (true) {
+      const { value, done } = await reader.read();
+      buffer += decoder.decode(value || new Uint8Array(), { stream: !done });
+      const lines = buffer.split('\n');
+      buffer = lines.pop();
+      lines.filter(line => line.trim()).forEach(line => handleEvent(JSON.parse(line)));
+      if (done) break;
+    }
+    if (buffer.trim()) {
+      handleEvent(JSON.parse(buffer));
+    }
+
+    return [...items.values()];
+  }
+
   /**
    * Search OpenFoodFacts database (fallback)
    * @param {string} query - The search query
@@ -90,13 +141,22 @@ class FoodApi {
       return [];
     }
 
-    return results.map(item => ({
+    return results.map(item => this.processUSDAResult(item)).slice(0, 10); // Limit to 10 results
+  }
+
+  /**
+   * Process a single USDA result into standardized format
+   * @param {Object} item - Raw USDA result (nutrients may be missing while still loading)
+   * @returns {Object} Processed food item (nutrients is null while pending)
+   */
+  static processUSDAResult(item) {
+    return {
       id: item.id,
       name: item.name,
       description: item.name,
       dataType: item.data_type,
       source: 'USDA FoodData Central',
-      nutrients: {
+      nutrients: item.nutrients ? {
         calories: item.nutrients.calories || 0,
         protein: item.nutrients.protein || 0,
         carbs: item.nutrients.carbs || 0,
@@ -104,9 +164,9 @@ class FoodApi {
         fiber: item.nutrients.fiber || 0,
         sugars: item.nutrients.sugars || 0,
         sodium: item.nutrients.sodium || 0
-      },
+      } : null,
       servingSize: item.serving_size || '100g'
-    })).slice(0, 10); // Limit to 10 results
+    };
   }
 
   /**
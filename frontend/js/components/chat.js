@@ -40,12 +40,14 @@ class ChatComponent {
     this.addMessage('assistant', "Hi! 👋 I'm your nutrition assistant. Tell me what you're eating and I'll help you track the nutritional info. For example, try saying \"I had a chicken sandwich for lunch\" or \"How many calories are in an avocado?\"");
   }
 
-  addMessage(role, content) {
+  addMessage(role, content, serverNutritionData = null) {
     const messageDiv = document.createElement('div');
     messageDiv.className = `chat-message ${role}`;
     
-    // Parse nutrition data from the content
-    const { displayContent, nutritionData } = this.parseNutritionData(content);
+    // Prefer nutrition data validated by the server; fall back to parsing the tag
+    const parsed = this.parseNutritionData(content);
+    const displayContent = parsed.displayContent;
+    const nutritionData = serverNutritionData || parsed.nutritionData;
     
     const contentDiv = document.createElement('div');
     contentDiv.className = 'message-content';
@@ -59,6 +61,14 @@ class ChatComponent {
       messageDiv.appendChild(addButton);
     }
     
+    // Show the server's sanity checks (e.g. calories vs. macros, USDA comparison)
+    if (nutritionData && nutritionData.warnings && nutritionData.warnings.length > 0) {
+      const warningsDiv = document.createElement('div');
+      warningsDiv.className = 'nutrition-warnings';
+      warningsDiv.textContent = `⚠️ ${nutritionData.warnings.join(' · ')}`;
+      messageDiv.appendChild(warningsDiv);
+    }
+    
     this.chatMessages.appendChild(messageDiv);
     this.chatMessages.scrollTop = this.chatMessages.scrollHeight;
   }
@@ -189,7 +199,7 @@ class ChatComponent {
         }
         
         // Add assistant response to UI
-        this.addMessage('assistant', data.response);
+        this.addMessage('assistant', data.response, data.nutrition_data);
       } else {
         this.addMessage('assistant', 'Sorry, I had trouble processing that. Please try again.');
       }
@@ -33,13 +33,75 @@ class SearchComponent {
     this.searchResultsList.innerHTML = '';
 
     try {
-      const results = await FoodApi.searchFood(searchTerm);
-      this.displayResults(results, searchTerm);
+      const results = await this.streamUSDAResults(searchTerm);
+      if (results.length > 0) {
+        return;
+      }
+      // No USDA hits: use the regular search, which falls back to OpenFoodFacts
+      this.displayResults(await FoodApi.searchFood(searchTerm, false), searchTerm);
     } catch (error) {
-      this.handleError(error);
+      console.warn('Streaming USDA search failed, retrying without streaming:', error);
+      try {
+        const results = await FoodApi.searchFood(searchTerm);
+        this.displayResults(results, searchTerm);
+      } catch (fallbackError) {
+        this.handleError(fallbackError);
+      }
     }
   }
 
+  /**
+   * Render USDA hits as soon as they are found, then fill in each result's
+   * nutrients as the backend streams them.
+   */
+  async streamUSDAResults(searchTerm) {
+    const rows = new Map();
+    let finished = 0;
+    let unavailable = 0;
+
+    // Items that failed count as finished too, so the status never stays on "loading"
+    const markFinished = () => {
+      finished += 1;
+      if (finished === rows.size) {
+        this.searchStatus.textContent = unavailable > 0
+          ? `Found ${rows.size} results from USDA database (${unavailable} without nutrition details)`
+          : `Found ${rows.size} results from USDA database`;
+      }
+    };
+
+    return FoodApi.searchUSDAStream(searchTerm, {
+      onHits: (hits) => {
+        if (hits.length === 0) {
+          return;
+        }
+        this.displayResults(hits, searchTerm);
+        this.searchResultsList.querySelectorAll('li.search-result').forEach((li, index) => {
+          rows.set(hits[index].id, { li, result: hits[index] });
+        });
+        this.searchStatus.textContent = `Found ${hits.length} results from USDA database, loading nutrition...`;
+      },
+      onItem: (item) => {
+        const row = rows.get(item.id);
+        if (!row) return;
+        Object.assign(row.result, item);
+        row.li.classList.remove('pending');
+        row.li.innerHTML = this.createResultHTML(row.result);
+        markFinished();
+      },
+      onItemError: (id, detail) => {
+        const row = rows.get(id);
+        if (!row) return;
+        console.warn(`Nutrition unavailable for ${row.result.name}:`, detail);
+        row.li.classList.remove('pending');
+        row.li.classList.add('unavailable');
+        const action = row.li.querySelector('.result-action');
+        if (action) action.innerHTML = '<span class="click-hint">Nutrition details not available</span>';
+        unavailable += 1;
+        markFinished();
+      }
+    });
+  }
+
   displayResults(results, searchTerm) {
     this.searchResultsList.innerHTML = '';
     
@@ -74,8 +136,16 @@ class SearchComponent {
       const li = document.createElement('li');
       li.className = `search-result ${result.source === 'USDA FoodData Central' ? 'usda-result' : 'off-result'}`;
       
+      if (!result.nutrients) {
+        li.classList.add('pending');
+      }
       li.innerHTML = this.createResultHTML(result);
-      li.addEventListener('click', () => this.handleResultSelection(result));
+      li.addEventListener('click', () => {
+        // Results still loading (or without nutrition data) cannot be selected yet
+        if (result.nutrients) {
+          this.handleResultSelection(result);
+        }
+      });
       this.searchResultsList.appendChild(li);
     });
   }
@@ -98,6 +168,11 @@ class SearchComponent {
         <span class="serving-size">Per ${result.servingSize || '100g'}</span>
       </div>
       
+      ${!nutrients ? `
+        <div class="nutrition-summary">
+          <span class="nutrition-loading">Loading nutrition...</span>
+        </div>
+      ` : `
       <div class="nutrition-summary">
         <div class="nutrition-item">
           <span class="nutrient-value">${Math.round(nutrients.calories)}</span>
@@ -122,9 +197,10 @@ class SearchComponent {
           </div>
         ` : ''}
       </div>
+      `}
       
       <div class="result-action">
-        <span class="click-hint">Click to select this food</span>
+        <span class="click-hint">${nutrients ? 'Click to select this food' : 'Loading...'}</span>
       </div>
     `;
   }